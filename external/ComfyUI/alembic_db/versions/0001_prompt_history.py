@@ -0,0 +1,39 @@
+"""add prompt history
+
+Revision ID: 0001_prompt_history
+Revises:
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001_prompt_history'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'prompt_history',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('prompt_id', sa.String(), nullable=False),
+        sa.Column('completed_at', sa.Float(), nullable=False),
+        sa.Column('entry', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_prompt_history_prompt_id'), 'prompt_history', ['prompt_id'], unique=True)
+    op.create_index(op.f('ix_prompt_history_completed_at'), 'prompt_history', ['completed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_prompt_history_completed_at'), table_name='prompt_history')
+    op.drop_index(op.f('ix_prompt_history_prompt_id'), table_name='prompt_history')
+    op.drop_table('prompt_history')
@@ -0,0 +1,38 @@
+"""add uploaded file hashes
+
+Revision ID: 0002_uploaded_file_hashes
+Revises: 0001_prompt_history
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_uploaded_file_hashes'
+down_revision: Union[str, None] = '0001_prompt_history'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'uploaded_file_hashes',
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('mtime_ns', sa.BigInteger(), nullable=False),
+        sa.Column('algorithm', sa.String(), nullable=False),
+        sa.Column('digest', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('path'),
+    )
+    op.create_index('ix_uploaded_file_hashes_digest', 'uploaded_file_hashes', ['algorithm', 'digest'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_uploaded_file_hashes_digest', table_name='uploaded_file_hashes')
+    op.drop_table('uploaded_file_hashes')
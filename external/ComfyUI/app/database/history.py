@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select
+
+from app.database.models import PromptHistoryEntry
+from app.prompt_history import PromptHistory, serialize_entry
+
+
+class DatabasePromptHistory(PromptHistory):
+    """
+    History persisted in the ComfyUI database so it survives restarts.
+
+    Lookups by prompt id use a unique index. The ids of the stored rows are
+    kept in memory in insertion order, so an offset resolves to the id it
+    starts at and a page is a keyset seek on the primary key (`id >= start`)
+    rather than an OFFSET scan over the rows before it.
+    """
+
+    def __init__(self, max_size: int, session_factory: Callable):
+        self.max_size = max_size
+        self._session_factory = session_factory
+        with self._session_factory() as session:
+            self._ids: list[int] = list(session.scalars(select(PromptHistoryEntry.id).order_by(PromptHistoryEntry.id)))
+        self._prune()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, prompt_id: str, entry: dict):
+        data = serialize_entry(entry)
+        try:
+            with self._session_factory() as session:
+                row = session.scalar(select(PromptHistoryEntry).where(PromptHistoryEntry.prompt_id == prompt_id))
+                if row is None:
+                    row = PromptHistoryEntry(prompt_id=prompt_id, completed_at=time.time(), entry=data)
+                    session.add(row)
+                    session.commit()
+                    bisect.insort(self._ids, row.id)
+                else:
+                    row.entry = data
+                    row.completed_at = time.time()
+                    session.commit()
+            self._prune()
+        except Exception:
+            logging.exception("Failed to store history for prompt %s", prompt_id)
+
+    def _prune(self):
+        overflow = len(self._ids) - self.max_size
+        if overflow <= 0:
+            return
+        last = self._ids[overflow - 1]
+        with self._session_factory() as session:
+            session.execute(delete(PromptHistoryEntry).where(PromptHistoryEntry.id <= last))
+            session.commit()
+        del self._ids[:overflow]
+
+    def get(self, prompt_id: str) -> Optional[str]:
+        with self._session_factory() as session:
+            return session.scalar(select(PromptHistoryEntry.entry).where(PromptHistoryEntry.prompt_id == prompt_id))
+
+    def page(self, offset: int, limit: Optional[int]) -> list[tuple[str, str]]:
+        if offset >= len(self._ids) or limit == 0:
+            return []
+        query = (select(PromptHistoryEntry.prompt_id, PromptHistoryEntry.entry)
+                 .where(PromptHistoryEntry.id >= self._ids[offset])
+                 .order_by(PromptHistoryEntry.id))
+        if limit is not None:
+            query = query.limit(limit)
+        with self._session_factory() as session:
+            return [(row.prompt_id, row.entry) for row in session.execute(query)]
+
+    def delete(self, prompt_id: str):
+        with self._session_factory() as session:
+            row_id = session.scalar(select(PromptHistoryEntry.id).where(PromptHistoryEntry.prompt_id == prompt_id))
+            if row_id is None:
+                return
+            session.execute(delete(PromptHistoryEntry).where(PromptHistoryEntry.id == row_id))
+            session.commit()
+        index = bisect.bisect_left(self._ids, row_id)
+        if index < len(self._ids) and self._ids[index] == row_id:
+            del self._ids[index]
+
+    def clear(self):
+        with self._session_factory() as session:
+            session.execute(delete(PromptHistoryEntry))
+            session.commit()
+        self._ids = []
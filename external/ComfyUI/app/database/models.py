@@ -1,3 +1,4 @@
+from sqlalchemy import BigInteger, Column, Float, Index, Integer, String, Text
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -11,4 +12,35 @@ def to_dict(obj):
         if (val := getattr(obj, field))
     }
 
-# TODO: Define models here
+
+class PromptHistoryEntry(Base):
+    """
+    A finished prompt as returned by /history.
+
+    `id` preserves insertion order so history can be paged through the
+    primary key index; `entry` holds the serialized history item.
+    """
+
+    __tablename__ = "prompt_history"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, nullable=False, unique=True, index=True)
+    completed_at = Column(Float, nullable=False, index=True)
+    entry = Column(Text, nullable=False)
+
+
+class UploadedFileHash(Base):
+    """
+    Content hash of a file in an upload directory, valid while the file's
+    size and mtime are unchanged.
+    """
+
+    __tablename__ = "uploaded_file_hashes"
+
+    path = Column(String, primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    algorithm = Column(String, nullable=False)
+    digest = Column(String, nullable=False)
+
+    __table_args__ = (Index("ix_uploaded_file_hashes_digest", "algorithm", "digest"),)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+from sqlalchemy import delete, select
+
+from app.database.models import UploadedFileHash
+from app.upload_index import FileHash, UploadHashIndex
+
+
+class DatabaseUploadHashIndex(UploadHashIndex):
+    """UploadHashIndex persisted in the ComfyUI database so it survives restarts."""
+
+    def __init__(self, session_factory: Callable):
+        super().__init__()
+        self._session_factory = session_factory
+
+    def _get(self, path: str) -> Optional[FileHash]:
+        with self._session_factory() as session:
+            row = session.get(UploadedFileHash, path)
+            if row is None:
+                return None
+            return FileHash(row.size, row.mtime_ns, row.algorithm, row.digest)
+
+    def _put(self, path: str, entry: FileHash):
+        with self._session_factory() as session:
+            session.merge(UploadedFileHash(path=path, size=entry.size, mtime_ns=entry.mtime_ns, algorithm=entry.algorithm, digest=entry.digest))
+            session.commit()
+
+    def _drop(self, path: str):
+        with self._session_factory() as session:
+            session.execute(delete(UploadedFileHash).where(UploadedFileHash.path == path))
+            session.commit()
+
+    def _paths_with(self, algorithm: str, digest: str) -> list[str]:
+        with self._session_factory() as session:
+            query = select(UploadedFileHash.path).where(UploadedFileHash.algorithm == algorithm, UploadedFileHash.digest == digest)
+            return list(session.scalars(query))
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import struct
+import threading
+from typing import NamedTuple, Optional
+
+INDEX_VERSION = 1
+# Metadata larger than this (e.g. embedded cover images) is read from the file every time instead of being indexed.
+METADATA_INDEX_LIMIT = 64 * 1024
+# Changes are written out at most this often, so a first scan or a burst of preview requests rewrites the index once.
+SAVE_DELAY = 5.0
+
+
+class FileStat(NamedTuple):
+    size: int
+    mtime: float
+    ctime: float
+
+
+class DirectoryEntry(NamedTuple):
+    mtime: float
+    subdirs: list[str]
+    files: dict[str, FileStat]
+
+
+def read_safetensors_metadata(path: str, max_size: int = 100 * 1024 * 1024) -> dict:
+    """The `__metadata__` block of a safetensors header, or {} if there is none."""
+    with open(path, "rb") as f:
+        length = struct.unpack("<Q", f.read(8))[0]
+        if length > max_size:
+            return {}
+        header = json.loads(f.read(length))
+    metadata = header.get("__metadata__", {})
+    return metadata if isinstance(metadata, dict) else {}
+
+
+class ModelFileIndex:
+    """
+    Index of the files under model folders, persisted between runs.
+
+    Every scanned directory is kept with its mtime, its subdirectories and the
+    size/mtime/ctime of its files. A rescan only stats directories and lists
+    the ones whose mtime changed, so after a restart (or after someone drops a
+    new model in a folder) the cost is one stat per directory rather than a
+    full walk. Files rewritten in place without touching their directory keep
+    their old size until the directory changes, just like the filename cache
+    in folder_paths. Until `load` is called the index only lives in memory;
+    after that, changes are saved in the background `save_delay` seconds
+    after the first one and on exit.
+    """
+
+    def __init__(self, save_delay: float = SAVE_DELAY):
+        self.path: Optional[str] = None
+        self.save_delay = save_delay
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        self._trees: dict[tuple[str, tuple[str, ...]], dict[str, DirectoryEntry]] = {}
+        self._metadata: dict[str, tuple[int, float, dict]] = {}
+
+    def load(self, path: str):
+        """Attach the index to `path`, reading whatever a previous run left there."""
+        with self._lock:
+            if self.path is None:
+                atexit.register(self.flush)
+            self.path = path
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                return
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable model index {path}: {e}")
+                return
+            if data.get("version") != INDEX_VERSION:
+                return
+            for tree in data.get("trees", []):
+                dirs = {}
+                for dirpath, (mtime, subdirs, files) in tree["dirs"].items():
+                    dirs[dirpath] = DirectoryEntry(mtime, subdirs, {name: FileStat(*stat) for name, stat in files.items()})
+                self._trees.setdefault((tree["root"], tuple(tree["excluded"])), dirs)
+            for file_path, (size, mtime, metadata) in data.get("metadata", {}).items():
+                self._metadata.setdefault(file_path, (size, mtime, metadata))
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if self.path is not None and self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending changes now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                self.save()
+
+    def save(self):
+        with self._lock:
+            if self.path is None:
+                return
+            self._dirty = False
+            data = {
+                "version": INDEX_VERSION,
+                "trees": [
+                    {"root": root, "excluded": list(excluded), "dirs": {p: [e.mtime, e.subdirs, {n: list(s) for n, s in e.files.items()}] for p, e in dirs.items()}}
+                    for (root, excluded), dirs in self._trees.items()
+                ],
+                "metadata": {p: list(v) for p, v in self._metadata.items()},
+            }
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logging.warning(f"Failed to save model index {self.path}: {e}")
+
+    def _list_directory(self, path: str, mtime: float, excluded: tuple[str, ...]) -> DirectoryEntry:
+        subdirs = []
+        files = {}
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        if entry.name not in excluded:
+                            subdirs.append(entry.name)
+                    else:
+                        stat = entry.stat()
+                        files[entry.name] = FileStat(stat.st_size, stat.st_mtime, stat.st_ctime)
+                except OSError:
+                    logging.warning(f"Warning: Unable to access {entry.name}. Skipping this file.")
+        return DirectoryEntry(mtime, subdirs, files)
+
+    def _refresh(self, directory: str, excluded: tuple[str, ...]) -> dict[str, DirectoryEntry]:
+        key = (directory, excluded)
+        old = self._trees.get(key, {})
+        new: dict[str, DirectoryEntry] = {}
+        changed = False
+        stack = [directory]
+        while stack:
+            path = stack.pop()
+            if path in new:
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+                entry = old.get(path)
+                if entry is None or entry.mtime != mtime:
+                    entry = self._list_directory(path, mtime, excluded)
+                    changed = True
+            except OSError:
+                logging.warning(f"Warning: Unable to access {path}. Skipping this path.")
+                continue
+            new[path] = entry
+            stack.extend(os.path.join(path, d) for d in reversed(entry.subdirs))
+
+        if changed or new.keys() != old.keys():
+            self._trees[key] = new
+            self._mark_dirty()
+        return new
+
+    def scan(self, directory: str, excluded_dir_names: list[str] | None = None) -> tuple[list[str], dict[str, float]]:
+        """Same contract as folder_paths.recursive_search: relative file paths and {directory: mtime}."""
+        files, dirs = self.listing(directory, excluded_dir_names)
+        return [name for name, _ in files], dirs
+
+    def listing(self, directory: str, excluded_dir_names: list[str] | None = None) -> tuple[list[tuple[str, FileStat]], dict[str, float]]:
+        """(relative path, FileStat) for every file under `directory` plus {directory: mtime}, refreshing changed directories first."""
+        if not os.path.isdir(directory):
+            return [], {}
+        with self._lock:
+            tree = self._refresh(directory, tuple(excluded_dir_names or ()))
+        files = []
+        for dirpath, entry in tree.items():
+            prefix = os.path.relpath(dirpath, directory)
+            for name, stat in entry.files.items():
+                files.append((name if prefix == "." else os.path.join(prefix, name), stat))
+        return files, {path: entry.mtime for path, entry in tree.items()}
+
+    def safetensors_metadata(self, path: str) -> dict:
+        """Header metadata of a safetensors file, re-read only when the file changes."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._metadata.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            return cached[2]
+
+        metadata = read_safetensors_metadata(path)
+        if len(json.dumps(metadata)) <= METADATA_INDEX_LIMIT:
+            with self._lock:
+                self._metadata[path] = (stat.st_size, stat.st_mtime, metadata)
+                self._mark_dirty()
+        return metadata
@@ -7,7 +7,6 @@ import time
 import logging
 import folder_paths
 import glob
-import comfy.utils
 from aiohttp import web
 from PIL import Image
 from io import BytesIO
@@ -118,42 +117,19 @@ class ModelFileManager:
         include_hidden_files = False
 
         result: list[str] = []
-        dirs: dict[str, float] = {}
-
-        for dirpath, subdirs, filenames in os.walk(directory, followlinks=True, topdown=True):
-            subdirs[:] = [d for d in subdirs if d not in excluded_dir_names]
-            if not include_hidden_files:
-                subdirs[:] = [d for d in subdirs if not d.startswith(".")]
-                filenames = [f for f in filenames if not f.startswith(".")]
-
-            filenames = filter_files_extensions(filenames, folder_paths.supported_pt_extensions)
-
-            for file_name in filenames:
-                try:
-                    full_path = os.path.join(dirpath, file_name)
-                    relative_path = os.path.relpath(full_path, directory)
-
-                    # Get file metadata
-                    file_info = {
-                        "name": relative_path,
-                        "pathIndex": pathIndex,
-                        "modified": os.path.getmtime(full_path),  # Add modification time
-                        "created": os.path.getctime(full_path),   # Add creation time
-                        "size": os.path.getsize(full_path)        # Add file size
-                    }
-                    result.append(file_info)
-
-                except Exception as e:
-                    logging.warning(f"Warning: Unable to access {file_name}. Error: {e}. Skipping this file.")
-                    continue
-
-            for d in subdirs:
-                path: str = os.path.join(dirpath, d)
-                try:
-                    dirs[path] = os.path.getmtime(path)
-                except FileNotFoundError:
-                    logging.warning(f"Warning: Unable to access {path}. Skipping this path.")
-                    continue
+        files, dirs = folder_paths.model_index.listing(directory, excluded_dir_names)
+        for relative_path, stat in files:
+            if not include_hidden_files and any(part.startswith(".") for part in relative_path.split(os.sep)):
+                continue
+            if not filter_files_extensions([relative_path], folder_paths.supported_pt_extensions):
+                continue
+            result.append({
+                "name": relative_path,
+                "pathIndex": pathIndex,
+                "modified": stat.mtime,
+                "created": stat.ctime,
+                "size": stat.size,
+            })
 
         return result, dirs, time.perf_counter()
 
@@ -180,10 +156,11 @@ class ModelFileManager:
 
         if safetensors_file:
             safetensors_filepath = os.path.join(dirname, safetensors_file)
-            header = comfy.utils.safetensors_header(safetensors_filepath, max_size=8*1024*1024)
-            if header:
-                safetensors_metadata = json.loads(header)
-        safetensors_images = safetensors_metadata.get("__metadata__", {}).get("ssmd_cover_images", None)
+            try:
+                safetensors_metadata = folder_paths.model_index.safetensors_metadata(safetensors_filepath)
+            except Exception as e:
+                logging.warning(f"Unable to read safetensors metadata from {safetensors_filepath}: {e}")
+        safetensors_images = safetensors_metadata.get("ssmd_cover_images", None)
         if safetensors_images:
             safetensors_images = json.loads(safetensors_images)
             for image in safetensors_images:
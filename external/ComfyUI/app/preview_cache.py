@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import NamedTuple, Optional
+
+from PIL import Image
+
+MEMORY_BUDGET = 64 * 1024 * 1024
+# Larger renders are only kept on disk and served with sendfile.
+MEMORY_ENTRY_LIMIT = 512 * 1024
+
+
+class PreviewSpec(NamedTuple):
+    """What to derive from a source image for /view."""
+    image_format: str  # "webp", "jpeg" or "png"
+    quality: int
+    channel: str  # "rgba", "rgb" or "a"
+    max_size: int  # 0 keeps the original dimensions
+
+    @property
+    def content_type(self) -> str:
+        return f"image/{self.image_format}"
+
+
+def render_preview(file: str, spec: PreviewSpec) -> bytes:
+    with Image.open(file) as img:
+        if spec.channel == "a":
+            if img.mode == "RGBA":
+                _, _, _, a = img.split()
+            else:
+                a = Image.new('L', img.size, 255)
+            out = Image.new('RGBA', img.size)
+            out.putalpha(a)
+        elif spec.channel == "rgb":
+            if img.mode == "RGBA":
+                r, g, b, _ = img.split()
+                out = Image.merge('RGB', (r, g, b))
+            else:
+                out = img.convert("RGB")
+        elif spec.image_format == "jpeg":
+            out = img.convert("RGB")
+        else:
+            out = img.copy()
+
+    if spec.max_size and max(out.size) > spec.max_size:
+        out.thumbnail((spec.max_size, spec.max_size), Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    if spec.image_format == "png":
+        out.save(buffer, format="PNG")
+    else:
+        out.save(buffer, format=spec.image_format, quality=spec.quality)
+    return buffer.getvalue()
+
+
+class PreviewCache:
+    """
+    Size-bounded cache of encoded /view previews.
+
+    Entries are keyed by the source file's path, mtime and size plus the
+    PreviewSpec, so a rewritten source is never served stale. Every entry is
+    written to disk (so it can be sent with sendfile) and small ones are also
+    kept in memory; both tiers are evicted least recently used first.
+    """
+
+    def __init__(self, directory: str, disk_budget: int, memory_budget: int = MEMORY_BUDGET):
+        self.directory = directory
+        self.disk_budget = disk_budget
+        self.memory_budget = memory_budget
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self._scan()
+
+    @property
+    def enabled(self) -> bool:
+        return self.disk_budget > 0
+
+    def _scan(self):
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_atime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_bytes += size
+
+    @staticmethod
+    def key(file: str, spec: PreviewSpec) -> str:
+        stat = os.stat(file)
+        raw = f"{os.path.abspath(file)}|{stat.st_mtime_ns}|{stat.st_size}|{spec.image_format}|{spec.quality}|{spec.channel}|{spec.max_size}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_memory(self, key: str) -> Optional[tuple[bytes, str]]:
+        """Cached bytes and their ETag value, if held in memory."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+            return entry
+
+    def get_path(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        path = os.path.join(self.directory, key)
+        if not os.path.isfile(path):
+            with self._lock:
+                self._forget_disk(key)
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        """Store an encoded preview and return the ETag value to send with it.
+
+        The ETag matches the one aiohttp's FileResponse derives from the disk
+        copy, so revalidation works whichever tier serves the next request.
+        """
+        path = None
+        etag = key[:32]
+        if self.enabled and len(data) <= self.disk_budget:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, key)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            stat = os.stat(path)
+            etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+        with self._lock:
+            if path is not None:
+                self._forget_disk(key)
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+                self._evict_disk()
+            if len(data) <= MEMORY_ENTRY_LIMIT and self.memory_budget > 0:
+                if key in self._memory:
+                    self._memory_bytes -= len(self._memory.pop(key)[0])
+                self._memory[key] = (data, etag)
+                self._memory_bytes += len(data)
+                while self._memory_bytes > self.memory_budget:
+                    _, (evicted, _) = self._memory.popitem(last=False)
+                    self._memory_bytes -= len(evicted)
+        return etag
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_budget and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, key))
+            except OSError:
+                logging.debug(f"Failed to remove cached preview {key}")
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+
+def serialize_entry(entry: dict) -> str:
+    return json.dumps(entry, default=str)
+
+
+class PromptHistory:
+    """
+    Finished prompts in completion order, keyed by prompt id.
+
+    Entries are stored as serialized JSON, so every read hands out a fresh
+    object (or the JSON text itself) and callers can never mutate what is
+    stored. The oldest entries are dropped once `max_size` is exceeded.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, prompt_id) -> bool:
+        return self.get(prompt_id) is not None
+
+    def add(self, prompt_id: str, entry: dict):
+        self._entries[prompt_id] = serialize_entry(entry)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, prompt_id: str) -> Optional[str]:
+        return self._entries.get(prompt_id)
+
+    def page(self, offset: int, limit: Optional[int]) -> list[tuple[str, str]]:
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(self._entries.items(), offset, stop))
+
+    def delete(self, prompt_id: str):
+        self._entries.pop(prompt_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def create_persistent_history(max_size: int) -> Optional[PromptHistory]:
+    """Database-backed history, or None when the database is unavailable."""
+    from app.database.db import can_create_session, create_session
+
+    if not can_create_session():
+        return None
+    try:
+        from app.database.history import DatabasePromptHistory
+        return DatabasePromptHistory(max_size, create_session)
+    except Exception as e:
+        logging.warning(f"Prompt history will not be persisted: {e}")
+        return None
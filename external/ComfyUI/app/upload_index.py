@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Callable, NamedTuple, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream, hasher_factory: Callable) -> str:
+    """Hash a file object in chunks and rewind it."""
+    h = hasher_factory()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+        h.update(chunk)
+    stream.seek(0)
+    return h.hexdigest()
+
+
+class FileHash(NamedTuple):
+    size: int
+    mtime_ns: int
+    algorithm: str
+    digest: str
+
+
+class UploadHashIndex:
+    """
+    Content hashes of uploaded files, keyed by path and validated by size
+    and mtime.
+
+    A file is hashed at most once per change; afterwards both "what is the
+    hash of this path" and "which files in this folder have this hash" are
+    dictionary lookups. This implementation lives in memory; see
+    app.database.upload_index for the persistent one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_path: dict[str, FileHash] = {}
+        self._by_digest: dict[tuple[str, str], set[str]] = {}
+
+    def _get(self, path: str) -> Optional[FileHash]:
+        return self._by_path.get(path)
+
+    def _put(self, path: str, entry: FileHash):
+        self._drop(path)
+        self._by_path[path] = entry
+        self._by_digest.setdefault((entry.algorithm, entry.digest), set()).add(path)
+
+    def _drop(self, path: str):
+        old = self._by_path.pop(path, None)
+        if old is not None:
+            paths = self._by_digest.get((old.algorithm, old.digest))
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self._by_digest[(old.algorithm, old.digest)]
+
+    def _paths_with(self, algorithm: str, digest: str) -> list[str]:
+        return list(self._by_digest.get((algorithm, digest), ()))
+
+    def hash_file(self, path: str, algorithm: str, hasher_factory: Callable) -> str:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._get(path)
+        if entry is not None and entry.algorithm == algorithm and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            return entry.digest
+
+        with open(path, "rb") as f:
+            digest = hash_stream(f, hasher_factory)
+        with self._lock:
+            self._put(path, FileHash(stat.st_size, stat.st_mtime_ns, algorithm, digest))
+        return digest
+
+    def record(self, path: str, algorithm: str, digest: str):
+        """Remember the hash of a file that was just written."""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._put(path, FileHash(stat.st_size, stat.st_mtime_ns, algorithm, digest))
+
+    def find(self, directory: str, algorithm: str, digest: str) -> list[str]:
+        """Indexed files directly inside `directory` whose content hashes to `digest`."""
+        directory = os.path.abspath(directory)
+        out = []
+        with self._lock:
+            candidates = self._paths_with(algorithm, digest)
+        for path in candidates:
+            if os.path.dirname(path) != directory:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                with self._lock:
+                    self._drop(path)
+                continue
+            with self._lock:
+                entry = self._get(path)
+            if entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+                out.append(path)
+        return out
+
+
+def create_upload_index() -> UploadHashIndex:
+    """Database-backed index when the database is available, in-memory otherwise."""
+    try:
+        from app.database.db import can_create_session, create_session
+        if can_create_session():
+            from app.database.upload_index import DatabaseUploadHashIndex
+            return DatabaseUploadHashIndex(create_session)
+    except Exception as e:
+        logging.warning(f"Upload hash index will not be persisted: {e}")
+    return UploadHashIndex()
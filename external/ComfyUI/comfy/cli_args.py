@@ -41,6 +41,7 @@ parser.add_argument("--tls-keyfile", type=str, help="Path to TLS (SSL) key file.
 parser.add_argument("--tls-certfile", type=str, help="Path to TLS (SSL) certificate file. Enables TLS, makes app accessible at https://... requires --tls-keyfile to function")
 parser.add_argument("--enable-cors-header", type=str, default=None, metavar="ORIGIN", nargs="?", const="*", help="Enable CORS (Cross-Origin Resource Sharing) with optional origin or allow all with default '*'.")
 parser.add_argument("--max-upload-size", type=float, default=100, help="Set the maximum upload size in MB.")
+parser.add_argument("--queue-lanes", type=str, default="interactive:8,batch:2,background:1", help="Scheduling lanes for queued prompts as name:weight pairs. Lanes share the executor in proportion to their weights and clients within a lane are served round robin. Prompts submitted without a \"lane\" go into the first lane.")
 
 parser.add_argument("--base-directory", type=str, default=None, help="Set the ComfyUI base directory for models, custom_nodes, input, output, temp, and user directories.")
 parser.add_argument("--extra-model-paths-config", type=str, default=None, metavar="PATH", nargs='+', action='append', help="Load one or more extra_model_paths.yaml files.")
@@ -98,8 +99,10 @@ class LatentPreviewMethod(enum.Enum):
     TAESD = "taesd"
 
 parser.add_argument("--preview-method", type=LatentPreviewMethod, default=LatentPreviewMethod.NoPreviews, help="Default preview method for sampler nodes.", action=EnumAction)
+parser.add_argument("--progress-interval", type=float, default=0.1, help="Minimum seconds between progress_state websocket messages; updates in between are coalesced. Node starts and finishes are always sent immediately.")
 
 parser.add_argument("--preview-size", type=int, default=512, help="Sets the maximum preview size for sampler nodes.")
+parser.add_argument("--view-cache-size", type=int, default=1024, help="Disk space in MB for cached /view previews and thumbnails. Set to 0 to disable the cache.")
 
 cache_group = parser.add_mutually_exclusive_group()
 cache_group.add_argument("--cache-classic", action="store_true", help="Use the old style (aggressive) caching.")
@@ -152,6 +155,11 @@ parser.add_argument("--disable-pinned-memory", action="store_true", help="Disabl
 
 parser.add_argument("--mmap-torch-files", action="store_true", help="Use mmap when loading ckpt/pt files.")
 parser.add_argument("--disable-mmap", action="store_true", help="Don't use mmap when loading safetensors.")
+parser.add_argument("--model-list-refresh-interval", type=float, default=2.0, help="Seconds a model folder listing is trusted before its directories are checked for changes again. Set to 0 to check on every lookup.")
+parser.add_argument("--state-dict-cache-size", type=int, default=2048, help="Memory in MB for keeping safetensors state dicts (LoRAs, checkpoints) staged by --prefetch-models or fully read with --disable-mmap, so they are not read from disk again. Loads get a copy. Set to 0 to disable.")
+parser.add_argument("--lora-weight-cache-size", type=int, default=0, help="Memory in MB for keeping LoRA-patched weights on the CPU so switching back to a recently used LoRA set skips the merge. 0 (the default) disables it.")
+parser.add_argument("--prefetch-models", type=int, default=0, help="Look at the next N queued prompts and load the checkpoints, LoRAs and other safetensors files of their loader nodes into the state dict cache while the current prompt runs. 0 (the default) disables it.")
+parser.add_argument("--prefetch-memory", type=int, default=4096, help="Memory in MB that prefetched but not yet used model files may take; also limited by --state-dict-cache-size.")
 
 parser.add_argument("--dont-print-server", action="store_true", help="Don't print server output.")
 parser.add_argument("--quick-test-for-ci", action="store_true", help="Quick test for CI.")
@@ -21,9 +21,13 @@ import comfy.utils
 import comfy.model_management
 import comfy.model_base
 import comfy.weight_adapter as weight_adapter
+from comfy.cli_args import args
+from comfy.merged_weight_cache import MergedWeightCache
 import logging
 import torch
 
+MERGED_WEIGHT_CACHE = MergedWeightCache(args.lora_weight_cache_size * 1024 * 1024)
+
 LORA_CLIP_MAP = {
     "mlp.fc1": "mlp_fc1",
     "mlp.fc2": "mlp_fc2",
@@ -0,0 +1,139 @@
+"""
+LRU cache of LoRA-patched weights.
+
+ModelPatcher.patch_weight_to_device recomputes comfy.lora.calculate_weight
+for every patched key each time a model is loaded, even when the same LoRAs at
+the same strengths were applied a moment ago. MergedWeightCache keeps the
+finished weights on the CPU, keyed by the base model, the weight key and a
+fingerprint of the patch list, so switching back to a recently used LoRA set
+is a copy instead of a merge.
+
+Patch fingerprints use object identity for tensors and adapters. Each entry
+holds references to the objects it was fingerprinted from, so their ids
+cannot be reused by other objects while the entry lives.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, NamedTuple, Optional
+
+import torch
+
+import comfy.weight_adapter
+
+
+def model_cache_id(model) -> str:
+    """Stable id for a model's base weights; shared by every ModelPatcher clone of it."""
+    cache_id = getattr(model, "_merged_weight_cache_id", None)
+    if cache_id is None:
+        cache_id = uuid.uuid4().hex
+        model._merged_weight_cache_id = cache_id
+    return cache_id
+
+
+def patch_fingerprint(obj, anchors: list) -> Hashable:
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, torch.Tensor):
+        anchors.append(obj)
+        return ("tensor", id(obj))
+    if isinstance(obj, comfy.weight_adapter.WeightAdapterBase):
+        anchors.append(obj)
+        return (type(obj).__name__, id(obj), patch_fingerprint(obj.weights, anchors))
+    if isinstance(obj, (list, tuple)):
+        return tuple(patch_fingerprint(x, anchors) for x in obj)
+    if isinstance(obj, dict):
+        return tuple(sorted((k, patch_fingerprint(v, anchors)) for k, v in obj.items()))
+    anchors.append(obj)
+    return ("object", id(obj))
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+    seconds_saved: float
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class _Entry:
+    __slots__ = ("weight", "anchors", "compute_seconds")
+
+    def __init__(self, weight: torch.Tensor, anchors: list, compute_seconds: float):
+        self.weight = weight
+        self.anchors = anchors
+        self.compute_seconds = compute_seconds
+
+
+class MergedWeightCache:
+    """Byte-bounded LRU of patched weights with hit/miss instrumentation."""
+
+    def __init__(self, max_bytes: int, storage_device: torch.device = torch.device("cpu")):
+        self.max_bytes = max_bytes
+        self.storage_device = storage_device
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._seconds_saved = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, model, key: str, weight: torch.Tensor, patches: list, extra: Any = None) -> tuple[Hashable, list]:
+        """(cache key, anchors) for patching `key` of `model` with `patches`."""
+        anchors = []
+        fingerprint = patch_fingerprint(patches, anchors)
+        return (model_cache_id(model), key, tuple(weight.shape), weight.dtype, extra, fingerprint), anchors
+
+    def get(self, cache_key: Hashable, device: torch.device) -> Optional[torch.Tensor]:
+        """A private copy of the cached weight on `device`, or None."""
+        start = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(cache_key)
+        out = entry.weight.to(device=device, copy=True)
+        with self._lock:
+            self._hits += 1
+            self._seconds_saved += max(0.0, entry.compute_seconds - (time.perf_counter() - start))
+        return out
+
+    def put(self, cache_key: Hashable, weight: torch.Tensor, anchors: list, compute_seconds: float):
+        nbytes = weight.nbytes
+        if not self.enabled or nbytes > self.max_bytes:
+            return
+        entry = _Entry(weight.to(device=self.storage_device, copy=True), anchors, compute_seconds)
+        with self._lock:
+            old = self._entries.pop(cache_key, None)
+            if old is not None:
+                self._bytes -= old.weight.nbytes
+            self._entries[cache_key] = entry
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.weight.nbytes
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, len(self._entries), self._bytes, self._seconds_saved)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        logging.debug("Cleared merged weight cache")
@@ -0,0 +1,216 @@
+"""
+Header-first safetensors loading and a shared cache of loaded state dicts.
+
+`read_safetensors` parses the JSON header once and maps every tensor straight
+out of a single copy-on-write mmap of the file, so nothing is read until a
+tensor is touched. Copies (for --disable-mmap or a non-CPU device) are made
+in parallel by a small thread pool; torch releases the GIL while copying.
+
+`StateDictCache` keeps recently loaded state dicts keyed by path, mtime and
+size, so switching between the same few LoRAs does not read them again. Its
+tensors never leave the cache: every hit returns a private copy, since
+loaders and model patching modify weights in place.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import torch
+
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+MATERIALIZE_THREADS = min(8, os.cpu_count() or 1)
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+for _name, _attr in (("F8_E4M3", "float8_e4m3fn"), ("F8_E5M2", "float8_e5m2"), ("U16", "uint16"), ("U32", "uint32"), ("U64", "uint64")):
+    if hasattr(torch, _attr):
+        SAFETENSORS_DTYPES[_name] = getattr(torch, _attr)
+
+
+def _materialize(tensors: dict[str, torch.Tensor], device: torch.device, pin_memory: bool = False) -> dict[str, torch.Tensor]:
+    keys = list(tensors.keys())
+
+    def copy(k):
+        if pin_memory:
+            t = tensors[k]
+            return torch.empty(t.shape, dtype=t.dtype, pin_memory=True).copy_(t)
+        return tensors[k].to(device=device, copy=True)
+
+    if len(keys) < 2 or MATERIALIZE_THREADS < 2:
+        return {k: copy(k) for k in keys}
+    with ThreadPoolExecutor(max_workers=MATERIALIZE_THREADS) as pool:
+        return dict(zip(keys, pool.map(copy, keys)))
+
+
+def read_safetensors(path: str, device: Optional[torch.device] = None, copy: bool = False, pin_memory: bool = False) -> Optional[tuple[dict[str, torch.Tensor], Optional[dict]]]:
+    """
+    (state dict, metadata) for a safetensors file, or None if the file uses
+    something this reader does not handle, in which case the caller should
+    fall back to the safetensors library (which also reports corrupt files).
+    With `pin_memory` the tensors are copied into page-locked CPU memory.
+    """
+    if device is None:
+        device = torch.device("cpu")
+    with open(path, "rb") as f:
+        raw = f.read(8)
+        if len(raw) != 8:
+            return None
+        header_size = struct.unpack("<Q", raw)[0]
+        if header_size > MAX_HEADER_SIZE:
+            return None
+        try:
+            header = json.loads(f.read(header_size))
+        except ValueError:
+            return None
+        file_size = os.fstat(f.fileno()).st_size
+        data_start = 8 + header_size
+        mapped = None
+        if file_size > data_start:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    metadata = header.pop("__metadata__", None)
+    sd = {}
+    for k, info in header.items():
+        dtype = SAFETENSORS_DTYPES.get(info.get("dtype"))
+        if dtype is None:
+            return None
+        start, end = info["data_offsets"]
+        shape = info["shape"]
+        if data_start + end > file_size:
+            return None
+        if end == start:
+            sd[k] = torch.empty(shape, dtype=dtype)
+            continue
+        offset = data_start + start
+        if offset % dtype.itemsize:
+            # The format pads the header so offsets are aligned, but not every
+            # writer does; a misaligned view would break vectorized kernels.
+            sd[k] = torch.frombuffer(bytearray(mapped[offset:data_start + end]), dtype=dtype).reshape(shape)
+            continue
+        count = (end - start) // dtype.itemsize
+        sd[k] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    if pin_memory and device.type == "cpu":
+        sd = _materialize(sd, device, pin_memory=True)
+    elif copy or device.type != "cpu":
+        sd = _materialize(sd, device)
+    return sd, metadata
+
+
+def _copy(metadata: Optional[dict]) -> Optional[dict]:
+    return None if metadata is None else dict(metadata)
+
+
+def _pinned(sd: dict) -> bool:
+    return any(isinstance(t, torch.Tensor) and t.is_pinned() for t in sd.values())
+
+
+class CacheKey(NamedTuple):
+    path: str
+    mtime_ns: int
+    size: int
+    copy: bool
+
+    @classmethod
+    def for_file(cls, path: str, copy: bool) -> "CacheKey":
+        stat = os.stat(path)
+        return cls(os.path.abspath(path), stat.st_mtime_ns, stat.st_size, copy)
+
+
+class _Entry:
+    __slots__ = ("sd", "metadata", "nbytes", "pinned")
+
+    def __init__(self, sd, metadata, nbytes):
+        self.sd = sd
+        self.metadata = metadata
+        self.nbytes = nbytes
+        self.pinned = _pinned(sd)
+
+
+class StateDictCache:
+    """Byte-bounded LRU of loaded CPU state dicts that hands out copies."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[CacheKey, _Entry] = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: CacheKey) -> Optional[tuple[dict, Optional[dict]]]:
+        """
+        A private copy of the cached state dict (pinned if the cached one is)
+        and its metadata.
+
+        Copying on every hit is deliberate: a hit still pays one memcpy of the
+        weights, but skips the disk read and parse, and callers are free to
+        patch the tensors in place. Handing out shared read-only tensors would
+        need every loader and patcher to copy before writing.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        # Copied outside the lock; entries are never modified once stored.
+        return _materialize(entry.sd, torch.device("cpu"), pin_memory=entry.pinned), _copy(entry.metadata)
+
+    def put(self, key: CacheKey, sd: dict, metadata: Optional[dict], copy: bool = False) -> bool:
+        """
+        Cache a loaded state dict; False if it does not fit. The cache owns
+        `sd` afterwards unless `copy` is set, in which case it stores a copy.
+        """
+        nbytes = sum(t.nbytes for t in sd.values() if isinstance(t, torch.Tensor))
+        if not self.enabled or nbytes > self.max_bytes:
+            return False
+        if copy:
+            sd = _materialize(sd, torch.device("cpu"), pin_memory=_pinned(sd))
+        entry = _Entry(dict(sd), _copy(metadata), nbytes)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            # Older versions of the same file can never be hit again.
+            for stale in [k for k in self._entries if k.path == key.path and k.copy == key.copy]:
+                self._bytes -= self._entries.pop(stale).nbytes
+            self._entries[key] = entry
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                logging.debug(f"Evicted cached state dict {evicted_key.path}")
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: CacheKey):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
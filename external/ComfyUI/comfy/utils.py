@@ -21,6 +21,7 @@ import torch
 import math
 import struct
 import comfy.checkpoint_pickle
+import comfy.safetensors_loader
 import safetensors.torch
 import numpy as np
 from PIL import Image
@@ -32,6 +33,7 @@ from comfy.cli_args import args
 
 MMAP_TORCH_FILES = args.mmap_torch_files
 DISABLE_MMAP = args.disable_mmap
+STATE_DICT_CACHE = comfy.safetensors_loader.StateDictCache(args.state_dict_cache_size * 1024 * 1024)
 
 ALWAYS_SAFE_LOAD = False
 if hasattr(torch.serialization, "add_safe_globals"):  # TODO: this was added in pytorch 2.4, the unsafe path should be removed once earlier versions are deprecated
@@ -59,6 +61,22 @@ def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False):
         device = torch.device("cpu")
     metadata = None
     if ckpt.lower().endswith(".safetensors") or ckpt.lower().endswith(".sft"):
+        cache_key = None
+        if device.type == "cpu" and STATE_DICT_CACHE.enabled:
+            cache_key = comfy.safetensors_loader.CacheKey.for_file(ckpt, copy=DISABLE_MMAP)
+            cached = STATE_DICT_CACHE.get(cache_key)
+            if cached is not None:
+                sd, metadata = cached
+                return (sd, metadata) if return_metadata else sd
+
+        loaded = comfy.safetensors_loader.read_safetensors(ckpt, device=device, copy=DISABLE_MMAP)
+        if loaded is not None:
+            sd, metadata = loaded
+            # Mmapped loads are already served from the page cache; only keep fully read ones.
+            if cache_key is not None and DISABLE_MMAP:
+                STATE_DICT_CACHE.put(cache_key, sd, metadata, copy=True)
+            return (sd, metadata) if return_metadata else sd
+
         try:
             with safetensors.safe_open(ckpt, framework="pt", device=device.type) as f:
                 sd = {}
@@ -1,4 +1,5 @@
 import bisect
+import collections
 import gc
 import itertools
 import psutil
@@ -11,9 +12,15 @@ from abc import ABC, abstractmethod
 import nodes
 
 from comfy_execution.graph_utils import is_link
+from comfy_execution.fingerprint import StructureMemo, structure_fingerprint
 
 NODE_CLASS_CONTAINS_UNIQUE_ID: Dict[str, bool] = {}
 
+# Per graph structure: ancestor orderings (they only depend on links) and the
+# last signatures, which are reused for nodes whose inputs and ancestors did
+# not change since the previous prompt with the same structure.
+SIGNATURE_MEMO = StructureMemo()
+
 
 def include_unique_id_in_input(class_type: str) -> bool:
     if class_type in NODE_CLASS_CONTAINS_UNIQUE_ID:
@@ -78,16 +85,49 @@ class CacheKeySetID(CacheKeySet):
             self.keys[node_id] = (node_id, node["class_type"])
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
+class _AncestorRef:
+    __slots__ = ("node_id",)
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+
+class _AncestorPlaceholders:
+    """Stands in for an ancestor order mapping so link entries can be filled in per root later."""
+    def __getitem__(self, node_id):
+        return _AncestorRef(node_id)
+
+class _StructureSignatures:
+    __slots__ = ("ancestry", "literals", "signatures")
+
+    def __init__(self):
+        self.ancestry = {}
+        self.literals = {}
+        self.signatures = {}
+
 class CacheKeySetInputSignature(CacheKeySet):
     def __init__(self, dynprompt, node_ids, is_changed_cache):
         super().__init__(dynprompt, node_ids, is_changed_cache)
         self.dynprompt = dynprompt
         self.is_changed_cache = is_changed_cache
+        self.structure = None
+        # Nodes the structure fingerprint covers; ephemeral nodes added by expansion are not memoized.
+        self.structure_ids = frozenset()
+        # node_id -> (hashable literal entries, link entries) of its immediate signature
+        self.immediate = {}
+        # node_id -> whether its literal entries differ from the last prompt with this structure
+        self.changed = {}
+        self.link_entries = {}
+        self.counters = collections.Counter()
 
     def include_node_id_in_input(self) -> bool:
         return False
 
     async def add_keys(self, node_ids):
+        if self.structure is None:
+            dynprompt = self.dynprompt
+            self.structure_ids = frozenset(dynprompt.all_node_ids())
+            fingerprint = structure_fingerprint((i, dynprompt.get_node(i)) for i in self.structure_ids)
+            self.structure = SIGNATURE_MEMO.get(fingerprint, _StructureSignatures)
         for node_id in node_ids:
             if node_id in self.keys:
                 continue
@@ -96,14 +136,64 @@ class CacheKeySetInputSignature(CacheKeySet):
             node = self.dynprompt.get_node(node_id)
             self.keys[node_id] = await self.get_node_signature(self.dynprompt, node_id)
             self.subcache_keys[node_id] = (node_id, node["class_type"])
+        for name, n in self.counters.items():
+            SIGNATURE_MEMO.count(name, n)
+        self.counters.clear()
+
+    def is_memoized(self, node_id):
+        return self.structure is not None and node_id in self.structure_ids
 
     async def get_node_signature(self, dynprompt, node_id):
-        signature = []
+        # Equal to to_hashable() of the immediate signatures of the node and its ancestors, but
+        # each immediate signature is built once per prompt, and the whole signature is reused
+        # when neither the node nor its ancestors changed since the last prompt of this shape.
         ancestors, order_mapping = self.get_ordered_ancestry(dynprompt, node_id)
-        signature.append(await self.get_immediate_node_signature(dynprompt, node_id, order_mapping))
+        parts = [await self.get_immediate_parts(dynprompt, node_id)]
         for ancestor_id in ancestors:
-            signature.append(await self.get_immediate_node_signature(dynprompt, ancestor_id, order_mapping))
-        return to_hashable(signature)
+            parts.append(await self.get_immediate_parts(dynprompt, ancestor_id))
+        memoized = self.is_memoized(node_id)
+        if memoized:
+            previous = self.structure.signatures.get(node_id)
+            if previous is not None and not self.changed.get(node_id, True) and not any(self.changed.get(a, True) for a in ancestors):
+                self.counters["signatures_reused"] += 1
+                return previous
+        signature = frozenset(enumerate(self.hashable_immediate_signature(p, order_mapping) for p in parts))
+        self.counters["signatures_built"] += 1
+        if memoized:
+            self.structure.signatures[node_id] = signature
+        return signature
+
+    async def get_immediate_parts(self, dynprompt, node_id):
+        parts = self.immediate.get(node_id)
+        if parts is not None:
+            return parts
+        signature = await self.get_immediate_node_signature(dynprompt, node_id, _AncestorPlaceholders())
+        literals = []
+        links = []
+        for i, entry in enumerate(signature):
+            if isinstance(entry, tuple) and isinstance(entry[1], tuple) and isinstance(entry[1][1], _AncestorRef):
+                links.append((i, entry[0], entry[1][1].node_id, entry[1][2]))
+            else:
+                literals.append((i, to_hashable(entry)))
+        if self.is_memoized(node_id):
+            # Unhashable and NaN entries never compare equal, so those nodes always count as changed.
+            self.changed[node_id] = self.structure.literals.get(node_id) != literals
+            self.structure.literals[node_id] = literals
+        parts = self.immediate[node_id] = (literals, links)
+        return parts
+
+    def hashable_immediate_signature(self, parts, ancestor_order_mapping):
+        literals, links = parts
+        if not links:
+            return frozenset(literals)
+        entries = list(literals)
+        for i, key, ancestor_id, socket in links:
+            link = (key, ancestor_order_mapping[ancestor_id], socket)
+            entry = self.link_entries.get(link)
+            if entry is None:
+                entry = self.link_entries[link] = to_hashable((key, ("ANCESTOR", link[1], socket)))
+            entries.append((i, entry))
+        return frozenset(entries)
 
     async def get_immediate_node_signature(self, dynprompt, node_id, ancestor_order_mapping):
         if not dynprompt.has_node(node_id):
@@ -128,9 +218,17 @@ class CacheKeySetInputSignature(CacheKeySet):
     # This function returns a list of all ancestors of the given node. The order of the list is
     # deterministic based on which specific inputs the ancestor is connected by.
     def get_ordered_ancestry(self, dynprompt, node_id):
+        memoized = self.is_memoized(node_id)
+        if memoized and node_id in self.structure.ancestry:
+            self.counters["ancestries_reused"] += 1
+            ancestors = self.structure.ancestry[node_id]
+            return ancestors, {ancestor_id: i for i, ancestor_id in enumerate(ancestors)}
         ancestors = []
         order_mapping = {}
         self.get_ordered_ancestry_internal(dynprompt, node_id, ancestors, order_mapping)
+        if memoized:
+            self.counters["ancestries_built"] += 1
+            self.structure.ancestry[node_id] = tuple(ancestors)
         return ancestors, order_mapping
 
     def get_ordered_ancestry_internal(self, dynprompt, node_id, ancestors, order_mapping):
@@ -0,0 +1,76 @@
+"""
+Structural fingerprints of prompts.
+
+Clients tend to submit the same few workflows over and over with only widget
+values changed. structure_fingerprint() identifies a workflow by its node ids,
+class types, which inputs are set and how nodes are linked, ignoring literal
+input values, so work that depends only on the shape of the graph can be
+reused across those submissions. StructureMemo is a small LRU keyed by these
+fingerprints that counts how much work it saved.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Iterable, Mapping
+
+from comfy_execution.graph_utils import is_link
+
+
+def structure_fingerprint(nodes: Iterable[tuple[str, Mapping]]) -> str:
+    """Fingerprint of (node_id, node) pairs that ignores literal input values."""
+    h = hashlib.sha1()
+    for node_id, node in sorted(nodes, key=lambda n: str(n[0])):
+        inputs = node.get("inputs", {})
+        parts = [node_id, node.get("class_type")]
+        for key in sorted(inputs):
+            value = inputs[key]
+            parts.append((key, value[0], value[1]) if is_link(value) else key)
+        h.update(repr(parts).encode("utf-8"))
+    return h.hexdigest()
+
+
+def prompt_fingerprint(prompt: Mapping[str, Mapping]) -> str:
+    return structure_fingerprint(prompt.items())
+
+
+class StructureMemo:
+    """LRU of per-structure data with hit/miss and free-form counters."""
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self.counters: Counter = Counter()
+
+    def get(self, fingerprint: str, factory: Callable[[], Any]) -> Any:
+        """The data for `fingerprint`, created with `factory` on a miss."""
+        with self._lock:
+            value = self._entries.get(fingerprint)
+            if value is not None:
+                self._entries.move_to_end(fingerprint)
+                self.counters["hits"] += 1
+                return value
+            self.counters["misses"] += 1
+            value = self._entries[fingerprint] = factory()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value
+
+    def discard(self, fingerprint: str):
+        with self._lock:
+            self._entries.pop(fingerprint, None)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": 0, "misses": 0, **self.counters, "entries": len(self._entries)}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
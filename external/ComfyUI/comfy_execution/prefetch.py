@@ -0,0 +1,206 @@
+"""
+Lookahead prefetch of model files for queued prompts.
+
+Loader nodes only read their checkpoint, LoRA or VAE once the prompt using
+them starts, so the device idles while every model switch is read from disk.
+ModelPrefetcher watches the next few prompts in the queue, resolves the files
+their loader nodes will ask for through folder_paths and loads them into the
+shared state dict cache (comfy.utils.STATE_DICT_CACHE) on a background thread
+while the current prompt executes. When the loader node runs,
+load_torch_file copies the state dict out of memory instead of reading it.
+
+Files are materialized (optionally into pinned memory) rather than left
+mmapped, so staging them actually performs the disk reads. Staged files that
+have not been used yet are limited to a byte budget.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import folder_paths
+from comfy.safetensors_loader import CacheKey, StateDictCache, read_safetensors
+
+# class_type -> {input name: models folder} for loader nodes whose files go
+# through comfy.utils.load_torch_file. Custom nodes can register their own.
+PREFETCH_INPUTS: dict[str, dict[str, str]] = {
+    "CheckpointLoaderSimple": {"ckpt_name": "checkpoints"},
+    "CheckpointLoader": {"ckpt_name": "checkpoints"},
+    "unCLIPCheckpointLoader": {"ckpt_name": "checkpoints"},
+    "ImageOnlyCheckpointLoader": {"ckpt_name": "checkpoints"},
+    "LoraLoader": {"lora_name": "loras"},
+    "LoraLoaderModelOnly": {"lora_name": "loras"},
+    "VAELoader": {"vae_name": "vae"},
+    "UNETLoader": {"unet_name": "diffusion_models"},
+    "CLIPLoader": {"clip_name": "text_encoders"},
+    "DualCLIPLoader": {"clip_name1": "text_encoders", "clip_name2": "text_encoders"},
+    "TripleCLIPLoader": {"clip_name1": "text_encoders", "clip_name2": "text_encoders", "clip_name3": "text_encoders"},
+    "ControlNetLoader": {"control_net_name": "controlnet"},
+    "CLIPVisionLoader": {"clip_name": "clip_vision"},
+    "StyleModelLoader": {"style_model_name": "style_models"},
+    "UpscaleModelLoader": {"model_name": "upscale_models"},
+}
+
+PREFETCH_EXTENSIONS = (".safetensors", ".sft")
+
+
+def model_files(prompt: dict) -> list[str]:
+    """Full paths of the safetensors files the loader nodes in `prompt` will load."""
+    out = []
+    for node in prompt.values():
+        if not isinstance(node, dict):
+            continue
+        loader_inputs = PREFETCH_INPUTS.get(node.get("class_type"))
+        if loader_inputs is None:
+            continue
+        inputs = node.get("inputs", {})
+        for input_name, folder in loader_inputs.items():
+            name = inputs.get(input_name)
+            if not isinstance(name, str) or not name.lower().endswith(PREFETCH_EXTENSIONS):
+                continue
+            path = folder_paths.get_full_path(folder, name)
+            if path is not None and path not in out:
+                out.append(path)
+    return out
+
+
+class PrefetchStats(NamedTuple):
+    hits: int
+    misses: int
+    staged: int
+    bytes_staged: int
+    seconds: float
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ModelPrefetcher:
+    """
+    Stages the model files of the next `lookahead` queued prompts into `cache`.
+
+    `copy` must be the copy flag load_torch_file uses in its cache keys
+    (comfy.utils.DISABLE_MMAP) so the staged entries are the ones it looks up.
+    Call begin() with each prompt right before executing it; that is where
+    hits (the file was staged in time) and misses are counted.
+    """
+
+    def __init__(self, queue, cache: StateDictCache, lookahead: int, max_bytes: int,
+                 copy: bool = False, pin_memory: bool = False, poll_interval: float = 1.0):
+        self.queue = queue
+        self.cache = cache
+        self.lookahead = lookahead
+        self.max_bytes = max_bytes
+        self.copy = copy
+        self.pin_memory = pin_memory
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._staged: OrderedDict[CacheKey, int] = OrderedDict()
+        self._loading: dict[CacheKey, threading.Event] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._hits = 0
+        self._misses = 0
+        self._staged_count = 0
+        self._bytes_staged = 0
+        self._seconds = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="model-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.prefetch_once()
+            except Exception:
+                logging.warning("Model prefetch failed", exc_info=True)
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _key(self, path: str) -> Optional[CacheKey]:
+        try:
+            return CacheKey.for_file(path, copy=self.copy)
+        except OSError:
+            return None
+
+    def _keys(self, prompt: dict) -> list[tuple[str, CacheKey]]:
+        return [(path, key) for path in model_files(prompt) if (key := self._key(path)) is not None]
+
+    def prefetch_once(self):
+        """Stage every file of the upcoming prompts that is not cached yet and fits the budget."""
+        running, _ = self.queue.get_current_queue_volatile()
+        upcoming = self.queue.peek(self.lookahead)
+        wanted = [pk for item in upcoming for pk in self._keys(item[2])]
+        keep = {key for _, key in wanted}
+        keep.update(key for item in running for _, key in self._keys(item[2]))
+        with self._lock:
+            # Prompts may have been deleted, or their files evicted from the cache.
+            for key in [k for k in self._staged if k not in keep or k not in self.cache]:
+                del self._staged[key]
+
+        for path, key in wanted:
+            if self._stop.is_set():
+                return
+            with self._lock:
+                if key in self._staged or key in self.cache:
+                    continue
+                if sum(self._staged.values()) + key.size > self.max_bytes:
+                    continue
+                done = self._loading[key] = threading.Event()
+            try:
+                self._stage(path, key)
+            finally:
+                with self._lock:
+                    del self._loading[key]
+                done.set()
+
+    def _stage(self, path: str, key: CacheKey):
+        start = time.perf_counter()
+        loaded = read_safetensors(path, copy=True, pin_memory=self.pin_memory)
+        if loaded is None:
+            return
+        cached = self.cache.put(key, *loaded)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if cached:
+                self._staged[key] = key.size
+                self._staged_count += 1
+                self._bytes_staged += key.size
+                self._seconds += elapsed
+        logging.debug(f"Prefetched {path} in {elapsed:.2f}s")
+
+    def begin(self, prompt: dict):
+        """Account for the files `prompt` is about to load, waiting for any that are being staged."""
+        for path, key in self._keys(prompt):
+            with self._lock:
+                loading = self._loading.get(key)
+            if loading is not None:
+                loading.wait()
+            with self._lock:
+                if self._staged.pop(key, None) is not None and key in self.cache:
+                    self._hits += 1
+                elif key not in self.cache:
+                    self._misses += 1
+        self.wake()
+
+    def stats(self) -> PrefetchStats:
+        with self._lock:
+            return PrefetchStats(self._hits, self._misses, self._staged_count, self._bytes_staged, self._seconds)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import TypedDict, Dict, Optional, Tuple
+import threading
+import time
+from typing import TypedDict, Any, Dict, List, Optional, Tuple
 from typing_extensions import override
 from PIL import Image
 from enum import Enum
@@ -11,6 +13,7 @@ if TYPE_CHECKING:
     from comfy_execution.graph import DynamicPrompt
 from protocol import BinaryEventTypes
 from comfy_api import feature_flags
+from comfy.cli_args import args
 
 PreviewImageTuple = Tuple[str, Image.Image, Optional[int]]
 
@@ -150,41 +153,145 @@ class CLIProgressHandler(ProgressHandler):
 class WebUIProgressHandler(ProgressHandler):
     """
     Handler that sends progress updates to the WebUI via WebSockets.
+
+    Node starts and finishes are sent right away; value updates arriving
+    within `interval` seconds of the last message are coalesced into one
+    message sent when the window closes. Clients that advertise
+    "supports_progress_state_delta" only receive the nodes that changed since
+    their previous message (with "delta": True), everyone else gets the full
+    map. What was sent is tracked per client socket, so a client that connects
+    or reconnects mid-prompt first gets the full map. Nothing is built or sent
+    while no socket can receive it.
     """
 
-    def __init__(self, server_instance):
+    def __init__(self, server_instance, interval: float | None = None):
         super().__init__("webui")
         self.server_instance = server_instance
+        self.registry: ProgressRegistry | None = None
+        self.interval = args.progress_interval if interval is None else interval
+        self._lock = threading.Lock()
+        # (display, parent, real) node ids, which never change within a prompt.
+        self._node_ids: Dict[str, Tuple[str, Optional[str], str]] = {}
+        # Per client id: the socket it was sent to and what it was last sent
+        # for each node, (state, value, max).
+        self._sent: Dict[Optional[str], Tuple[Any, Dict[str, Tuple[str, float, float]]]] = {}
+        self._last_send = 0.0
+        self._flush_scheduled = False
+        # Bumped by reset() so flushes scheduled for a previous prompt are dropped.
+        self._generation = 0
 
     def set_registry(self, registry: "ProgressRegistry"):
         self.registry = registry
 
+    def _node_id_info(self, node_id: str) -> Tuple[str, Optional[str], str]:
+        ids = self._node_ids.get(node_id)
+        if ids is None:
+            dynprompt = self.registry.dynprompt
+            ids = (
+                dynprompt.get_display_node_id(node_id),
+                dynprompt.get_parent_node_id(node_id),
+                dynprompt.get_real_node_id(node_id),
+            )
+            self._node_ids[node_id] = ids
+        return ids
+
+    def _listeners(self) -> List[Optional[str]]:
+        server = self.server_instance
+        if server is None:
+            return []
+        sockets = getattr(server, "sockets", None)
+        if not isinstance(sockets, dict):
+            return [server.client_id]
+        if server.client_id is None:
+            return list(sockets)
+        return [server.client_id] if server.client_id in sockets else []
+
+    def _has_listener(self) -> bool:
+        return len(self._listeners()) > 0
+
     def _send_progress_state(self, prompt_id: str, nodes: Dict[str, NodeProgressState]):
         """Send the current progress state to the client"""
-        if self.server_instance is None:
-            return
-
-        # Only send info for non-pending nodes
-        active_nodes = {
-            node_id: {
-                "value": state["value"],
-                "max": state["max"],
-                "state": state["state"].value,
-                "node_id": node_id,
-                "prompt_id": prompt_id,
-                "display_node_id": self.registry.dynprompt.get_display_node_id(node_id),
-                "parent_node_id": self.registry.dynprompt.get_parent_node_id(node_id),
-                "real_node_id": self.registry.dynprompt.get_real_node_id(node_id),
+        with self._lock:
+            self._flush_scheduled = False
+            listeners = self._listeners()
+            if not listeners:
+                return
+
+            # Only send info for non-pending nodes
+            snapshots = {
+                node_id: (state["state"].value, state["value"], state["max"])
+                for node_id, state in list(nodes.items())
+                if state["state"] != NodeState.Pending
             }
-            for node_id, state in nodes.items()
-            if state["state"] != NodeState.Pending
-        }
+            entries = {}
+            messages = []
+            sockets = getattr(self.server_instance, "sockets", None)
+            for sid in listeners:
+                socket = sockets.get(sid) if isinstance(sockets, dict) else None
+                delta = feature_flags.supports_feature(
+                    self.server_instance.sockets_metadata,
+                    sid,
+                    "supports_progress_state_delta",
+                )
+                sent = self._sent.get(sid)
+                if delta and sent is not None and sent[0] is socket:
+                    previous = sent[1]
+                else:
+                    # No baseline for this socket yet: send everything.
+                    previous = None
+                active_nodes = {}
+                for node_id, snapshot in snapshots.items():
+                    if previous is not None and previous.get(node_id) == snapshot:
+                        continue
+                    entry = entries.get(node_id)
+                    if entry is None:
+                        display_node_id, parent_node_id, real_node_id = self._node_id_info(node_id)
+                        entry = entries[node_id] = {
+                            "value": snapshot[1],
+                            "max": snapshot[2],
+                            "state": snapshot[0],
+                            "node_id": node_id,
+                            "prompt_id": prompt_id,
+                            "display_node_id": display_node_id,
+                            "parent_node_id": parent_node_id,
+                            "real_node_id": real_node_id,
+                        }
+                    active_nodes[node_id] = entry
+                if delta:
+                    self._sent[sid] = (socket, snapshots)
+                if previous is not None and not active_nodes:
+                    continue
+                message = {"prompt_id": prompt_id, "nodes": active_nodes}
+                if previous is not None:
+                    message["delta"] = True
+                messages.append((message, sid))
+            for sid in list(self._sent):
+                if sid not in listeners:
+                    del self._sent[sid]
+            self._last_send = time.monotonic()
 
         # Send a combined progress_state message with all node states
         # Include client_id to ensure message is only sent to the initiating client
-        self.server_instance.send_sync(
-            "progress_state", {"prompt_id": prompt_id, "nodes": active_nodes}, self.server_instance.client_id
-        )
+        for message, sid in messages:
+            self.server_instance.send_sync("progress_state", message, sid)
+
+    def _send_throttled(self, prompt_id: str):
+        with self._lock:
+            if self._flush_scheduled:
+                return
+            wait = self._last_send + self.interval - time.monotonic()
+            loop = getattr(self.server_instance, "loop", None)
+            if wait > 0 and loop is not None:
+                self._flush_scheduled = True
+                loop.call_soon_threadsafe(loop.call_later, wait, self._flush, prompt_id, self._generation)
+                return
+        self._send_progress_state(prompt_id, self.registry.nodes)
+
+    def _flush(self, prompt_id: str, generation: int):
+        with self._lock:
+            if not self._flush_scheduled or generation != self._generation or self.registry is None:
+                return
+        self._send_progress_state(prompt_id, self.registry.nodes)
 
     @override
     def start_handler(self, node_id: str, state: NodeProgressState, prompt_id: str):
@@ -202,9 +309,9 @@ class WebUIProgressHandler(ProgressHandler):
         prompt_id: str,
         image: PreviewImageTuple | None = None,
     ):
-        # Send progress state of all nodes
-        if self.registry:
-            self._send_progress_state(prompt_id, self.registry.nodes)
+        if not self.registry or not self._has_listener():
+            return
+        self._send_throttled(prompt_id)
         if image:
             # Only send new format if client supports it
             if feature_flags.supports_feature(
@@ -212,16 +319,13 @@ class WebUIProgressHandler(ProgressHandler):
                 self.server_instance.client_id,
                 "supports_preview_metadata",
             ):
+                display_node_id, parent_node_id, real_node_id = self._node_id_info(node_id)
                 metadata = {
                     "node_id": node_id,
                     "prompt_id": prompt_id,
-                    "display_node_id": self.registry.dynprompt.get_display_node_id(
-                        node_id
-                    ),
-                    "parent_node_id": self.registry.dynprompt.get_parent_node_id(
-                        node_id
-                    ),
-                    "real_node_id": self.registry.dynprompt.get_real_node_id(node_id),
+                    "display_node_id": display_node_id,
+                    "parent_node_id": parent_node_id,
+                    "real_node_id": real_node_id,
                 }
                 self.server_instance.send_sync(
                     BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA,
@@ -235,6 +339,14 @@ class WebUIProgressHandler(ProgressHandler):
         if self.registry:
             self._send_progress_state(prompt_id, self.registry.nodes)
 
+    @override
+    def reset(self):
+        with self._lock:
+            self._flush_scheduled = False
+            self._generation += 1
+            self._node_ids.clear()
+            self._sent.clear()
+
 class ProgressRegistry:
     """
     Registry that maintains node progress state and notifies registered handlers.
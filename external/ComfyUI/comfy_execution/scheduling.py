@@ -0,0 +1,218 @@
+"""
+Fair-share scheduling of queued prompts.
+
+Prompts are submitted into named lanes (by default interactive, batch and
+background). Lanes share the executor in proportion to their weights using
+stride scheduling: every dispatch from a lane advances its virtual time by
+1 / weight, and the waiting lane with the smallest virtual time goes next. A
+lane that was idle starts again at the current virtual time, so it cannot
+bank credit while empty and then monopolize the queue.
+
+Inside a lane each client_id gets its own queue and clients are served round
+robin, so one client submitting hundreds of prompts only delays another
+client's prompt by one prompt per turn. Within a client, prompts run in
+submission number order as before. Prompts with a negative number ("front" of
+the queue) bypass the lanes and run next.
+
+LaneScheduler is not thread safe; PromptQueue guards it with its mutex.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+DEFAULT_LANES = "interactive:8,batch:2,background:1"
+WAIT_WINDOW = 200
+
+
+def parse_lanes(spec: str) -> dict[str, float]:
+    """Parse "name:weight,name:weight" into an ordered {name: weight} dict."""
+    lanes = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, weight = part.partition(":")
+        name = name.strip()
+        weight = float(weight) if weight.strip() else 1.0
+        if not name or weight <= 0:
+            raise ValueError(f"Invalid queue lane {part!r}; expected name:weight with a positive weight")
+        lanes[name] = weight
+    if not lanes:
+        raise ValueError("At least one queue lane is required")
+    return lanes
+
+
+@dataclass(eq=False)
+class _Queued:
+    seq: int
+    item: tuple
+    lane: str
+    client: Optional[str]
+    enqueued_at: float
+
+    def __lt__(self, other: "_Queued"):
+        return (self.item[0], self.seq) < (other.item[0], other.seq)
+
+
+@dataclass
+class _Lane:
+    name: str
+    weight: float
+    clients: OrderedDict = field(default_factory=OrderedDict)
+    depth: int = 0
+    virtual_time: float = 0.0
+    dispatched: int = 0
+    waits: deque = field(default_factory=lambda: deque(maxlen=WAIT_WINDOW))
+
+
+class LaneScheduler:
+    def __init__(self, lanes: dict[str, float], clock: Callable[[], float] = time.monotonic):
+        self.lanes = {name: _Lane(name, weight) for name, weight in lanes.items()}
+        self.default_lane = next(iter(self.lanes))
+        self.clock = clock
+        self._counter = itertools.count()
+        self._front: list[_Queued] = []
+        self._queued: dict[int, _Queued] = {}
+        self._virtual_time = 0.0
+
+    def resolve_lane(self, lane: Optional[str]) -> str:
+        """The lane a prompt submitted with `lane` goes into; raises ValueError for unknown lanes."""
+        if lane is None or lane == "":
+            return self.default_lane
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown queue lane {lane!r}; expected one of {', '.join(self.lanes)}")
+        return lane
+
+    def put(self, item: tuple, lane: Optional[str] = None):
+        """Queue `item` (a PromptQueue tuple) in `lane`, using its extra_data client_id for fairness."""
+        extra_data = item[3] if len(item) > 3 and isinstance(item[3], dict) else {}
+        entry = _Queued(next(self._counter), item, self.resolve_lane(lane), extra_data.get("client_id"), self.clock())
+        self._queued[entry.seq] = entry
+        target = self.lanes[entry.lane]
+        target.depth += 1
+        if entry.item[0] < 0:
+            heapq.heappush(self._front, entry)
+            return
+        if not target.clients:
+            target.virtual_time = max(target.virtual_time, self._virtual_time)
+        heapq.heappush(target.clients.setdefault(entry.client, []), entry)
+
+    def _next_lane(self) -> Optional[_Lane]:
+        best = None
+        for lane in self.lanes.values():
+            if lane.clients and (best is None or lane.virtual_time < best.virtual_time):
+                best = lane
+        return best
+
+    def _pop_from(self, lane: _Lane) -> _Queued:
+        client, heap = next(iter(lane.clients.items()))
+        entry = heapq.heappop(heap)
+        if heap:
+            lane.clients.move_to_end(client)
+        else:
+            del lane.clients[client]
+        self._virtual_time = lane.virtual_time
+        lane.virtual_time += 1.0 / lane.weight
+        return entry
+
+    def pop(self) -> Optional[tuple]:
+        """Remove and return the next item to execute, or None if nothing is queued."""
+        if self._front:
+            entry = heapq.heappop(self._front)
+        else:
+            lane = self._next_lane()
+            if lane is None:
+                return None
+            entry = self._pop_from(lane)
+        del self._queued[entry.seq]
+        lane = self.lanes[entry.lane]
+        lane.depth -= 1
+        lane.dispatched += 1
+        lane.waits.append(self.clock() - entry.enqueued_at)
+        return entry.item
+
+    def peek(self, count: int) -> list[tuple]:
+        """The next `count` items pop() would return, without removing them."""
+        out = sorted(self._front)[:count]
+        order = {name: i for i, name in enumerate(self.lanes)}
+        pending = {}
+        for name, lane in self.lanes.items():
+            if lane.clients:
+                clients = deque(deque(sorted(heap)) for heap in lane.clients.values())
+                pending[name] = [lane.virtual_time, clients]
+        while len(out) < count and pending:
+            name = min(pending, key=lambda n: (pending[n][0], order[n]))
+            state = pending[name]
+            clients = state[1]
+            entries = clients.popleft()
+            out.append(entries.popleft())
+            if entries:
+                clients.append(entries)
+            state[0] += 1.0 / self.lanes[name].weight
+            if not clients:
+                del pending[name]
+        return [e.item for e in out]
+
+    def __len__(self):
+        return len(self._queued)
+
+    def items(self) -> list[tuple]:
+        """Every queued item in submission order."""
+        return [e.item for e in sorted(self._queued.values(), key=lambda e: e.seq)]
+
+    def remove(self, function: Callable[[tuple], Any]) -> bool:
+        """Remove the first queued item for which `function` returns True."""
+        for entry in sorted(self._queued.values(), key=lambda e: e.seq):
+            if function(entry.item):
+                break
+        else:
+            return False
+        del self._queued[entry.seq]
+        lane = self.lanes[entry.lane]
+        lane.depth -= 1
+        if entry.item[0] < 0:
+            self._front.remove(entry)
+            heapq.heapify(self._front)
+            return True
+        heap = lane.clients[entry.client]
+        heap.remove(entry)
+        if heap:
+            heapq.heapify(heap)
+        else:
+            del lane.clients[entry.client]
+        return True
+
+    def clear(self):
+        self._front = []
+        self._queued.clear()
+        for lane in self.lanes.values():
+            lane.clients.clear()
+            lane.depth = 0
+
+    def stats(self) -> dict[str, dict]:
+        """Per-lane depth, waiting clients and wait times in seconds."""
+        now = self.clock()
+        oldest = {}
+        clients = {name: set() for name in self.lanes}
+        for entry in self._queued.values():
+            oldest[entry.lane] = min(oldest.get(entry.lane, now), entry.enqueued_at)
+            clients[entry.lane].add(entry.client)
+        out = {}
+        for name, lane in self.lanes.items():
+            waits = sorted(lane.waits)
+            out[name] = {
+                "weight": lane.weight,
+                "depth": lane.depth,
+                "clients": len(clients[name]),
+                "oldest_wait": now - oldest[name] if name in oldest else 0.0,
+                "dispatched": lane.dispatched,
+                "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+                "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+            }
+        return out
@@ -1,4 +1,5 @@
 import contextvars
+import copy
 from typing import Optional, NamedTuple
 
 class ExecutionContext(NamedTuple):
@@ -44,3 +45,30 @@ class CurrentNodeContext:
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.token is not None:
             current_executing_context.reset(self.token)
+
+
+class FrozenDict(dict):
+    """A dict that refuses modification. Copies of it are ordinary dicts."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("this snapshot is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {k: copy.deepcopy(v, memo) for k, v in self.items()}
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+def freeze(value):
+    """Read-only deep copy of JSON-like data: dicts become FrozenDicts and lists tuples."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
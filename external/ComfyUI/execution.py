@@ -1,6 +1,6 @@
 import copy
-import heapq
 import inspect
+import json
 import logging
 import sys
 import threading
@@ -13,6 +13,7 @@ import asyncio
 import torch
 
 import comfy.model_management
+from app.prompt_history import PromptHistory
 import nodes
 from comfy_execution.caching import (
     BasicCache,
@@ -31,8 +32,10 @@ from comfy_execution.graph import (
 )
 from comfy_execution.graph_utils import GraphBuilder, is_link
 from comfy_execution.validation import validate_node_input
+from comfy_execution.fingerprint import StructureMemo, prompt_fingerprint
+from comfy_execution.scheduling import DEFAULT_LANES, LaneScheduler, parse_lanes
 from comfy_execution.progress import get_progress_state, reset_progress_state, add_progress_handler, WebUIProgressHandler
-from comfy_execution.utils import CurrentNodeContext
+from comfy_execution.utils import CurrentNodeContext, freeze
 from comfy_api.internal import _ComfyNodeInternal, _NodeOutputInternal, first_real_override, is_class, make_locked_method_func
 from comfy_api.latest import io
 
@@ -736,20 +739,22 @@ class PromptExecutor:
                 comfy.model_management.unload_all_models()
 
 
-async def validate_inputs(prompt_id, prompt, item, validated):
-    unique_id = item
-    if unique_id in validated:
-        return validated[unique_id]
+class NodeValidationSpec(NamedTuple):
+    obj_class: type
+    input_info: dict
+    validate_function_name: str
+    validate_function_inputs: list
+    validate_has_kwargs: bool
 
-    inputs = prompt[unique_id]['inputs']
-    class_type = prompt[unique_id]['class_type']
-    obj_class = nodes.NODE_CLASS_MAPPINGS[class_type]
+    @property
+    def has_combo(self):
+        return any(isinstance(input_type, list) for input_type, _, _ in self.input_info.values())
 
+def get_validation_spec(obj_class):
+    """What validate_inputs needs to know about a node class, resolved from INPUT_TYPES()."""
     class_inputs = obj_class.INPUT_TYPES()
     valid_inputs = set(class_inputs.get('required',{})).union(set(class_inputs.get('optional',{})))
-
-    errors = []
-    valid = True
+    input_info = {x: get_input_info(obj_class, x, class_inputs) for x in valid_inputs}
 
     validate_function_inputs = []
     validate_has_kwargs = False
@@ -763,10 +768,57 @@ async def validate_inputs(prompt_id, prompt, item, validated):
         argspec = inspect.getfullargspec(validate_function)
         validate_function_inputs = argspec.args
         validate_has_kwargs = argspec.varkw is not None
+    return NodeValidationSpec(obj_class, input_info, validate_function_name, validate_function_inputs, validate_has_kwargs)
+
+class StructureValidation:
+    """
+    Validation work that only depends on the shape of a workflow: the spec of
+    every node and the linked inputs whose types were already checked.
+
+    Specs with combo inputs are not kept, since their options (e.g. model
+    files) can change between submissions. The node classes everything was
+    derived from are recorded so the memo can be dropped once node
+    definitions are reloaded.
+    """
+    def __init__(self):
+        self.specs = {}
+        self.link_types = {}
+        self.classes = {}
+
+    def matches(self, prompt):
+        for node_id, obj_class in self.classes.items():
+            if nodes.NODE_CLASS_MAPPINGS.get(prompt[node_id]['class_type']) is not obj_class:
+                return False
+        return True
+
+# Keyed by prompt_fingerprint(); literal values are validated on every submission.
+VALIDATION_MEMO = StructureMemo()
+
+async def validate_inputs(prompt_id, prompt, item, validated, memo: Optional[StructureValidation] = None):
+    unique_id = item
+    if unique_id in validated:
+        return validated[unique_id]
+
+    inputs = prompt[unique_id]['inputs']
+    class_type = prompt[unique_id]['class_type']
+    spec = memo.specs.get(unique_id) if memo is not None else None
+    if spec is None:
+        spec = get_validation_spec(nodes.NODE_CLASS_MAPPINGS[class_type])
+        if memo is not None and not spec.has_combo:
+            memo.specs[unique_id] = spec
+            memo.classes[unique_id] = spec.obj_class
+    else:
+        VALIDATION_MEMO.count("specs_reused")
+    obj_class = spec.obj_class
+    validate_function_name = spec.validate_function_name
+    validate_function_inputs = spec.validate_function_inputs
+    validate_has_kwargs = spec.validate_has_kwargs
+
+    errors = []
+    valid = True
     received_types = {}
 
-    for x in valid_inputs:
-        input_type, input_category, extra_info = get_input_info(obj_class, x, class_inputs)
+    for x, (input_type, input_category, extra_info) in spec.input_info.items():
         assert extra_info is not None
         if x not in inputs:
             if input_category == "required":
@@ -799,27 +851,37 @@ async def validate_inputs(prompt_id, prompt, item, validated):
                 continue
 
             o_id = val[0]
-            o_class_type = prompt[o_id]['class_type']
-            r = nodes.NODE_CLASS_MAPPINGS[o_class_type].RETURN_TYPES
-            received_type = r[val[1]]
-            received_types[x] = received_type
-            if 'input_types' not in validate_function_inputs and not validate_node_input(received_type, input_type):
-                details = f"{x}, received_type({received_type}) mismatch input_type({input_type})"
-                error = {
-                    "type": "return_type_mismatch",
-                    "message": "Return type mismatch between linked nodes",
-                    "details": details,
-                    "extra_info": {
-                        "input_name": x,
-                        "input_config": info,
-                        "received_type": received_type,
-                        "linked_node": val
+            received_type = memo.link_types.get((unique_id, x)) if memo is not None else None
+            if received_type is not None:
+                # This link already passed the type check in an earlier prompt of the same shape.
+                VALIDATION_MEMO.count("link_checks_reused")
+                received_types[x] = received_type
+            else:
+                o_class_type = prompt[o_id]['class_type']
+                r = nodes.NODE_CLASS_MAPPINGS[o_class_type].RETURN_TYPES
+                received_type = r[val[1]]
+                received_types[x] = received_type
+                if 'input_types' not in validate_function_inputs and not validate_node_input(received_type, input_type):
+                    details = f"{x}, received_type({received_type}) mismatch input_type({input_type})"
+                    error = {
+                        "type": "return_type_mismatch",
+                        "message": "Return type mismatch between linked nodes",
+                        "details": details,
+                        "extra_info": {
+                            "input_name": x,
+                            "input_config": info,
+                            "received_type": received_type,
+                            "linked_node": val
+                        }
                     }
-                }
-                errors.append(error)
-                continue
+                    errors.append(error)
+                    continue
+                if memo is not None:
+                    memo.link_types[(unique_id, x)] = received_type
+                    memo.classes[unique_id] = obj_class
+                    memo.classes[o_id] = nodes.NODE_CLASS_MAPPINGS[o_class_type]
             try:
-                r = await validate_inputs(prompt_id, prompt, o_id, validated)
+                r = await validate_inputs(prompt_id, prompt, o_id, validated, memo)
                 if r[0] is False:
                     # `r` will be set in `validated[o_id]` already
                     valid = False
@@ -977,6 +1039,33 @@ def full_type_name(klass):
         return klass.__qualname__
     return module + '.' + klass.__qualname__
 
+async def validate_outputs(prompt_id, prompt, outputs, memo=None):
+    validated = {}
+    results = {}
+    for o in outputs:
+        valid = False
+        reasons = []
+        try:
+            m = await validate_inputs(prompt_id, prompt, o, validated, memo)
+            valid = m[0]
+            reasons = m[1]
+        except Exception as ex:
+            typ, _, tb = sys.exc_info()
+            valid = False
+            exception_type = full_type_name(typ)
+            reasons = [{
+                "type": "exception_during_validation",
+                "message": "Exception when validating node",
+                "details": str(ex),
+                "extra_info": {
+                    "exception_type": exception_type,
+                    "traceback": traceback.format_tb(tb)
+                }
+            }]
+            validated[o] = (False, reasons, o)
+        results[o] = (valid, reasons)
+    return validated, results
+
 async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[str], None]):
     outputs = set()
     for x in prompt:
@@ -1013,32 +1102,25 @@ async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[
         }
         return (False, error, [], {})
 
+    fingerprint = prompt_fingerprint(prompt)
+    memo = VALIDATION_MEMO.get(fingerprint, StructureValidation)
+    if not memo.matches(prompt):
+        # Node definitions were reloaded since the memo was made.
+        VALIDATION_MEMO.discard(fingerprint)
+        memo = VALIDATION_MEMO.get(fingerprint, StructureValidation)
+    reused = len(memo.classes) > 0
+    validated, results = await validate_outputs(prompt_id, prompt, outputs, memo)
+    if reused and not all(valid is True for valid, _ in results.values()):
+        # INPUT_TYPES() may have changed since the memo was made.
+        VALIDATION_MEMO.discard(fingerprint)
+        VALIDATION_MEMO.count("revalidated")
+        memo = VALIDATION_MEMO.get(fingerprint, StructureValidation)
+        validated, results = await validate_outputs(prompt_id, prompt, outputs, memo)
+
     good_outputs = set()
     errors = []
     node_errors = {}
-    validated = {}
-    for o in outputs:
-        valid = False
-        reasons = []
-        try:
-            m = await validate_inputs(prompt_id, prompt, o, validated)
-            valid = m[0]
-            reasons = m[1]
-        except Exception as ex:
-            typ, _, tb = sys.exc_info()
-            valid = False
-            exception_type = full_type_name(typ)
-            reasons = [{
-                "type": "exception_during_validation",
-                "message": "Exception when validating node",
-                "details": str(ex),
-                "extra_info": {
-                    "exception_type": exception_type,
-                    "traceback": traceback.format_tb(tb)
-                }
-            }]
-            validated[o] = (False, reasons, o)
-
+    for o, (valid, reasons) in results.items():
         if valid is True:
             good_outputs.add(o)
         else:
@@ -1089,29 +1171,42 @@ async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[
 MAXIMUM_HISTORY_SIZE = 10000
 
 class PromptQueue:
-    def __init__(self, server):
+    def __init__(self, server, lanes=None):
         self.server = server
         self.mutex = threading.RLock()
         self.not_empty = threading.Condition(self.mutex)
         self.task_counter = 0
-        self.queue = []
+        self.scheduler = LaneScheduler(lanes or parse_lanes(DEFAULT_LANES))
         self.currently_running = {}
-        self.history = {}
+        self.history = PromptHistory(MAXIMUM_HISTORY_SIZE)
+        self.snapshots = {}
         self.flags = {}
 
-    def put(self, item):
+    def set_history_store(self, history: PromptHistory):
         with self.mutex:
-            heapq.heappush(self.queue, item)
+            for prompt_id, entry in self.history.page(0, None):
+                history.add(prompt_id, json.loads(entry))
+            self.history = history
+
+    @property
+    def queue(self):
+        """Queued items in submission order; the scheduler decides which runs next."""
+        with self.mutex:
+            return self.scheduler.items()
+
+    def put(self, item, lane=None):
+        with self.mutex:
+            self.scheduler.put(item, lane)
             self.server.queue_updated()
             self.not_empty.notify()
 
     def get(self, timeout=None):
         with self.not_empty:
-            while len(self.queue) == 0:
+            while len(self.scheduler) == 0:
                 self.not_empty.wait(timeout=timeout)
-                if timeout is not None and len(self.queue) == 0:
+                if timeout is not None and len(self.scheduler) == 0:
                     return None
-            item = heapq.heappop(self.queue)
+            item = self.scheduler.pop()
             i = self.task_counter
             self.currently_running[i] = copy.deepcopy(item)
             self.task_counter += 1
@@ -1127,31 +1222,46 @@ class PromptQueue:
                   status: Optional['PromptQueue.ExecutionStatus'], process_item=None):
         with self.mutex:
             prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
-                self.history.pop(next(iter(self.history)))
 
             status_dict: Optional[dict] = None
             if status is not None:
-                status_dict = copy.deepcopy(status._asdict())
+                status_dict = status._asdict()
 
             if process_item is not None:
                 prompt = process_item(prompt)
 
-            self.history[prompt[1]] = {
+            entry = {
                 "prompt": prompt,
                 "outputs": {},
                 'status': status_dict,
             }
-            self.history[prompt[1]].update(history_result)
+            entry.update(history_result)
+            # Stored serialized, so later changes to these objects don't leak in.
+            self.history.add(prompt[1], entry)
             self.server.queue_updated()
 
     # Note: slow
     def get_current_queue(self):
+        """
+        Running and queued items as read-only snapshots. An item is frozen
+        once and its snapshot reused until it leaves the queue, instead of
+        deep-copying the whole queue on every call.
+        """
         with self.mutex:
-            out = []
-            for x in self.currently_running.values():
-                out += [x]
-            return (out, copy.deepcopy(self.queue))
+            snapshots = {}
+
+            def snapshot(item):
+                cached = self.snapshots.get(id(item))
+                # The cache holds the item itself, so its id cannot be reused while cached.
+                if cached is None or cached[0] is not item:
+                    cached = (item, freeze(item))
+                snapshots[id(item)] = cached
+                return cached[1]
+
+            running = [snapshot(x) for x in self.currently_running.values()]
+            queued = [snapshot(x) for x in self.queue]
+            self.snapshots = snapshots
+            return (running, queued)
 
     # read-safe as long as queue items are immutable
     def get_current_queue_volatile(self):
@@ -1160,62 +1270,61 @@ class PromptQueue:
             queued = copy.copy(self.queue)
             return (running, queued)
 
+    def peek(self, count):
+        """The next `count` queued items in the order they will run."""
+        with self.mutex:
+            return self.scheduler.peek(count)
+
     def get_tasks_remaining(self):
         with self.mutex:
-            return len(self.queue) + len(self.currently_running)
+            return len(self.scheduler) + len(self.currently_running)
+
+    def get_lane_stats(self):
+        with self.mutex:
+            return self.scheduler.stats()
 
     def wipe_queue(self):
         with self.mutex:
-            self.queue = []
+            self.scheduler.clear()
             self.server.queue_updated()
 
     def delete_queue_item(self, function):
         with self.mutex:
-            for x in range(len(self.queue)):
-                if function(self.queue[x]):
-                    if len(self.queue) == 1:
-                        self.wipe_queue()
-                    else:
-                        self.queue.pop(x)
-                        heapq.heapify(self.queue)
-                    self.server.queue_updated()
-                    return True
+            if self.scheduler.remove(function):
+                self.server.queue_updated()
+                return True
         return False
 
-    def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
+    def _history_items(self, prompt_id=None, max_items=None, offset=-1):
         with self.mutex:
-            if prompt_id is None:
-                out = {}
-                i = 0
-                if offset < 0 and max_items is not None:
-                    offset = len(self.history) - max_items
-                for k in self.history:
-                    if i >= offset:
-                        p = self.history[k]
-                        if map_function is not None:
-                            p = map_function(p)
-                        out[k] = p
-                        if max_items is not None and len(out) >= max_items:
-                            break
-                    i += 1
-                return out
-            elif prompt_id in self.history:
-                p = self.history[prompt_id]
-                if map_function is None:
-                    p = copy.deepcopy(p)
-                else:
-                    p = map_function(p)
-                return {prompt_id: p}
-            else:
-                return {}
+            if prompt_id is not None:
+                entry = self.history.get(prompt_id)
+                return [] if entry is None else [(prompt_id, entry)]
+            if offset < 0:
+                offset = max(0, len(self.history) - max_items) if max_items is not None else 0
+            return self.history.page(offset, max_items)
+
+    def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
+        out = {}
+        for k, entry in self._history_items(prompt_id, max_items, offset):
+            p = json.loads(entry)
+            if map_function is not None:
+                p = map_function(p)
+            out[k] = p
+        return out
+
+    def get_history_json(self, prompt_id=None, max_items=None, offset=-1):
+        """Same as get_history() but returns the JSON text without re-encoding entries."""
+        items = self._history_items(prompt_id, max_items, offset)
+        return "{" + ",".join(f"{json.dumps(k)}:{entry}" for k, entry in items) + "}"
 
     def wipe_history(self):
         with self.mutex:
-            self.history = {}
+            self.history.clear()
 
     def delete_history_item(self, id_to_delete):
         with self.mutex:
-            self.history.pop(id_to_delete, None)
+            self.history.delete(id_to_delete)
 
     def set_flag(self, name, data):
         with self.mutex:
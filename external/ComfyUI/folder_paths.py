@@ -8,6 +8,7 @@ from typing import Literal, List
 from collections.abc import Collection
 
 from comfy.cli_args import args
+from app.model_index import ModelFileIndex
 
 supported_pt_extensions: set[str] = {'.ckpt', '.pt', '.pt2', '.bin', '.pth', '.safetensors', '.pkl', '.sft'}
 
@@ -57,6 +58,9 @@ user_directory = os.path.join(base_path, "user")
 
 filename_list_cache: dict[str, tuple[list[str], dict[str, float], float]] = {}
 
+# Directory listings behind recursive_search, persisted to the user directory by main.py.
+model_index = ModelFileIndex()
+
 class CacheHelper:
     """
     Helper class for managing file list cache data.
@@ -228,6 +232,7 @@ def add_model_folder_path(folder_name: str, full_folder_path: str, is_default: b
                 paths.append(full_folder_path)
     else:
         folder_names_and_paths[folder_name] = ([full_folder_path], set())
+    filename_list_cache.pop(folder_name, None)
 
 def get_folder_paths(folder_name: str) -> list[str]:
     folder_name = map_legacy(folder_name)
@@ -237,40 +242,8 @@ def recursive_search(directory: str, excluded_dir_names: list[str] | None=None)
     if not os.path.isdir(directory):
         return [], {}
 
-    if excluded_dir_names is None:
-        excluded_dir_names = []
-
-    result = []
-    dirs = {}
-
-    # Attempt to add the initial directory to dirs with error handling
-    try:
-        dirs[directory] = os.path.getmtime(directory)
-    except FileNotFoundError:
-        logging.warning(f"Warning: Unable to access {directory}. Skipping this path.")
-
     logging.debug("recursive file list on directory {}".format(directory))
-    dirpath: str
-    subdirs: list[str]
-    filenames: list[str]
-
-    for dirpath, subdirs, filenames in os.walk(directory, followlinks=True, topdown=True):
-        subdirs[:] = [d for d in subdirs if d not in excluded_dir_names]
-        for file_name in filenames:
-            try:
-                relative_path = os.path.relpath(os.path.join(dirpath, file_name), directory)
-                result.append(relative_path)
-            except:
-                logging.warning(f"Warning: Unable to access {file_name}. Skipping this file.")
-                continue
-
-        for d in subdirs:
-            path: str = os.path.join(dirpath, d)
-            try:
-                dirs[path] = os.path.getmtime(path)
-            except FileNotFoundError:
-                logging.warning(f"Warning: Unable to access {path}. Skipping this path.")
-                continue
+    result, dirs = model_index.scan(directory, excluded_dir_names)
     logging.debug("found {} files".format(len(result)))
     return result, dirs
 
@@ -333,6 +306,9 @@ def cached_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float]
     if folder_name not in filename_list_cache:
         return None
     out = filename_list_cache[folder_name]
+    # out[2] is when the listing was last checked against the disk.
+    if time.perf_counter() - out[2] < args.model_list_refresh_interval:
+        return out
 
     for x in out[1]:
         time_modified = out[1][x]
@@ -346,6 +322,8 @@ def cached_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float]
             if x not in out[1]:
                 return None
 
+    out = (out[0], out[1], time.perf_counter())
+    filename_list_cache[folder_name] = out
     return out
 
 def get_filename_list(folder_name: str) -> list[str]:
@@ -56,6 +56,8 @@ def apply_custom_paths():
         logging.info(f"Setting user directory to: {user_dir}")
         folder_paths.set_user_directory(user_dir)
 
+    folder_paths.model_index.load(os.path.join(folder_paths.get_user_directory(), "model_index.json"))
+
 
 def execute_prestartup_script():
     if args.disable_all_custom_nodes and len(args.whitelist_custom_nodes) == 0:
@@ -148,6 +150,7 @@ import comfy.utils
 
 import execution
 import server
+from comfy_execution.prefetch import ModelPrefetcher
 from protocol import BinaryEventTypes
 import nodes
 import comfy.model_management
@@ -167,6 +170,21 @@ def cuda_malloc_warning():
             logging.warning("\nWARNING: this card most likely does not support cuda-malloc, if you get \"CUDA error\" please run ComfyUI with: --disable-cuda-malloc\n")
 
 
+def start_prefetcher(q, server_instance):
+    if args.prefetch_models <= 0:
+        return None
+    cache = comfy.utils.STATE_DICT_CACHE
+    if not cache.enabled:
+        logging.warning("--prefetch-models needs the state dict cache; set --state-dict-cache-size above 0.")
+        return None
+    prefetcher = ModelPrefetcher(q, cache, args.prefetch_models,
+                                 min(args.prefetch_memory * 1024 * 1024, cache.max_bytes),
+                                 copy=comfy.utils.DISABLE_MMAP,
+                                 pin_memory=comfy.model_management.MAX_PINNED_MEMORY > 0)
+    prefetcher.start()
+    server_instance.prefetcher = prefetcher
+    return prefetcher
+
 def prompt_worker(q, server_instance):
     current_time: float = 0.0
     cache_type = execution.CacheType.CLASSIC
@@ -178,6 +196,7 @@ def prompt_worker(q, server_instance):
         cache_type = execution.CacheType.NONE
 
     e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram } )
+    prefetcher = start_prefetcher(q, server_instance)
     last_gc_collect = 0
     need_gc = False
     gc_collect_interval = 10.0
@@ -199,6 +218,8 @@ def prompt_worker(q, server_instance):
             for k in sensitive:
                 extra_data[k] = sensitive[k]
 
+            if prefetcher is not None:
+                prefetcher.begin(item[2])
             e.execute(item[2], prompt_id, extra_data, item[4])
             need_gc = True
 
@@ -300,6 +321,21 @@ def setup_database():
         logging.error(f"Failed to initialize database. Please ensure you have installed the latest requirements. If the error persists, please report this as in future the database will be required: {e}")
 
 
+def setup_prompt_history(prompt_queue):
+    try:
+        from app.prompt_history import create_persistent_history
+        history = create_persistent_history(execution.MAXIMUM_HISTORY_SIZE)
+        if history is not None:
+            prompt_queue.set_history_store(history)
+    except Exception as e:
+        logging.error(f"Failed to load prompt history from the database, keeping it in memory: {e}")
+
+
+def setup_upload_index(server_instance):
+    from app.upload_index import create_upload_index
+    server_instance.upload_index = create_upload_index()
+
+
 def start_comfyui(asyncio_loop=None):
     """
     Starts the ComfyUI server using the provided asyncio event loop or creates a new one.
@@ -332,6 +368,8 @@ def start_comfyui(asyncio_loop=None):
 
     cuda_malloc_warning()
     setup_database()
+    setup_prompt_history(prompt_server.prompt_queue)
+    setup_upload_index(prompt_server)
 
     prompt_server.add_routes()
     hijack_progress(prompt_server)
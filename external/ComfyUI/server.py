@@ -14,6 +14,8 @@ import struct
 import ssl
 import socket
 import ipaddress
+import re
+import shutil
 from PIL import Image, ImageOps
 from PIL.PngImagePlugin import PngInfo
 from io import BytesIO
@@ -26,6 +28,7 @@ import mimetypes
 from comfy.cli_args import args
 import comfy.utils
 import comfy.model_management
+import comfy.lora
 from comfy_api import feature_flags
 import node_helpers
 from comfyui_version import __version__
@@ -36,9 +39,13 @@ from app.user_manager import UserManager
 from app.model_manager import ModelFileManager
 from app.custom_node_manager import CustomNodeManager
 from app.subgraph_manager import SubgraphManager
+from app.preview_cache import MEMORY_BUDGET, PreviewCache, PreviewSpec, render_preview
+from app.upload_index import UploadHashIndex, hash_stream
 from typing import Optional, Union
 from api_server.routes.internal.internal_routes import InternalRoutes
 from protocol import BinaryEventTypes
+from comfy_execution.caching import SIGNATURE_MEMO
+from comfy_execution.scheduling import parse_lanes
 
 # Import cache control middleware
 from middleware.cache_middleware import cache_control
@@ -177,7 +184,14 @@ class PromptServer():
         self.subgraph_manager = SubgraphManager()
         self.internal_routes = InternalRoutes(self)
         self.supports = ["custom_nodes_from_web"]
-        self.prompt_queue = execution.PromptQueue(self)
+        self.prompt_queue = execution.PromptQueue(self, parse_lanes(args.queue_lanes))
+        self.preview_cache = PreviewCache(
+            os.path.join(folder_paths.get_temp_directory(), "previews"),
+            args.view_cache_size * 1024 * 1024,
+            memory_budget=MEMORY_BUDGET if args.view_cache_size > 0 else 0,
+        )
+        self.upload_index = UploadHashIndex()
+        self.prefetcher = None
         self.loop = loop
         self.messages = asyncio.Queue()
         self.client_session:Optional[aiohttp.ClientSession] = None
@@ -323,19 +337,14 @@ class PromptServer():
 
             return type_dir, dir_type
 
-        def compare_image_hash(filepath, image):
-            hasher = node_helpers.hasher()
-
-            # function to compare hashes of two images to see if it already exists, fix to #3465
-            if os.path.exists(filepath):
-                a = hasher()
-                b = hasher()
-                with open(filepath, "rb") as f:
-                    a.update(f.read())
-                    b.update(image.file.read())
-                    image.file.seek(0)
-                return a.hexdigest() == b.hexdigest()
-            return False
+        def find_duplicate_upload(folder, filename, algorithm, digest):
+            """Name of an existing `name.ext` / `name (i).ext` in folder with the same content."""
+            split = os.path.splitext(filename)
+            for path in self.upload_index.find(folder, algorithm, digest):
+                name = os.path.basename(path)
+                if name == filename or re.fullmatch(re.escape(split[0]) + r" \(\d+\)" + re.escape(split[1]), name):
+                    return name
+            return None
 
         def image_upload(post, image_save_function=None):
             image = post.get("image")
@@ -362,24 +371,35 @@ class PromptServer():
 
                 split = os.path.splitext(filename)
 
+                algorithm = args.default_hashing_function
+                digest = hash_stream(image.file, node_helpers.hasher())
+
                 if overwrite is not None and (overwrite == "true" or overwrite == "1"):
                     pass
                 else:
-                    i = 1
-                    while os.path.exists(filepath):
-                        if compare_image_hash(filepath, image): #compare hash to prevent saving of duplicates with same name, fix for #3465
-                            image_is_duplicate = True
-                            break
-                        filename = f"{split[0]} ({i}){split[1]}"
+                    # compare hashes to prevent saving of duplicates with same name, fix for #3465
+                    duplicate = find_duplicate_upload(full_output_folder, filename, algorithm, digest)
+                    if duplicate is not None:
+                        filename = duplicate
                         filepath = os.path.join(full_output_folder, filename)
-                        i += 1
+                        image_is_duplicate = True
+                    else:
+                        i = 1
+                        while os.path.exists(filepath):
+                            if self.upload_index.hash_file(filepath, algorithm, node_helpers.hasher()) == digest:
+                                image_is_duplicate = True
+                                break
+                            filename = f"{split[0]} ({i}){split[1]}"
+                            filepath = os.path.join(full_output_folder, filename)
+                            i += 1
 
                 if not image_is_duplicate:
                     if image_save_function is not None:
                         image_save_function(image, post, filepath)
                     else:
                         with open(filepath, "wb") as f:
-                            f.write(image.file.read())
+                            shutil.copyfileobj(image.file, f)
+                        self.upload_index.record(filepath, algorithm, digest)
 
                 return web.json_response({"name" : filename, "subfolder": subfolder, "type": image_upload_type})
             else:
@@ -467,77 +487,24 @@ class PromptServer():
                 file = os.path.join(output_dir, filename)
 
                 if os.path.isfile(file):
-                    if 'preview' in request.rel_url.query:
-                        with Image.open(file) as img:
-                            preview_info = request.rel_url.query['preview'].split(';')
-                            image_format = preview_info[0]
-                            if image_format not in ['webp', 'jpeg'] or 'a' in request.rel_url.query.get('channel', ''):
-                                image_format = 'webp'
-
-                            quality = 90
-                            if preview_info[-1].isdigit():
-                                quality = int(preview_info[-1])
-
-                            buffer = BytesIO()
-                            if image_format in ['jpeg'] or request.rel_url.query.get('channel', '') == 'rgb':
-                                img = img.convert("RGB")
-                            img.save(buffer, format=image_format, quality=quality)
-                            buffer.seek(0)
-
-                            return web.Response(body=buffer.read(), content_type=f'image/{image_format}',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
-
-                    if 'channel' not in request.rel_url.query:
-                        channel = 'rgba'
-                    else:
-                        channel = request.rel_url.query["channel"]
-
-                    if channel == 'rgb':
-                        with Image.open(file) as img:
-                            if img.mode == "RGBA":
-                                r, g, b, a = img.split()
-                                new_img = Image.merge('RGB', (r, g, b))
-                            else:
-                                new_img = img.convert("RGB")
-
-                            buffer = BytesIO()
-                            new_img.save(buffer, format='PNG')
-                            buffer.seek(0)
-
-                            return web.Response(body=buffer.read(), content_type='image/png',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
-
-                    elif channel == 'a':
-                        with Image.open(file) as img:
-                            if img.mode == "RGBA":
-                                _, _, _, a = img.split()
-                            else:
-                                a = Image.new('L', img.size, 255)
-
-                            # alpha img
-                            alpha_img = Image.new('RGBA', img.size)
-                            alpha_img.putalpha(a)
-                            alpha_buffer = BytesIO()
-                            alpha_img.save(alpha_buffer, format='PNG')
-                            alpha_buffer.seek(0)
-
-                            return web.Response(body=alpha_buffer.read(), content_type='image/png',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
-                    else:
-                        # Get content type from mimetype, defaulting to 'application/octet-stream'
-                        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                    spec = self.preview_spec(request.rel_url.query)
+                    if spec is not None:
+                        return await self.send_preview(request, file, filename, spec)
+
+                    # Get content type from mimetype, defaulting to 'application/octet-stream'
+                    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
 
-                        # For security, force certain mimetypes to download instead of display
-                        if content_type in {'text/html', 'text/html-sandboxed', 'application/xhtml+xml', 'text/javascript', 'text/css'}:
-                            content_type = 'application/octet-stream'  # Forces download
+                    # For security, force certain mimetypes to download instead of display
+                    if content_type in {'text/html', 'text/html-sandboxed', 'application/xhtml+xml', 'text/javascript', 'text/css'}:
+                        content_type = 'application/octet-stream'  # Forces download
 
-                        return web.FileResponse(
-                            file,
-                            headers={
-                                "Content-Disposition": f"filename=\"{filename}\"",
-                                "Content-Type": content_type
-                            }
-                        )
+                    return web.FileResponse(
+                        file,
+                        headers={
+                            "Content-Disposition": f"filename=\"{filename}\"",
+                            "Content-Type": content_type
+                        }
+                    )
 
             return web.Response(status=404)
 
@@ -603,6 +570,15 @@ class PromptServer():
                     }
                 ]
             }
+            if self.prefetcher is not None:
+                stats = self.prefetcher.stats()
+                system_stats["prefetch"] = {**stats._asdict(), "hit_rate": stats.hit_rate}
+            system_stats["structure_memo"] = {
+                "validation": execution.VALIDATION_MEMO.stats(),
+                "signatures": SIGNATURE_MEMO.stats(),
+            }
+            stats = comfy.lora.MERGED_WEIGHT_CACHE.stats()
+            system_stats["lora_weight_cache"] = {**stats._asdict(), "hit_rate": stats.hit_rate}
             return web.json_response(system_stats)
 
         @routes.get("/features")
@@ -680,12 +656,12 @@ class PromptServer():
             else:
                 offset = -1
 
-            return web.json_response(self.prompt_queue.get_history(max_items=max_items, offset=offset))
+            return web.Response(text=self.prompt_queue.get_history_json(max_items=max_items, offset=offset), content_type="application/json")
 
         @routes.get("/history/{prompt_id}")
         async def get_history_prompt_id(request):
             prompt_id = request.match_info.get("prompt_id", None)
-            return web.json_response(self.prompt_queue.get_history(prompt_id=prompt_id))
+            return web.Response(text=self.prompt_queue.get_history_json(prompt_id=prompt_id), content_type="application/json")
 
         @routes.get("/queue")
         async def get_queue(request):
@@ -696,12 +672,27 @@ class PromptServer():
             queue_info['queue_pending'] = remove_sensitive(current_queue[1])
             return web.json_response(queue_info)
 
+        @routes.get("/queue/lanes")
+        async def get_queue_lanes(request):
+            return web.json_response({"lanes": self.prompt_queue.get_lane_stats()})
+
         @routes.post("/prompt")
         async def post_prompt(request):
             logging.info("got prompt")
             json_data =  await request.json()
             json_data = self.trigger_on_prompt(json_data)
 
+            try:
+                lane = self.prompt_queue.scheduler.resolve_lane(json_data.get("lane"))
+            except ValueError as e:
+                error = {
+                    "type": "invalid_lane",
+                    "message": "Invalid queue lane",
+                    "details": str(e),
+                    "extra_info": {}
+                }
+                return web.json_response({"error": error, "node_errors": {}}, status=400)
+
             if "number" in json_data:
                 number = float(json_data['number'])
             else:
@@ -733,8 +724,8 @@ class PromptServer():
                     for sensitive_val in execution.SENSITIVE_EXTRA_DATA_KEYS:
                         if sensitive_val in extra_data:
                             sensitive[sensitive_val] = extra_data.pop(sensitive_val)
-                    self.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute, sensitive))
-                    response = {"prompt_id": prompt_id, "number": number, "node_errors": valid[3]}
+                    self.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute, sensitive), lane)
+                    response = {"prompt_id": prompt_id, "number": number, "lane": lane, "node_errors": valid[3]}
                     return web.json_response(response)
                 else:
                     logging.warning("invalid prompt: {}".format(valid[1]))
@@ -772,7 +763,7 @@ class PromptServer():
             # Check if a specific prompt_id was provided for targeted interruption
             prompt_id = json_data.get('prompt_id')
             if prompt_id:
-                currently_running, _ = self.prompt_queue.get_current_queue()
+                currently_running, _ = self.prompt_queue.get_current_queue_volatile()
 
                 # Check if the prompt_id matches any currently running prompt
                 should_interrupt = False
@@ -818,6 +809,51 @@ class PromptServer():
 
             return web.Response(status=200)
 
+    @staticmethod
+    def preview_spec(query) -> Optional[PreviewSpec]:
+        """Parse the /view query into a PreviewSpec, or None to send the file as is."""
+        channel = query.get('channel', '')
+        max_size = query.get('max_size', '')
+        max_size = int(max_size) if max_size.isdigit() else 0
+
+        if 'preview' in query or max_size:
+            preview_info = query.get('preview', 'webp').split(';')
+            image_format = preview_info[0]
+            if image_format not in ['webp', 'jpeg'] or 'a' in channel:
+                image_format = 'webp'
+
+            quality = 90
+            if preview_info[-1].isdigit():
+                quality = int(preview_info[-1])
+            return PreviewSpec(image_format, quality, 'rgb' if channel == 'rgb' else 'rgba', max_size)
+
+        if channel in ('rgb', 'a'):
+            return PreviewSpec('png', 0, channel, 0)
+        return None
+
+    async def send_preview(self, request, file, filename, spec: PreviewSpec):
+        headers = {"Content-Disposition": f"filename=\"{filename}\"", "Cache-Control": "no-cache"}
+        key = PreviewCache.key(file, spec)
+
+        cached = self.preview_cache.get_memory(key)
+        if cached is not None:
+            data, etag = cached
+            if request.if_none_match and any(e.value in (etag, '*') for e in request.if_none_match):
+                response = web.Response(status=304, headers=headers)
+                response.etag = etag
+                return response
+        else:
+            path = self.preview_cache.get_path(key)
+            if path is not None:
+                # FileResponse answers If-None-Match itself with the same ETag.
+                return web.FileResponse(path, headers={**headers, "Content-Type": spec.content_type})
+            data = await asyncio.to_thread(render_preview, file, spec)
+            etag = await asyncio.to_thread(self.preview_cache.put, key, data)
+
+        response = web.Response(body=data, content_type=spec.content_type, headers=headers)
+        response.etag = etag
+        return response
+
     async def setup(self):
         timeout = aiohttp.ClientTimeout(total=None) # no timeout
         self.client_session = aiohttp.ClientSession(timeout=timeout)
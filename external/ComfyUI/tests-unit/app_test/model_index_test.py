@@ -0,0 +1,125 @@
+import json
+import os
+import struct
+from unittest.mock import patch
+
+import pytest
+
+from app.model_index import ModelFileIndex
+
+
+def touch_dir(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def models(tmp_path):
+    root = tmp_path / "models"
+    (root / "sdxl").mkdir(parents=True)
+    (root / ".git").mkdir()
+    (root / "a.safetensors").write_bytes(b"1234")
+    (root / "sdxl" / "b.ckpt").write_bytes(b"12")
+    (root / ".git" / "HEAD").write_bytes(b"x")
+    return str(root)
+
+
+def test_scan_matches_recursive_walk(models):
+    files, dirs = ModelFileIndex().scan(models, [".git"])
+    assert set(files) == {"a.safetensors", os.path.join("sdxl", "b.ckpt")}
+    assert set(dirs) == {models, os.path.join(models, "sdxl")}
+    assert dirs[models] == os.path.getmtime(models)
+
+
+def test_listing_records_file_sizes(models):
+    files, _ = ModelFileIndex().listing(models, [".git"])
+    sizes = {name: stat.size for name, stat in files}
+    assert sizes == {"a.safetensors": 4, os.path.join("sdxl", "b.ckpt"): 2}
+
+
+def test_only_changed_directories_are_listed(models):
+    index = ModelFileIndex()
+    index.scan(models, [".git"])
+
+    with patch.object(index, "_list_directory", wraps=index._list_directory) as list_directory:
+        index.scan(models, [".git"])
+        assert list_directory.call_count == 0
+
+        with open(os.path.join(models, "sdxl", "c.pt"), "wb"):
+            pass
+        touch_dir(os.path.join(models, "sdxl"))
+        files, _ = index.scan(models, [".git"])
+        assert [call.args[0] for call in list_directory.call_args_list] == [os.path.join(models, "sdxl")]
+    assert os.path.join("sdxl", "c.pt") in files
+
+
+def test_index_is_persisted(models, tmp_path):
+    path = str(tmp_path / "user" / "model_index.json")
+    index = ModelFileIndex()
+    index.load(path)
+    index.scan(models, [".git"])
+    index.flush()
+    assert os.path.isfile(path)
+
+    reopened = ModelFileIndex()
+    reopened.load(path)
+    with patch.object(reopened, "_list_directory") as list_directory:
+        files, _ = reopened.scan(models, [".git"])
+        assert list_directory.call_count == 0
+    assert set(files) == {"a.safetensors", os.path.join("sdxl", "b.ckpt")}
+
+
+def test_removed_directories_are_dropped(models):
+    index = ModelFileIndex()
+    index.scan(models, [".git"])
+    os.remove(os.path.join(models, "sdxl", "b.ckpt"))
+    os.rmdir(os.path.join(models, "sdxl"))
+
+    files, dirs = index.scan(models, [".git"])
+    assert files == ["a.safetensors"]
+    assert list(dirs) == [models]
+
+
+def test_unreadable_index_is_ignored(models, tmp_path):
+    path = tmp_path / "model_index.json"
+    path.write_text("{not json")
+    index = ModelFileIndex()
+    index.load(str(path))
+    assert set(index.scan(models, [".git"])[0]) == {"a.safetensors", os.path.join("sdxl", "b.ckpt")}
+
+
+def test_safetensors_metadata_is_cached(tmp_path):
+    path = tmp_path / "model.safetensors"
+    header = json.dumps({"__metadata__": {"ss_network_dim": "16"}}).encode("utf-8")
+    path.write_bytes(struct.pack("<Q", len(header)) + header)
+
+    index = ModelFileIndex()
+    assert index.safetensors_metadata(str(path)) == {"ss_network_dim": "16"}
+    with patch("app.model_index.read_safetensors_metadata") as read:
+        assert index.safetensors_metadata(str(path)) == {"ss_network_dim": "16"}
+        assert read.call_count == 0
+
+
+def test_saves_are_batched(models, tmp_path):
+    index = ModelFileIndex(save_delay=60)
+    index.load(str(tmp_path / "model_index.json"))
+    for i in range(20):
+        path = os.path.join(models, f"lora_{i}.safetensors")
+        header = json.dumps({"__metadata__": {"i": str(i)}}).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(struct.pack("<Q", len(header)) + header)
+
+    with patch.object(index, "save", wraps=index.save) as save:
+        index.scan(models, [".git"])
+        for i in range(20):
+            index.safetensors_metadata(os.path.join(models, f"lora_{i}.safetensors"))
+        assert save.call_count == 0
+        index.flush()
+        index.flush()
+        assert save.call_count == 1
+
+    reopened = ModelFileIndex()
+    reopened.load(str(tmp_path / "model_index.json"))
+    with patch("app.model_index.read_safetensors_metadata") as read:
+        assert reopened.safetensors_metadata(os.path.join(models, "lora_3.safetensors")) == {"i": "3"}
+        assert read.call_count == 0
@@ -0,0 +1,95 @@
+import os
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app.preview_cache import PreviewCache, PreviewSpec, render_preview
+
+
+@pytest.fixture
+def image_file(tmp_path):
+    path = tmp_path / "image.png"
+    Image.new("RGBA", (64, 32), (255, 0, 0, 128)).save(path)
+    return str(path)
+
+
+def test_render_preview_formats(image_file):
+    webp = Image.open(BytesIO(render_preview(image_file, PreviewSpec("webp", 90, "rgba", 0))))
+    assert webp.format == "WEBP"
+    assert webp.size == (64, 32)
+
+    jpeg = Image.open(BytesIO(render_preview(image_file, PreviewSpec("jpeg", 80, "rgba", 0))))
+    assert jpeg.format == "JPEG"
+    assert jpeg.mode == "RGB"
+
+
+def test_render_preview_channels(image_file):
+    rgb = Image.open(BytesIO(render_preview(image_file, PreviewSpec("png", 0, "rgb", 0))))
+    assert rgb.mode == "RGB"
+    assert rgb.getpixel((0, 0)) == (255, 0, 0)
+
+    alpha = Image.open(BytesIO(render_preview(image_file, PreviewSpec("png", 0, "a", 0))))
+    assert alpha.mode == "RGBA"
+    assert alpha.getpixel((0, 0))[3] == 128
+
+
+def test_render_preview_thumbnail_keeps_aspect(image_file):
+    thumb = Image.open(BytesIO(render_preview(image_file, PreviewSpec("webp", 90, "rgba", 16))))
+    assert thumb.size == (16, 8)
+
+
+def test_key_changes_with_source_and_spec(image_file):
+    spec = PreviewSpec("webp", 90, "rgba", 0)
+    key = PreviewCache.key(image_file, spec)
+    assert key == PreviewCache.key(image_file, spec)
+    assert key != PreviewCache.key(image_file, spec._replace(quality=80))
+
+    stat = os.stat(image_file)
+    os.utime(image_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert key != PreviewCache.key(image_file, spec)
+
+
+def test_put_serves_from_memory_and_disk(tmp_path):
+    cache = PreviewCache(str(tmp_path / "previews"), disk_budget=1024)
+    etag = cache.put("k1", b"data")
+
+    assert cache.get_memory("k1") == (b"data", etag)
+    path = cache.get_path("k1")
+    with open(path, "rb") as f:
+        assert f.read() == b"data"
+    stat = os.stat(path)
+    assert etag == f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def test_disk_lru_eviction(tmp_path):
+    cache = PreviewCache(str(tmp_path / "previews"), disk_budget=10, memory_budget=0)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get_path("a")  # a is now the most recently used
+    cache.put("c", b"1234")
+
+    assert cache.get_path("b") is None
+    assert not os.path.exists(tmp_path / "previews" / "b")
+    assert cache.get_path("a") is not None
+    assert cache.get_path("c") is not None
+
+
+def test_memory_lru_eviction(tmp_path):
+    cache = PreviewCache(str(tmp_path / "previews"), disk_budget=0, memory_budget=8)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get_memory("a")
+    cache.put("c", b"1234")
+
+    assert cache.get_memory("b") is None
+    assert cache.get_memory("a") is not None
+    assert cache.get_path("a") is None
+
+
+def test_existing_files_are_indexed_on_start(tmp_path):
+    directory = tmp_path / "previews"
+    PreviewCache(str(directory), disk_budget=1024).put("a", b"1234")
+
+    reopened = PreviewCache(str(directory), disk_budget=1024)
+    assert reopened.get_path("a") is not None
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database.history import DatabasePromptHistory
+from app.database.models import Base
+from app.prompt_history import PromptHistory
+
+
+def make_entry(prompt_id, number=0):
+    return {
+        "prompt": [number, prompt_id, {"1": {"class_type": "Node"}}, {}, ["1"]],
+        "outputs": {"1": {"images": [{"filename": f"{prompt_id}.png"}]}},
+        "status": {"status_str": "success", "completed": True, "messages": []},
+    }
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture(params=["memory", "database"])
+def history(request, session_factory):
+    if request.param == "memory":
+        return PromptHistory(max_size=5)
+    return DatabasePromptHistory(5, session_factory)
+
+
+def test_add_and_get_returns_fresh_copies(history):
+    entry = make_entry("a")
+    history.add("a", entry)
+    entry["outputs"].clear()
+
+    stored = json.loads(history.get("a"))
+    assert stored["outputs"]["1"]["images"][0]["filename"] == "a.png"
+    assert "a" in history
+    assert history.get("missing") is None
+
+
+def test_oldest_entries_are_pruned(history):
+    for i in range(8):
+        history.add(f"p{i}", make_entry(f"p{i}", i))
+
+    assert len(history) == 5
+    assert [k for k, _ in history.page(0, None)] == ["p3", "p4", "p5", "p6", "p7"]
+
+
+def test_page_offset_and_limit(history):
+    for i in range(5):
+        history.add(f"p{i}", make_entry(f"p{i}", i))
+
+    assert [k for k, _ in history.page(1, 2)] == ["p1", "p2"]
+    assert [k for k, _ in history.page(4, 10)] == ["p4"]
+    assert history.page(5, 10) == []
+
+
+def test_readding_keeps_position(history):
+    history.add("a", make_entry("a"))
+    history.add("b", make_entry("b"))
+    history.add("a", make_entry("a", 7))
+
+    assert [k for k, _ in history.page(0, None)] == ["a", "b"]
+    assert json.loads(history.get("a"))["prompt"][0] == 7
+
+
+def test_delete_and_clear(history):
+    for i in range(3):
+        history.add(f"p{i}", make_entry(f"p{i}", i))
+
+    history.delete("p1")
+    history.delete("unknown")
+    assert len(history) == 2
+    assert "p1" not in history
+
+    history.clear()
+    assert len(history) == 0
+    assert history.page(0, None) == []
+
+
+def test_database_history_survives_reopen(session_factory):
+    history = DatabasePromptHistory(10, session_factory)
+    history.add("a", make_entry("a"))
+    history.add("b", make_entry("b"))
+
+    reopened = DatabasePromptHistory(10, session_factory)
+    assert len(reopened) == 2
+    assert json.loads(reopened.get("b"))["prompt"][1] == "b"
+
+
+def test_database_history_prunes_on_smaller_limit(session_factory):
+    history = DatabasePromptHistory(10, session_factory)
+    for i in range(6):
+        history.add(f"p{i}", make_entry(f"p{i}", i))
+
+    reopened = DatabasePromptHistory(4, session_factory)
+    assert [k for k, _ in reopened.page(0, None)] == ["p2", "p3", "p4", "p5"]
+
+
+def test_database_pages_seek_by_key_across_gaps(session_factory):
+    from sqlalchemy import event
+
+    history = DatabasePromptHistory(10, session_factory)
+    for i in range(6):
+        history.add(f"p{i}", make_entry(f"p{i}", i))
+    history.delete("p1")
+    history.delete("p3")
+
+    statements = []
+    engine = session_factory.kw["bind"]
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, params, *args: statements.append(params))
+    assert [k for k, _ in history.page(1, 2)] == ["p2", "p4"]
+    assert [k for k, _ in history.page(3, None)] == ["p5"]
+    # (start id, limit, offset): pages seek to a key and never skip rows.
+    assert statements == [(3, 2, 0), (6,)]
@@ -0,0 +1,105 @@
+import hashlib
+import os
+from io import BytesIO
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Base
+from app.database.upload_index import DatabaseUploadHashIndex
+from app.upload_index import UploadHashIndex, hash_stream
+
+
+class CountingHasher:
+    calls = 0
+
+    def __init__(self):
+        CountingHasher.calls += 1
+        self._h = hashlib.sha256()
+
+    def update(self, data):
+        self._h.update(data)
+
+    def hexdigest(self):
+        return self._h.hexdigest()
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'uploads.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture(params=["memory", "database"])
+def index(request, session_factory):
+    if request.param == "memory":
+        return UploadHashIndex()
+    return DatabaseUploadHashIndex(session_factory)
+
+
+def test_hash_stream_rewinds():
+    stream = BytesIO(b"x" * 3_000_000)
+    assert hash_stream(stream, hashlib.sha256) == sha256(b"x" * 3_000_000)
+    assert stream.tell() == 0
+
+
+def test_hash_file_is_cached_until_file_changes(index, tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"one")
+    CountingHasher.calls = 0
+
+    assert index.hash_file(str(path), "sha256", CountingHasher) == sha256(b"one")
+    assert index.hash_file(str(path), "sha256", CountingHasher) == sha256(b"one")
+    assert CountingHasher.calls == 1
+
+    path.write_bytes(b"changed")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert index.hash_file(str(path), "sha256", CountingHasher) == sha256(b"changed")
+    assert CountingHasher.calls == 2
+
+
+def test_find_only_returns_current_files_in_directory(index, tmp_path):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    a = tmp_path / "a.png"
+    b = sub / "b.png"
+    for path in (a, b):
+        path.write_bytes(b"same")
+        index.record(str(path), "sha256", sha256(b"same"))
+
+    assert index.find(str(tmp_path), "sha256", sha256(b"same")) == [str(a)]
+    assert index.find(str(tmp_path), "md5", sha256(b"same")) == []
+
+    a.write_bytes(b"different content")
+    stat = os.stat(a)
+    os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert index.find(str(tmp_path), "sha256", sha256(b"same")) == []
+
+
+def test_find_forgets_deleted_files(index, tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"data")
+    index.record(str(path), "sha256", sha256(b"data"))
+    os.remove(path)
+
+    assert index.find(str(tmp_path), "sha256", sha256(b"data")) == []
+    assert index._get(str(path)) is None
+
+
+def test_database_index_survives_reopen(session_factory, tmp_path):
+    path = tmp_path / "a.png"
+    path.write_bytes(b"data")
+    DatabaseUploadHashIndex(session_factory).record(str(path), "sha256", sha256(b"data"))
+
+    reopened = DatabaseUploadHashIndex(session_factory)
+    CountingHasher.calls = 0
+    assert reopened.hash_file(str(path), "sha256", CountingHasher) == sha256(b"data")
+    assert CountingHasher.calls == 0
+    assert reopened.find(str(tmp_path), "sha256", sha256(b"data")) == [str(path)]
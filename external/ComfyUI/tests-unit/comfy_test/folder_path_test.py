@@ -106,6 +106,25 @@ def test_get_filename_list(mock_folder_names_and_paths, mock_recursive_search):
     mock_recursive_search.return_value = (["file1.txt", "file2.jpg"], {})
     assert folder_paths.get_filename_list("test_folder") == ["file1.txt"]
 
+def test_filename_list_is_rechecked_after_refresh_interval(temp_dir, monkeypatch):
+    monkeypatch.setattr(folder_paths.args, "model_list_refresh_interval", 60)
+    monkeypatch.setitem(folder_paths.folder_names_and_paths, "interval_test", ([temp_dir], {".txt"}))
+    with open(os.path.join(temp_dir, "a.txt"), "w"):
+        pass
+    assert folder_paths.get_filename_list("interval_test") == ["a.txt"]
+
+    with open(os.path.join(temp_dir, "b.txt"), "w"):
+        pass
+    stat = os.stat(temp_dir)
+    os.utime(temp_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with patch("os.path.getmtime") as getmtime:
+        assert folder_paths.get_filename_list("interval_test") == ["a.txt"]
+        assert getmtime.call_count == 0
+
+    monkeypatch.setattr(folder_paths.args, "model_list_refresh_interval", 0)
+    assert folder_paths.get_filename_list("interval_test") == ["a.txt", "b.txt"]
+    folder_paths.filename_list_cache.pop("interval_test", None)
+
 def test_get_save_image_path(temp_dir):
     with patch("folder_paths.output_directory", temp_dir):
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path("test", temp_dir, 100, 100)
@@ -0,0 +1,107 @@
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy.lora
+import comfy.model_patcher
+from comfy.merged_weight_cache import MergedWeightCache
+from comfy.weight_adapter.lora import LoRAAdapter
+
+
+class TinyModel(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.linear = torch.nn.Linear(8, 8)
+
+
+def make_lora(seed):
+    g = torch.Generator().manual_seed(seed)
+    up = torch.randn(8, 2, generator=g)
+    down = torch.randn(2, 8, generator=g)
+    return LoRAAdapter(set(), (up, down, None, None, None, None))
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = MergedWeightCache(1024 * 1024)
+    monkeypatch.setattr(comfy.lora, "MERGED_WEIGHT_CACHE", cache)
+    return cache
+
+
+def patched_weight(model, lora, strength):
+    patcher = comfy.model_patcher.ModelPatcher(model, torch.device("cpu"), torch.device("cpu"))
+    patcher.add_patches({"linear.weight": lora}, strength)
+    patcher.patch_model()
+    out = model.linear.weight.detach().clone()
+    patcher.unpatch_model()
+    return out
+
+
+def test_cache_key_depends_on_patches_and_strength(cache):
+    model = TinyModel()
+    weight = model.linear.weight
+    lora = make_lora(0)
+    key, _ = cache.key(model, "linear.weight", weight, [(1.0, lora, 1.0, None, None)])
+    assert key == cache.key(model, "linear.weight", weight, [(1.0, lora, 1.0, None, None)])[0]
+    assert key != cache.key(model, "linear.weight", weight, [(0.5, lora, 1.0, None, None)])[0]
+    assert key != cache.key(model, "linear.weight", weight, [(1.0, make_lora(0), 1.0, None, None)])[0]
+    assert key != cache.key(TinyModel(), "linear.weight", weight, [(1.0, lora, 1.0, None, None)])[0]
+
+
+def test_get_returns_private_copies(cache):
+    cache.put("k", torch.ones(4), [], 0.5)
+    first = cache.get("k", torch.device("cpu"))
+    first.zero_()
+    assert torch.equal(cache.get("k", torch.device("cpu")), torch.ones(4))
+    assert cache.get("missing", torch.device("cpu")) is None
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries, stats.bytes) == (2, 1, 1, 16)
+    assert stats.hit_rate == pytest.approx(2 / 3)
+    assert stats.seconds_saved > 0
+
+
+def test_lru_eviction_by_bytes():
+    cache = MergedWeightCache(32)
+    cache.put("a", torch.zeros(4), [], 0)
+    cache.put("b", torch.zeros(4), [], 0)
+    cache.get("a", torch.device("cpu"))
+    cache.put("c", torch.zeros(4), [], 0)
+    assert cache.get("b", torch.device("cpu")) is None
+    assert cache.get("a", torch.device("cpu")) is not None
+    assert cache.stats().bytes == 32
+
+
+def test_model_patcher_reuses_merged_weights(cache):
+    model = TinyModel()
+    base = model.linear.weight.detach().clone()
+    lora_a, lora_b = make_lora(1), make_lora(2)
+
+    expected_a = patched_weight(model, lora_a, 0.8)
+    assert cache.stats().misses == 1
+    assert torch.equal(model.linear.weight, base)
+
+    expected_b = patched_weight(model, lora_b, 0.8)
+    assert not torch.equal(expected_a, expected_b)
+
+    assert torch.equal(patched_weight(model, lora_a, 0.8), expected_a)
+    assert torch.equal(patched_weight(model, lora_b, 0.8), expected_b)
+    assert cache.stats().hits == 2
+
+    assert not torch.equal(patched_weight(model, lora_a, 0.3), expected_a)
+    assert cache.stats().misses == 3
+    assert torch.equal(model.linear.weight, base)
+
+
+def test_disabled_cache_matches_enabled(monkeypatch):
+    model = TinyModel()
+    lora = make_lora(3)
+    monkeypatch.setattr(comfy.lora, "MERGED_WEIGHT_CACHE", MergedWeightCache(0))
+    uncached = patched_weight(model, lora, 1.0)
+
+    monkeypatch.setattr(comfy.lora, "MERGED_WEIGHT_CACHE", MergedWeightCache(1024 * 1024))
+    patched_weight(model, lora, 1.0)
+    assert torch.equal(patched_weight(model, lora, 1.0), uncached)
@@ -0,0 +1,141 @@
+import os
+import struct
+import json
+
+import pytest
+import torch
+import safetensors.torch
+
+from comfy.safetensors_loader import CacheKey, StateDictCache, read_safetensors
+
+
+@pytest.fixture
+def sd():
+    return {
+        "a.weight": torch.randn(4, 3),
+        "b.bias": torch.arange(5, dtype=torch.float16),
+        "c.idx": torch.tensor([1, 2, 3], dtype=torch.int64),
+        "d.bf16": torch.randn(2, 2).to(torch.bfloat16),
+        "e.scalar": torch.tensor(3.5),
+        "f.empty": torch.zeros(0, 4),
+    }
+
+
+@pytest.fixture
+def sd_file(tmp_path, sd):
+    path = str(tmp_path / "model.safetensors")
+    safetensors.torch.save_file(sd, path, metadata={"format": "pt"})
+    return path
+
+
+def assert_same(loaded, expected):
+    assert loaded.keys() == expected.keys()
+    for k, v in expected.items():
+        assert loaded[k].dtype == v.dtype
+        assert loaded[k].shape == v.shape
+        assert torch.equal(loaded[k], v)
+
+
+def test_read_matches_safetensors(sd_file, sd):
+    loaded, metadata = read_safetensors(sd_file)
+    assert_same(loaded, sd)
+    assert metadata == {"format": "pt"}
+
+
+def test_read_with_copy_owns_memory(sd_file, sd):
+    loaded, _ = read_safetensors(sd_file, copy=True)
+    assert_same(loaded, sd)
+    os.remove(sd_file)
+    assert_same(loaded, sd)
+
+
+def test_read_without_metadata(tmp_path):
+    path = str(tmp_path / "plain.safetensors")
+    safetensors.torch.save_file({"x": torch.ones(2)}, path)
+    loaded, metadata = read_safetensors(path)
+    assert metadata is None
+    assert torch.equal(loaded["x"], torch.ones(2))
+
+
+def test_read_rejects_what_it_does_not_understand(tmp_path):
+    path = tmp_path / "weird.safetensors"
+    header = json.dumps({"x": {"dtype": "C64", "shape": [1], "data_offsets": [0, 8]}}).encode("utf-8")
+    path.write_bytes(struct.pack("<Q", len(header)) + header + b"\0" * 8)
+    assert read_safetensors(str(path)) is None
+
+    truncated = tmp_path / "truncated.safetensors"
+    header = json.dumps({"x": {"dtype": "F32", "shape": [4], "data_offsets": [0, 16]}}).encode("utf-8")
+    truncated.write_bytes(struct.pack("<Q", len(header)) + header + b"\0" * 4)
+    assert read_safetensors(str(truncated)) is None
+
+
+def test_read_copies_misaligned_tensors(tmp_path):
+    path = tmp_path / "unpadded.safetensors"
+    values = torch.arange(4, dtype=torch.float32)
+    header = json.dumps({"x": {"dtype": "F32", "shape": [4], "data_offsets": [0, 16]}}).encode("utf-8")
+    header += b" " * ((8 + len(header)) % 4 == 0)
+    assert (8 + len(header)) % 4
+    path.write_bytes(struct.pack("<Q", len(header)) + header + values.numpy().tobytes())
+    loaded, _ = read_safetensors(str(path))
+    assert loaded["x"].data_ptr() % 4 == 0
+    assert torch.equal(loaded["x"], values)
+
+
+def test_cache_hands_out_private_copies(sd_file, sd):
+    cache = StateDictCache(1024 * 1024)
+    key = CacheKey.for_file(sd_file, copy=True)
+    assert cache.put(key, *read_safetensors(sd_file, copy=True))
+
+    first, _ = cache.get(key)
+    first.pop("a.weight")
+    first["b.bias"].add_(1)
+
+    second, metadata = cache.get(key)
+    assert metadata == {"format": "pt"}
+    assert_same(second, sd)
+    assert second["b.bias"].data_ptr() != first["b.bias"].data_ptr()
+
+
+def test_put_with_copy_keeps_the_callers_tensors_private():
+    cache = StateDictCache(1024)
+    sd = {"w": torch.zeros(4)}
+    assert cache.put(CacheKey("a", 0, 0, True), sd, None, copy=True)
+    sd["w"].add_(1)
+    cached, _ = cache.get(CacheKey("a", 0, 0, True))
+    assert torch.equal(cached["w"], torch.zeros(4))
+
+
+def test_cache_key_changes_with_file(sd_file):
+    key = CacheKey.for_file(sd_file, copy=False)
+    stat = os.stat(sd_file)
+    os.utime(sd_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert CacheKey.for_file(sd_file, copy=False) != key
+
+
+def test_cache_evicts_least_recently_used():
+    cache = StateDictCache(100)
+    cache.put(CacheKey("a", 0, 0, False), {"w": torch.zeros(12)}, None)
+    cache.put(CacheKey("b", 0, 0, False), {"w": torch.zeros(12)}, None)
+    assert cache.get(CacheKey("a", 0, 0, False)) is not None
+
+    cache.put(CacheKey("c", 0, 0, False), {"w": torch.zeros(12)}, None)
+    assert CacheKey("a", 0, 0, False) in cache
+    assert CacheKey("b", 0, 0, False) not in cache
+    assert CacheKey("c", 0, 0, False) in cache
+
+
+def test_cache_skips_oversized_and_replaces_stale_versions():
+    cache = StateDictCache(64)
+    assert not cache.put(CacheKey("big", 0, 0, False), {"w": torch.zeros(32)}, None)
+    assert len(cache) == 0
+
+    cache.put(CacheKey("a", 1, 0, False), {"w": torch.zeros(4)}, None)
+    cache.put(CacheKey("a", 2, 0, False), {"w": torch.zeros(4)}, None)
+    assert len(cache) == 1
+    assert cache.get(CacheKey("a", 1, 0, False)) is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = StateDictCache(0)
+    assert not cache.put(CacheKey("a", 0, 0, False), {"w": torch.zeros(4)}, None)
+    assert len(cache) == 0
@@ -0,0 +1,136 @@
+import time
+
+import pytest
+import torch
+import safetensors.torch
+
+import folder_paths
+from comfy.safetensors_loader import CacheKey, StateDictCache
+from comfy_execution.prefetch import ModelPrefetcher, model_files
+
+
+class FakeQueue:
+    def __init__(self, prompts):
+        self.pending = list(prompts)
+        self.running = []
+
+    def peek(self, count):
+        return [(i, f"p{i}", prompt, {}, []) for i, prompt in enumerate(self.pending[:count])]
+
+    def get_current_queue_volatile(self):
+        return [(0, "running", prompt, {}, []) for prompt in self.running], []
+
+    def start_next(self):
+        self.running = [self.pending.pop(0)]
+        return self.running[0]
+
+
+def checkpoint(name):
+    return {"1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": name}}}
+
+
+def with_lora(prompt, name):
+    return {**prompt, "2": {"class_type": "LoraLoader", "inputs": {"lora_name": name, "model": ["1", 0]}}}
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    for folder in ("checkpoints", "loras"):
+        (tmp_path / folder).mkdir()
+        monkeypatch.setitem(folder_paths.folder_names_and_paths, folder, ([str(tmp_path / folder)], {".safetensors"}))
+    for name, size in (("a.safetensors", 64), ("b.safetensors", 64), ("big.safetensors", 1024)):
+        safetensors.torch.save_file({"w": torch.randn(size)}, str(tmp_path / "checkpoints" / name))
+    safetensors.torch.save_file({"up": torch.randn(4, 2)}, str(tmp_path / "loras" / "l.safetensors"))
+    (tmp_path / "checkpoints" / "old.ckpt").write_bytes(b"x")
+    return tmp_path
+
+
+def key(models, folder, name):
+    return CacheKey.for_file(str(models / folder / name), copy=False)
+
+
+def test_model_files_resolves_loader_inputs(models):
+    prompt = with_lora(checkpoint("a.safetensors"), "l.safetensors")
+    prompt["3"] = {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "missing.safetensors"}}
+    prompt["4"] = {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "old.ckpt"}}
+    prompt["5"] = {"class_type": "KSampler", "inputs": {"ckpt_name": "b.safetensors"}}
+    assert model_files(prompt) == [str(models / "checkpoints" / "a.safetensors"), str(models / "loras" / "l.safetensors")]
+
+
+def test_prefetch_stages_upcoming_files(models):
+    cache = StateDictCache(1024 * 1024)
+    queue = FakeQueue([checkpoint("a.safetensors"), with_lora(checkpoint("b.safetensors"), "l.safetensors"), checkpoint("big.safetensors")])
+    prefetcher = ModelPrefetcher(queue, cache, lookahead=2, max_bytes=1024 * 1024)
+    prefetcher.prefetch_once()
+
+    assert key(models, "checkpoints", "a.safetensors") in cache
+    assert key(models, "checkpoints", "b.safetensors") in cache
+    assert key(models, "loras", "l.safetensors") in cache
+    assert key(models, "checkpoints", "big.safetensors") not in cache
+    sd, _ = cache.get(key(models, "checkpoints", "a.safetensors"))
+    assert torch.equal(sd["w"], safetensors.torch.load_file(str(models / "checkpoints" / "a.safetensors"))["w"])
+
+    prefetcher.begin(queue.start_next())
+    stats = prefetcher.stats()
+    assert (stats.hits, stats.misses, stats.staged) == (1, 0, 3)
+
+
+def test_budget_limits_staged_bytes(models):
+    cache = StateDictCache(1024 * 1024)
+    queue = FakeQueue([checkpoint("big.safetensors"), checkpoint("a.safetensors")])
+    prefetcher = ModelPrefetcher(queue, cache, lookahead=2, max_bytes=1024)
+    prefetcher.prefetch_once()
+    assert key(models, "checkpoints", "big.safetensors") not in cache
+    assert key(models, "checkpoints", "a.safetensors") in cache
+
+    prefetcher.begin(queue.start_next())
+    assert prefetcher.stats().misses == 1
+    assert prefetcher.stats().hit_rate == 0.0
+
+    prefetcher.begin(queue.start_next())
+    assert prefetcher.stats().hit_rate == pytest.approx(0.5)
+
+
+def test_staged_files_of_deleted_prompts_release_budget(models):
+    cache = StateDictCache(1024 * 1024)
+    queue = FakeQueue([checkpoint("a.safetensors")])
+    prefetcher = ModelPrefetcher(queue, cache, lookahead=1, max_bytes=600)
+    prefetcher.prefetch_once()
+    assert key(models, "checkpoints", "a.safetensors") in cache
+
+    queue.pending = [checkpoint("b.safetensors")]
+    prefetcher.prefetch_once()
+    assert key(models, "checkpoints", "b.safetensors") in cache
+
+
+def test_background_thread_prefetches(models):
+    cache = StateDictCache(1024 * 1024)
+    queue = FakeQueue([checkpoint("a.safetensors")])
+    prefetcher = ModelPrefetcher(queue, cache, lookahead=1, max_bytes=1024 * 1024, poll_interval=0.01)
+    prefetcher.start()
+    try:
+        for _ in range(500):
+            if prefetcher.stats().staged:
+                break
+            time.sleep(0.01)
+    finally:
+        prefetcher.stop()
+    prefetcher.begin(queue.start_next())
+    assert prefetcher.stats().hits == 1
+
+
+def test_load_torch_file_copies_prefetched_state_dict(models, monkeypatch):
+    import comfy.utils
+    cache = StateDictCache(1024 * 1024)
+    monkeypatch.setattr(comfy.utils, "STATE_DICT_CACHE", cache)
+    queue = FakeQueue([checkpoint("a.safetensors")])
+    ModelPrefetcher(queue, cache, lookahead=1, max_bytes=1024 * 1024, copy=comfy.utils.DISABLE_MMAP).prefetch_once()
+
+    path = str(models / "checkpoints" / "a.safetensors")
+    expected = safetensors.torch.load_file(path)["w"]
+    loaded = comfy.utils.load_torch_file(path)
+    assert torch.equal(loaded["w"], expected)
+
+    # Patching a loaded weight in place must not leak into later loads.
+    loaded["w"].add_(1)
+    assert torch.equal(comfy.utils.load_torch_file(path)["w"], expected)
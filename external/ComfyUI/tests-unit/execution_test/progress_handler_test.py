@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from comfy_execution.graph import DynamicPrompt
+from comfy_execution.progress import ProgressRegistry, WebUIProgressHandler
+
+
+class FakeServer:
+    def __init__(self, loop, client_id="client", features=None):
+        self.loop = loop
+        self.client_id = client_id
+        self.sockets = {client_id: object()} if client_id else {}
+        self.sockets_metadata = {client_id: {"feature_flags": features or {}}} if client_id else {}
+        self.messages = []
+
+    def send_sync(self, event, data, sid=None):
+        self.messages.append((event, data, sid))
+
+    def progress(self):
+        return [data for event, data, _ in self.messages if event == "progress_state"]
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def make_registry(server, interval=0.05, node_count=3):
+    prompt = {str(i): {"class_type": "Node", "inputs": {}} for i in range(node_count)}
+    registry = ProgressRegistry("prompt", DynamicPrompt(prompt))
+    handler = WebUIProgressHandler(server, interval=interval)
+    handler.set_registry(registry)
+    registry.register_handler(handler)
+    return registry, handler
+
+
+def test_updates_within_window_are_coalesced(loop):
+    server = FakeServer(loop)
+    registry, _ = make_registry(server)
+    registry.start_progress("0")
+    for step in range(1, 21):
+        registry.update_progress("0", step, 20)
+
+    # the start goes out immediately, the updates wait for the window to close
+    assert len(server.progress()) == 1
+    loop.run_until_complete(asyncio.sleep(0.1))
+    messages = server.progress()
+    assert len(messages) == 2
+    assert messages[-1]["nodes"]["0"]["value"] == 20
+
+
+def test_start_and_finish_are_sent_immediately(loop):
+    server = FakeServer(loop)
+    registry, _ = make_registry(server)
+    registry.start_progress("0")
+    registry.update_progress("0", 1, 2)
+    registry.update_progress("0", 2, 2)
+    registry.finish_progress("0")
+
+    messages = server.progress()
+    assert messages[-1]["nodes"]["0"]["state"] == "finished"
+    count = len(messages)
+    loop.run_until_complete(asyncio.sleep(0.1))
+    assert len(server.progress()) == count
+
+
+def test_full_state_without_delta_support(loop):
+    server = FakeServer(loop)
+    registry, _ = make_registry(server, interval=0)
+    registry.start_progress("0")
+    registry.finish_progress("0")
+    registry.start_progress("1")
+
+    last = server.progress()[-1]
+    assert set(last["nodes"]) == {"0", "1"}
+    assert "delta" not in last
+    assert last["nodes"]["1"]["display_node_id"] == "1"
+
+
+def test_delta_clients_only_get_changed_nodes(loop):
+    server = FakeServer(loop, features={"supports_progress_state_delta": True})
+    registry, _ = make_registry(server, interval=0)
+    registry.start_progress("0")
+    registry.finish_progress("0")
+    registry.start_progress("1")
+    registry.update_progress("1", 1, 4)
+
+    messages = server.progress()
+    assert "delta" not in messages[0]
+    assert all(m["delta"] for m in messages[1:])
+    assert set(messages[-2]["nodes"]) == {"1"}
+    assert messages[-1]["nodes"]["1"]["value"] == 1
+
+
+def test_clients_without_a_baseline_get_the_full_state(loop):
+    delta = {"feature_flags": {"supports_progress_state_delta": True}}
+    server = FakeServer(loop, client_id=None)
+    server.sockets["early"] = object()
+    server.sockets_metadata["early"] = delta
+    registry, _ = make_registry(server, interval=0)
+    registry.start_progress("0")
+    registry.finish_progress("0")
+
+    server.sockets["late"] = object()
+    server.sockets_metadata["late"] = delta
+    server.messages.clear()
+    registry.start_progress("1")
+    sent = {sid: data for event, data, sid in server.messages if event == "progress_state"}
+    assert set(sent["early"]["nodes"]) == {"1"} and sent["early"]["delta"]
+    assert set(sent["late"]["nodes"]) == {"0", "1"} and "delta" not in sent["late"]
+
+    # A reconnect reuses the client id with a new socket.
+    server.sockets["early"] = object()
+    server.messages.clear()
+    registry.update_progress("1", 1, 4)
+    sent = {sid: data for event, data, sid in server.messages if event == "progress_state"}
+    assert set(sent["early"]["nodes"]) == {"0", "1"} and "delta" not in sent["early"]
+    assert set(sent["late"]["nodes"]) == {"1"} and sent["late"]["delta"]
+
+
+def test_nothing_is_sent_without_listeners(loop):
+    server = FakeServer(loop)
+    server.sockets.clear()
+    registry, handler = make_registry(server, interval=0)
+    registry.start_progress("0")
+    registry.update_progress("0", 1, 2)
+    registry.finish_progress("0")
+    assert server.messages == []
+    assert handler._node_ids == {}
+
+
+def test_node_ids_are_resolved_once(loop, monkeypatch):
+    server = FakeServer(loop)
+    registry, _ = make_registry(server, interval=0)
+    calls = []
+    original = registry.dynprompt.get_display_node_id
+    monkeypatch.setattr(registry.dynprompt, "get_display_node_id", lambda node_id: calls.append(node_id) or original(node_id))
+
+    registry.start_progress("0")
+    for step in range(5):
+        registry.update_progress("0", step, 5)
+    registry.finish_progress("0")
+    assert calls == ["0"]
+
+
+def test_pending_flush_is_dropped_when_the_next_prompt_starts(loop):
+    server = FakeServer(loop)
+    registry, handler = make_registry(server, interval=0.1)
+    registry.start_progress("0")
+    registry.update_progress("0", 1, 2)
+    loop.run_until_complete(asyncio.sleep(0.02))
+
+    handler.reset()
+    second = ProgressRegistry("second", DynamicPrompt({"0": {"class_type": "Node", "inputs": {}}}))
+    handler.set_registry(second)
+    second.register_handler(handler)
+    sent = len(server.progress())
+    loop.run_until_complete(asyncio.sleep(0.03))
+    second.update_progress("0", 1, 4)
+    loop.run_until_complete(asyncio.sleep(0.2))
+
+    messages = server.progress()[sent:]
+    assert [message["prompt_id"] for message in messages] == ["second"]
@@ -0,0 +1,55 @@
+import copy
+import json
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from execution import PromptQueue
+from comfy_execution.utils import FrozenDict, freeze
+
+
+class FakeServer:
+    def queue_updated(self):
+        pass
+
+
+def item(number, prompt_id):
+    return (number, prompt_id, {"1": {"class_type": "Node", "inputs": {"x": [1, 2]}}}, {"client_id": "c"}, ["1"], {})
+
+
+def test_freeze_is_read_only_and_copies_thaw():
+    frozen = freeze({"a": [1, {"b": 2}]})
+    assert frozen == {"a": (1, {"b": 2})}
+    assert json.loads(json.dumps(frozen)) == {"a": [1, {"b": 2}]}
+    with pytest.raises(TypeError):
+        frozen["a"] = 1
+    with pytest.raises(TypeError):
+        frozen["a"][1].update(b=3)
+
+    thawed = copy.deepcopy(frozen)
+    thawed["a"][1]["b"] = 3
+    assert type(thawed) is dict and frozen["a"][1]["b"] == 2
+
+
+def test_current_queue_snapshots_are_reused_until_items_leave():
+    queue = PromptQueue(FakeServer())
+    queue.put(item(0, "a"))
+    queue.put(item(1, "b"))
+
+    running, queued = queue.get_current_queue()
+    assert running == [] and [x[1] for x in queued] == ["a", "b"]
+    assert isinstance(queued[0][2], FrozenDict)
+    with pytest.raises(TypeError):
+        queued[0][2]["1"]["inputs"]["x"] = 3
+
+    again = queue.get_current_queue()[1]
+    assert again[0] is queued[0] and again[1] is queued[1]
+
+    queue.get()
+    running, queued = queue.get_current_queue()
+    assert [x[1] for x in running] == ["a"] and [x[1] for x in queued] == ["b"]
+    assert len(queue.snapshots) == 2
@@ -0,0 +1,140 @@
+import pytest
+
+from comfy_execution.scheduling import LaneScheduler, parse_lanes
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def item(number, prompt_id, client_id=None):
+    extra_data = {} if client_id is None else {"client_id": client_id}
+    return (number, prompt_id, {}, extra_data, [], {})
+
+
+def drain(scheduler):
+    out = []
+    while (x := scheduler.pop()) is not None:
+        out.append(x[1])
+    return out
+
+
+@pytest.fixture
+def scheduler():
+    return LaneScheduler(parse_lanes("interactive:4,batch:1"), clock=Clock())
+
+
+def test_parse_lanes():
+    assert parse_lanes("a:2, b:0.5,c") == {"a": 2.0, "b": 0.5, "c": 1.0}
+    with pytest.raises(ValueError):
+        parse_lanes("a:0")
+    with pytest.raises(ValueError):
+        parse_lanes(" , ")
+
+
+def test_single_client_keeps_submission_order(scheduler):
+    for n in (3, 1, 2):
+        scheduler.put(item(n, f"p{n}"))
+    assert drain(scheduler) == ["p1", "p2", "p3"]
+    assert scheduler.pop() is None
+
+
+def test_clients_are_served_round_robin(scheduler):
+    for n in range(4):
+        scheduler.put(item(n, f"bulk{n}", "bulk"), "batch")
+    scheduler.put(item(10, "other", "other"), "batch")
+    assert drain(scheduler) == ["bulk0", "other", "bulk1", "bulk2", "bulk3"]
+
+
+def test_lanes_share_by_weight(scheduler):
+    for n in range(10):
+        scheduler.put(item(n, f"b{n}"), "batch")
+    for n in range(10, 20):
+        scheduler.put(item(n, f"i{n}"), "interactive")
+    order = drain(scheduler)[:10]
+    assert sum(p.startswith("i") for p in order) == 8
+
+
+def test_interactive_prompt_does_not_wait_behind_batch_backlog(scheduler):
+    for n in range(200):
+        scheduler.put(item(n, f"b{n}", "bulk"), "batch")
+    for _ in range(50):
+        scheduler.pop()
+    scheduler.put(item(500, "preview", "ui"), "interactive")
+    assert scheduler.pop()[1] == "preview"
+
+
+def test_idle_lane_does_not_bank_credit(scheduler):
+    for n in range(20):
+        scheduler.put(item(n, f"i{n}"), "interactive")
+    drain(scheduler)
+    scheduler.put(item(100, "b"), "batch")
+    for n in range(101, 105):
+        scheduler.put(item(n, f"i{n}"), "interactive")
+    assert drain(scheduler).index("b") <= 1
+
+
+def test_front_items_run_first(scheduler):
+    scheduler.put(item(0, "a"), "batch")
+    scheduler.put(item(1, "b"), "interactive")
+    scheduler.put(item(-2, "front"), "batch")
+    assert drain(scheduler)[0] == "front"
+
+
+def test_unknown_lane_is_rejected(scheduler):
+    assert scheduler.resolve_lane(None) == "interactive"
+    with pytest.raises(ValueError):
+        scheduler.put(item(0, "a"), "nope")
+    assert len(scheduler) == 0
+
+
+def test_remove_and_clear(scheduler):
+    scheduler.put(item(0, "a", "x"), "batch")
+    scheduler.put(item(1, "b", "x"), "batch")
+    scheduler.put(item(-1, "c"), "interactive")
+    assert scheduler.remove(lambda x: x[1] == "a")
+    assert scheduler.remove(lambda x: x[1] == "c")
+    assert not scheduler.remove(lambda x: x[1] == "missing")
+    assert [x[1] for x in scheduler.items()] == ["b"]
+    assert scheduler.stats()["batch"]["depth"] == 1
+    assert scheduler.stats()["interactive"]["depth"] == 0
+
+    scheduler.clear()
+    assert len(scheduler) == 0
+    assert scheduler.pop() is None
+
+
+def test_stats_report_depth_and_wait(scheduler):
+    clock = scheduler.clock
+    scheduler.put(item(0, "a", "x"), "batch")
+    scheduler.put(item(1, "b", "y"), "batch")
+    clock.now = 2.0
+    stats = scheduler.stats()["batch"]
+    assert (stats["depth"], stats["clients"], stats["oldest_wait"]) == (2, 2, 2.0)
+
+    scheduler.pop()
+    clock.now = 6.0
+    scheduler.pop()
+    stats = scheduler.stats()["batch"]
+    assert (stats["depth"], stats["dispatched"]) == (0, 2)
+    assert stats["avg_wait"] == pytest.approx(4.0)
+    assert stats["p95_wait"] == pytest.approx(6.0)
+    assert scheduler.stats()["interactive"]["dispatched"] == 0
+
+
+def test_peek_matches_pop_order(scheduler):
+    for n in range(6):
+        scheduler.put(item(n, f"b{n}", f"c{n % 2}"), "batch")
+    for n in range(6, 9):
+        scheduler.put(item(n, f"i{n}", "ui"), "interactive")
+    scheduler.put(item(-1, "front"), "batch")
+    scheduler.pop()
+
+    expected = [x[1] for x in scheduler.peek(5)]
+    assert len(scheduler) == 9
+    assert drain(scheduler)[:5] == expected
+    assert scheduler.peek(3) == []
@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import execution
+import nodes
+from comfy_execution import caching
+from comfy_execution.fingerprint import StructureMemo, prompt_fingerprint
+from comfy_execution.graph import DynamicPrompt
+from comfy_execution.graph_utils import is_link
+
+
+class Source:
+    RETURN_TYPES = ("NUMBER",)
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("INT", {"default": 0, "min": 0, "max": 100})}}
+
+
+class Scale:
+    RETURN_TYPES = ("NUMBER",)
+    calls = 0
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        cls.calls += 1
+        return {"required": {"number": ("NUMBER",), "mode": (["up", "down"],)}}
+
+
+class Sink:
+    RETURN_TYPES = ()
+    OUTPUT_NODE = True
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"number": ("NUMBER",)}}
+
+
+class NeverChanged:
+    async def get(self, node_id):
+        return False
+
+
+@pytest.fixture(autouse=True)
+def node_classes(monkeypatch):
+    for cls in (Source, Scale, Sink):
+        monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, f"Memo{cls.__name__}", cls)
+    Scale.calls = 0
+    caching.SIGNATURE_MEMO.clear()
+    execution.VALIDATION_MEMO.clear()
+
+
+def chain(value=1, mode="up", length=4):
+    prompt = {"0": {"class_type": "MemoSource", "inputs": {"value": value}}}
+    for i in range(1, length):
+        prompt[str(i)] = {"class_type": "MemoScale", "inputs": {"number": [str(i - 1), 0], "mode": mode}}
+    prompt[str(length)] = {"class_type": "MemoSink", "inputs": {"number": [str(length - 1), 0]}}
+    return prompt
+
+
+def signatures(prompt):
+    async def run():
+        keys = caching.CacheKeySetInputSignature(DynamicPrompt(prompt), prompt.keys(), NeverChanged())
+        await keys.add_keys(prompt.keys())
+        return keys.keys
+    return asyncio.run(run())
+
+
+def test_fingerprint_ignores_literal_values():
+    assert prompt_fingerprint(chain(1, "up")) == prompt_fingerprint(chain(7, "down"))
+    assert prompt_fingerprint(chain()) != prompt_fingerprint(chain(length=5))
+
+    relinked = chain()
+    relinked["3"]["inputs"]["number"] = ["1", 0]
+    assert prompt_fingerprint(relinked) != prompt_fingerprint(chain())
+
+    removed = chain()
+    del removed["2"]["inputs"]["mode"]
+    assert prompt_fingerprint(removed) != prompt_fingerprint(chain())
+
+
+def test_structure_memo_is_lru():
+    memo = StructureMemo(max_entries=2)
+    a = memo.get("a", dict)
+    memo.get("b", dict)
+    assert memo.get("a", dict) is a
+    memo.get("c", dict)
+    assert memo.get("b", dict) is not None
+    assert memo.stats() == {"hits": 1, "misses": 4, "entries": 2}
+    assert memo.get("a", dict) is not a
+
+
+def test_signatures_are_reused_for_unchanged_nodes():
+    first = signatures(chain(1, "up"))
+    again = signatures(chain(1, "up"))
+    assert again == first
+    assert caching.SIGNATURE_MEMO.stats()["signatures_reused"] == len(first)
+
+    changed = chain(1, "up")
+    changed["2"]["inputs"]["mode"] = "down"
+    keys = signatures(changed)
+    assert keys["0"] == first["0"] and keys["1"] == first["1"]
+    assert keys["2"] != first["2"] and keys["4"] != first["4"]
+
+
+@pytest.mark.parametrize("value,mode", [(1, "up"), (2, "down"), (2, "up")])
+def test_memoized_signatures_match_fresh_ones(value, mode):
+    signatures(chain(1, "up"))
+    memoized = signatures(chain(value, mode))
+    caching.SIGNATURE_MEMO.clear()
+    assert memoized == signatures(chain(value, mode))
+
+
+def validate(prompt):
+    return asyncio.run(execution.validate_prompt("p", prompt, None))
+
+
+def test_validation_reuses_specs_and_link_checks():
+    assert validate(chain(1, "up"))[0] is True
+    calls = Scale.calls
+    before = execution.VALIDATION_MEMO.stats()
+    assert validate(chain(2, "down"))[0] is True
+    stats = execution.VALIDATION_MEMO.stats()
+    assert stats["hits"] - before["hits"] == 1
+    # MemoScale has a combo input, so its spec is resolved again on every submission.
+    assert Scale.calls - calls == 3
+    assert stats["specs_reused"] - before.get("specs_reused", 0) == 2
+    assert stats["link_checks_reused"] - before.get("link_checks_reused", 0) == sum(is_link(v) for node in chain().values() for v in node["inputs"].values())
+
+    # Literal values are still validated on every submission.
+    result = validate(chain(200, "up"))
+    assert result[0] is False
+    assert result[3]["0"]["errors"][0]["type"] == "value_bigger_than_max"
+
+
+def test_removed_combo_options_are_rejected(monkeypatch):
+    assert validate(chain(1, "down"))[0] is True
+
+    monkeypatch.setattr(Scale, "INPUT_TYPES", classmethod(lambda cls: {"required": {"number": ("NUMBER",), "mode": (["up"],)}}))
+    result = validate(chain(1, "down"))
+    assert result[0] is False
+    assert result[3]["1"]["errors"][0]["type"] == "value_not_in_list"
+
+
+def test_memo_is_dropped_when_node_definitions_reload(monkeypatch):
+    assert validate(chain(1, "up"))[0] is True
+
+    class ReloadedSource(Source):
+        @classmethod
+        def INPUT_TYPES(cls):
+            return {"required": {"value": ("INT", {"default": 0, "min": 0, "max": 10})}}
+
+    monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "MemoSource", ReloadedSource)
+    before = execution.VALIDATION_MEMO.stats()
+    result = validate(chain(50, "up"))
+    assert result[0] is False
+    assert result[3]["0"]["errors"][0]["type"] == "value_bigger_than_max"
+    assert execution.VALIDATION_MEMO.stats().get("revalidated", 0) == before.get("revalidated", 0)
@@ -1,9 +1,29 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .routes import datasets, generation, jobs, training, upscale
+from .utils.comfy import close_comfy_client
+from .utils.ingest import shutdown_ingest_executor
+from .utils.jobs import cancel_background_jobs, get_job_store
+from .utils.kohya import shutdown_training_scheduler
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Open the job store up front so interrupted jobs are reconciled at boot.
+    get_job_store()
+    yield
+    await cancel_background_jobs()
+    # Trainers run in their own session and would otherwise outlive the worker.
+    await asyncio.to_thread(shutdown_training_scheduler)
+    await close_comfy_client()
+    shutdown_ingest_executor()
+
 
-app = FastAPI(title="StudioNOVA Worker")
+app = FastAPI(title="StudioNOVA Worker", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,13 +1,18 @@
+import asyncio
 import base64
 import os
 import shutil
+import tarfile
+import zipfile
 from pathlib import Path
-from typing import Literal
+from typing import List, Literal, Optional
 from uuid import uuid4
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 from pydantic import BaseModel
 
+from ..utils.dataset_index import get_dataset_index
+from ..utils.ingest import DatasetIngest, IngestError, IngestOptions, is_archive, iter_archive, read_limited
 from ..utils.storage import ensure_output_dir
 
 router = APIRouter(prefix="/api", tags=["datasets"])
@@ -60,10 +65,6 @@ def _copy_or_create_image(image_path: str | None, destination: Path) -> None:
     _write_placeholder_image(destination)
 
 
-def _count_dataset_items(directory: Path) -> int:
-    return sum(1 for item in directory.iterdir() if item.is_file())
-
-
 class DatasetAddRequest(BaseModel):
     model_id: str
     dataset_path: str
@@ -78,10 +79,11 @@ def list_datasets():
     if not root.exists() or not root.is_dir():
         return {"root": str(root), "folders": []}
 
+    index = get_dataset_index()
     folders = []
     for path in sorted(root.iterdir()):
         if path.is_dir():
-            folders.append({"name": path.name, "count": _count_dataset_items(path)})
+            folders.append({"name": path.name, **index.summary(path)})
     return {"root": str(root), "folders": folders}
 
 
@@ -94,6 +96,8 @@ def add_dataset_image(model_id: str, body: DatasetAddRequest):
 
     filename = f"{model_id}-{uuid4().hex}.png"
     destination = dataset_dir / filename
+    index = get_dataset_index()
+    mtime_token = index.mtime_token(dataset_dir)
 
     if body.image_data:
         try:
@@ -103,12 +107,74 @@ def add_dataset_image(model_id: str, body: DatasetAddRequest):
     else:
         _copy_or_create_image(body.image_path, destination)
 
-    count = _count_dataset_items(dataset_dir)
+    summary = index.note_added(dataset_dir, destination, mtime_token)
 
     return {
         "status": "saved",
         "dataset_path": str(dataset_dir),
         "file_name": filename,
-        "count": count,
+        "count": summary["count"],
+        "images": summary["images"],
+        "captioned": summary["captioned"],
     }
 
+
+
+@router.post("/models/{model_id}/dataset/bulk")
+async def add_dataset_images_bulk(
+    model_id: str,
+    files: List[UploadFile] = File(...),
+    dataset_path: str = Form(""),
+    output_format: Optional[str] = Form(None),
+    max_side: int = Form(0, ge=0),
+    strip_exif: bool = Form(False),
+):
+    """Ingest many images (or zip/tar archives of images and captions) at once."""
+    dataset_dir = _ensure_dataset_dir(dataset_path)
+    options = IngestOptions(
+        output_format=(output_format or "").lower() or None,
+        max_side=max_side,
+        strip_exif=strip_exif,
+    )
+    try:
+        ingest = DatasetIngest(dataset_dir, model_id, options)
+    except IngestError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    for upload in files:
+        name = upload.filename or "upload"
+        if is_archive(name):
+            # Archive members are read one at a time from the spooled upload,
+            # off the event loop since decompression is CPU and disk bound.
+            members = iter_archive(name, upload.file)
+            try:
+                while (entry := await asyncio.to_thread(next, members, None)) is not None:
+                    member, data = entry
+                    await ingest.add(f"{name}/{member}", data)
+            except (zipfile.BadZipFile, tarfile.TarError) as exc:
+                ingest.results.append({"source": name, "status": "failed", "error": f"Invalid archive: {exc}"})
+            except IngestError as exc:
+                ingest.results.append({"source": name, "status": "failed", "error": str(exc)})
+            finally:
+                members.close()
+        else:
+            try:
+                data = await asyncio.to_thread(read_limited, upload.file, name)
+            except IngestError as exc:
+                ingest.results.append({"source": name, "status": "failed", "error": str(exc)})
+                continue
+            await ingest.add(name, data)
+
+    results = await ingest.finish()
+    summary = await asyncio.to_thread(get_dataset_index().summary, dataset_dir)
+
+    return {
+        "status": "completed",
+        "dataset_path": str(dataset_dir),
+        "saved": sum(1 for result in results if result["status"] == "saved"),
+        "failed": sum(1 for result in results if result["status"] == "failed"),
+        "results": results,
+        "count": summary["count"],
+        "images": summary["images"],
+        "captioned": summary["captioned"],
+    }
@@ -1,14 +1,24 @@
+import hashlib
 import logging
 import os
+from functools import lru_cache
 from pathlib import Path
 import struct
+from typing import Any, Dict
 import zlib
 from uuid import uuid4
 
 from fastapi import APIRouter, HTTPException
 
-from ..schemas import ComfyPreviewRequest, GenerationRequest
-from ..utils.comfy import ComfyUIError, generate_image_workflow
+from ..schemas import BatchGenerationRequest, ComfyPreviewRequest, GenerationRequest, JobKind
+from ..utils.comfy import (
+    COMFYUI_PREVIEW_LANE,
+    ComfyUIError,
+    generate_image_batch,
+    generate_image_workflow,
+    get_backend_pool,
+)
+from ..utils.jobs import JobRecord, submit_job
 from ..utils.storage import ensure_output_dir
 
 logger = logging.getLogger(__name__)
@@ -31,35 +41,53 @@ def _png_chunk(tag: bytes, data: bytes) -> bytes:
     )
 
 
-def _write_preview_image(destination: Path, prompt: str) -> None:
-    width = 512
-    height = 512
-    seed = abs(hash(prompt)) % 0xFFFFFF
+PREVIEW_SIZE = 512
+PREVIEW_CACHE_SIZE = int(os.getenv("PREVIEW_CACHE_SIZE", "256"))
+
+
+def _preview_seed(prompt: str) -> int:
+    # Stable across processes, unlike the salted built-in hash().
+    return int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:3], "big")
+
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def _render_preview_png(seed: int) -> bytes:
+    width = PREVIEW_SIZE
+    height = PREVIEW_SIZE
     base_r = 50 + (seed & 0x7F)
     base_g = 80 + ((seed >> 7) & 0x7F)
     base_b = 110 + ((seed >> 14) & 0x7F)
 
-    raw = bytearray()
+    # Red only depends on x, green on y and blue on x + y, so every scanline
+    # is assembled from precomputed channel strips with strided slice writes.
+    red_strip = bytes((base_r + (x * 5 // width)) % 256 for x in range(width))
+    blue_strip = bytes(
+        (base_b + (s * 3 // (width + height))) % 256 for s in range(width + height - 1)
+    )
+    stride = 1 + width * 3
+    raw = bytearray(stride * height)
     for y in range(height):
-        raw.append(0)
-        for x in range(width):
-            r = (base_r + (x * 5 // width)) % 256
-            g = (base_g + (y * 5 // height)) % 256
-            b = (base_b + ((x + y) * 3 // (width + height))) % 256
-            raw.extend((r, g, b))
+        start = y * stride + 1
+        end = start + width * 3
+        raw[start:end:3] = red_strip
+        raw[start + 1:end:3] = bytes(((base_g + (y * 5 // height)) % 256,)) * width
+        raw[start + 2:end:3] = blue_strip[y:y + width]
 
     ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
     idat = zlib.compress(bytes(raw), level=6)
-    png_data = b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", ihdr) + _png_chunk(b"IDAT", idat) + _png_chunk(b"IEND", b"")
-    destination.write_bytes(png_data)
+    return b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", ihdr) + _png_chunk(b"IDAT", idat) + _png_chunk(b"IEND", b"")
+
+
+def _write_preview_image(destination: Path, prompt: str) -> None:
+    destination.write_bytes(_render_preview_png(_preview_seed(prompt)))
 
 
-@router.post("/generate-image")
-def generate_image(payload: GenerationRequest):
+@router.post("/generate-image", status_code=202)
+async def generate_image(payload: GenerationRequest):
     logger.info("Received generate-image request", extra={"payload": payload.model_dump()})
 
-    try:
-        result = generate_image_workflow(
+    async def run(_job: JobRecord) -> Dict[str, Any]:
+        result = await generate_image_workflow(
             prompt=payload.prompt,
             negative_prompt=payload.negative_prompt or "",
             lora_path=payload.lora_path,
@@ -72,20 +100,69 @@ def generate_image(payload: GenerationRequest):
             height=payload.height,
             base_model=payload.base_model,
         )
-    except ComfyUIError as exc:
-        logger.exception("ComfyUI generation failed")
-        raise HTTPException(status_code=502, detail=str(exc)) from exc
+        return result.to_dict()
+
+    job = await submit_job(
+        JobKind.GENERATION,
+        run,
+        model_id=payload.model_id,
+        payload=payload.model_dump(),
+    )
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "model_id": payload.model_id,
+    }
+
+
+@router.post("/generate-image/batch", status_code=202)
+async def generate_image_batch_job(payload: BatchGenerationRequest):
+    logger.info(
+        "Received batch generate-image request",
+        extra={"model_id": payload.model_id, "prompts": len(payload.prompts)},
+    )
+
+    async def run(_job: JobRecord) -> Dict[str, Any]:
+        result = await generate_image_batch(
+            payload.prompts,
+            payload.negative_prompt or "",
+            seeds=payload.seeds,
+            seed_start=payload.seed_start,
+            count=payload.count,
+            lora_path=payload.lora_path,
+            cfg_scale=payload.cfg_scale,
+            steps=payload.steps,
+            sampler=payload.sampler,
+            scheduler=payload.scheduler,
+            width=payload.width,
+            height=payload.height,
+            base_model=payload.base_model,
+        )
+        return result.to_dict()
+
+    job = await submit_job(
+        JobKind.GENERATION,
+        run,
+        model_id=payload.model_id,
+        payload=payload.model_dump(),
+    )
 
     return {
-        "job_id": result.prompt_id,
-        "status": result.status,
-        "image_path": str(result.image_path),
-        "history": result.history,
+        "job_id": job.id,
+        "status": job.status,
+        "model_id": payload.model_id,
     }
 
 
+@router.get("/comfy/backends")
+async def list_comfy_backends() -> Dict[str, Any]:
+    pool = await get_backend_pool()
+    return {"backends": pool.snapshot()}
+
+
 @router.post("/generate/comfy")
-def generate_comfy_preview(payload: ComfyPreviewRequest):
+async def generate_comfy_preview(payload: ComfyPreviewRequest):
     logger.info(
         "Received comfy preview request",
         extra={"model_id": payload.model_id, "prompt": payload.prompt},
@@ -96,9 +173,9 @@ def generate_comfy_preview(payload: ComfyPreviewRequest):
     image_path: Path | None = None
     is_mock = True
 
-    if os.getenv("COMFYUI_API_URL"):
+    if os.getenv("COMFYUI_API_URL") or os.getenv("COMFYUI_API_URLS"):
         try:
-            result = generate_image_workflow(
+            result = await generate_image_workflow(
                 prompt=payload.prompt,
                 negative_prompt=payload.negative_prompt or "",
                 lora_path=None,
@@ -110,6 +187,7 @@ def generate_comfy_preview(payload: ComfyPreviewRequest):
                 width=512,
                 height=512,
                 base_model=None,
+                lane=COMFYUI_PREVIEW_LANE,
             )
             image_path = Path(result.image_path)
             is_mock = False
@@ -1,14 +1,45 @@
 import logging
+from typing import Optional
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+
+from ..schemas import JobKind, JobStatus
+from ..utils.jobs import get_job_store
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["jobs"])
 
 
+@router.get("/jobs")
+def list_jobs(
+    model_id: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    kind: Optional[JobKind] = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    # Fetch one extra row to know whether another page exists.
+    records = get_job_store().list(
+        model_id=model_id,
+        status=status.value if status else None,
+        kind=kind.value if kind else None,
+        limit=limit + 1,
+        offset=offset,
+    )
+    has_more = len(records) > limit
+    return {
+        "jobs": [record.to_dict() for record in records[:limit]],
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if has_more else None,
+    }
+
+
 @router.get("/jobs/{job_id}")
 def get_job(job_id: str):
     logger.info("Job status requested", extra={"job_id": job_id})
-    return {"job_id": job_id, "status": "mocked"}
-
+    record = get_job_store().get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return record.to_dict()
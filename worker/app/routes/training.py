@@ -1,15 +1,24 @@
+import asyncio
+import json
 import logging
 from typing import Final, Tuple
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
-from ..schemas import TrainLoraRequest
+from ..schemas import JobKind, TrainLoraRequest, TrainLoraSweepRequest
 from ..utils.kohya import (
     DEFAULT_BASE_MODEL,
     KOHYA_ROOT,
     KohyaError,
+    cancel_kohya_job,
+    get_kohya_job,
+    get_training_scheduler,
     launch_kohya_training,
 )
+from ..utils.jobs import get_job_store
+from ..utils.sweeps import SweepError, launch_sweep
+from ..utils.training_telemetry import TRAINING_TELEMETRY_INTERVAL
 
 logger = logging.getLogger(__name__)
 
@@ -80,7 +89,9 @@ def train_lora(payload: TrainLoraRequest):
 
     return {
         "job_id": job.job_id,
-        "status": "queued",
+        "status": job.status,
+        "queue_position": get_training_scheduler().queue_position(job.job_id),
+        "device": job.device,
         "message": SUCCESS_MESSAGE,
         "log_path": str(job.log_path),
         "output_dir": str(job.output_dir),
@@ -90,3 +101,93 @@ def train_lora(payload: TrainLoraRequest):
         "dataset_path": request_data.dataset_path,
     }
 
+
+
+@router.post("/train-lora/sweep", status_code=202)
+def train_lora_sweep(payload: TrainLoraSweepRequest):
+    logger.info("Received train-lora sweep request", extra={"model_id": payload.model_id})
+
+    trimmed_dataset = payload.dataset_path.strip()
+    if not trimmed_dataset:
+        raise HTTPException(status_code=400, detail="Dataset path is required.")
+    if not KOHYA_ROOT.exists() or not (payload.base_model or DEFAULT_BASE_MODEL):
+        raise HTTPException(
+            status_code=400,
+            detail="Kohya_ss not configured. Update settings before training.",
+        )
+
+    try:
+        record = launch_sweep(payload.model_copy(update={"dataset_path": trimmed_dataset}))
+    except SweepError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except KohyaError as exc:
+        status_code, detail = _resolve_error(str(exc))
+        logger.exception("kohya_ss sweep launch failed", extra={"model_id": payload.model_id})
+        raise HTTPException(status_code=status_code, detail=detail) from exc
+
+    return record.to_dict()
+
+
+@router.get("/train-lora/sweep/{sweep_id}")
+def get_sweep(sweep_id: str):
+    record = get_job_store().get(sweep_id)
+    if record is None or record.kind != JobKind.SWEEP.value:
+        raise HTTPException(status_code=404, detail="Sweep not found.")
+    return record.to_dict()
+
+
+@router.get("/train-lora/queue")
+def training_queue():
+    return get_training_scheduler().snapshot()
+
+
+@router.post("/train-lora/{job_id}/cancel")
+def cancel_training(job_id: str):
+    try:
+        job = cancel_kohya_job(job_id)
+    except KohyaError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+    return {"job_id": job.job_id, "status": job.status, "cancel_requested": job.cancel_requested}
+
+
+def _training_job(job_id: str):
+    job = get_kohya_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found.")
+    return job
+
+
+@router.get("/train-lora/{job_id}/progress")
+def training_progress(job_id: str):
+    job = _training_job(job_id)
+    if job.telemetry is None:
+        return {"job_id": job.job_id, "status": job.status, "latest": None}
+    return {**job.telemetry.snapshot(), "status": job.status}
+
+
+@router.get("/train-lora/{job_id}/events")
+async def training_events(job_id: str, request: Request, after: int = 0):
+    """Server-sent events with one ``progress`` event per parsed sample."""
+    job = _training_job(job_id)
+
+    async def stream():
+        last_seq = after
+        while True:
+            if await request.is_disconnected():
+                return
+            telemetry = job.telemetry
+            if telemetry is not None:
+                for sample in telemetry.since(last_seq):
+                    last_seq = sample.seq
+                    yield f"id: {sample.seq}\nevent: progress\ndata: {json.dumps(sample.to_dict())}\n\n"
+            if job.status not in ("queued", "running") and (telemetry is None or telemetry.finished):
+                yield f"event: end\ndata: {json.dumps({'status': job.status})}\n\n"
+                return
+            await asyncio.sleep(TRAINING_TELEMETRY_INTERVAL)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
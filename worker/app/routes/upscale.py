@@ -1,34 +1,34 @@
 import logging
+from typing import Any, Dict
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 
-from ..schemas import UpscaleRequest
-from ..utils.comfy import ComfyUIError, upscale_image_workflow
+from ..schemas import JobKind, UpscaleRequest
+from ..utils.comfy import upscale_image_workflow
+from ..utils.jobs import JobRecord, submit_job
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["upscale"])
 
 
-@router.post("/upscale")
-def upscale_asset(payload: UpscaleRequest):
+@router.post("/upscale", status_code=202)
+async def upscale_asset(payload: UpscaleRequest):
     logger.info("Received upscale request", extra={"payload": payload.model_dump()})
 
-    try:
-        result = upscale_image_workflow(
+    async def run(_job: JobRecord) -> Dict[str, Any]:
+        result = await upscale_image_workflow(
             image_path=payload.image_path,
             model_name=payload.model_name,
             tile_size=payload.tile_size,
             upscale_factor=payload.upscale_factor,
         )
-    except ComfyUIError as exc:
-        logger.exception("ComfyUI upscale failed")
-        raise HTTPException(status_code=502, detail=str(exc)) from exc
+        return result.to_dict()
+
+    job = await submit_job(JobKind.UPSCALE, run, payload=payload.model_dump())
 
     return {
-        "job_id": result.prompt_id,
-        "status": result.status,
-        "image_path": str(result.image_path),
-        "history": result.history,
+        "job_id": job.id,
+        "status": job.status,
+        "asset_id": payload.asset_id,
     }
-
@@ -6,9 +6,9 @@ provide a shared language for future request/response validation.
 """
 
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class JobStatus(str, Enum):
@@ -16,6 +16,14 @@ class JobStatus(str, Enum):
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobKind(str, Enum):
+    GENERATION = "generation"
+    UPSCALE = "upscale"
+    TRAINING = "training"
+    SWEEP = "sweep"
 
 
 class GenerationType(str, Enum):
@@ -94,6 +102,24 @@ class GenerationRequest(BaseModel):
     metadata: Dict[str, Any] | None = None
 
 
+class BatchGenerationRequest(BaseModel):
+    model_id: str
+    prompts: List[str] = Field(min_length=1, max_length=64)
+    negative_prompt: Optional[str] = ""
+    lora_path: Optional[str] = None
+    cfg_scale: float = 7.0
+    steps: int = 30
+    seeds: Optional[List[int]] = Field(default=None, max_length=64)
+    seed_start: Optional[int] = None
+    count: int = Field(default=1, ge=1, le=64)
+    sampler: str = "euler"
+    scheduler: str = "normal"
+    width: int = 1024
+    height: int = 1024
+    base_model: Optional[str] = None
+    metadata: Dict[str, Any] | None = None
+
+
 class UpscaleRequest(BaseModel):
     asset_id: Optional[str] = None
     image_path: str
@@ -112,6 +138,23 @@ class TrainLoraRequest(BaseModel):
     max_train_steps: Optional[int] = 300
     learning_rate: Optional[float] = 1e-4
     additional_args: Optional[List[str]] = None
+    priority: int = 0
+
+
+class TrainLoraSweepRequest(BaseModel):
+    model_id: str
+    dataset_path: str
+    base_model: Optional[str] = None
+    output_dir: Optional[str] = None
+    output_name: Optional[str] = None
+    network_dim: List[int] = Field(default_factory=lambda: [16], min_length=1)
+    max_train_steps: List[int] = Field(default_factory=lambda: [300], min_length=1)
+    learning_rate: List[float] = Field(default_factory=lambda: [1e-4], min_length=1)
+    search: Literal["grid", "random"] = "grid"
+    trials: Optional[int] = Field(default=None, ge=1)
+    seed: Optional[int] = None
+    additional_args: Optional[List[str]] = None
+    priority: int = 0
 
 
 class ComfyPreviewRequest(BaseModel):
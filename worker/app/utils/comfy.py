@@ -1,16 +1,29 @@
+import asyncio
+import hashlib
 import json
 import logging
 import os
 import time
-from dataclasses import dataclass
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from uuid import uuid4
 
-import requests
-from requests import Response
+import aiohttp
 
-from .storage import DEFAULT_OUTPUT_DIR, ensure_output_dir
+from .storage import (
+    DEFAULT_OUTPUT_DIR,
+    LINK_MODES,
+    commit_temp_file,
+    ensure_output_dir,
+    link_file,
+    resolve_inside,
+    sha256_file,
+)
+from .result_cache import get_result_cache, workflow_cache_key
+from .workflows import WorkflowTemplate, load_template
 
 logger = logging.getLogger(__name__)
 
@@ -19,14 +32,43 @@ class ComfyUIError(RuntimeError):
     """Raised when communication with ComfyUI fails."""
 
 
+class ComfyUnavailableError(ComfyUIError):
+    """Raised when a ComfyUI backend cannot be reached at all."""
+
+
 COMFYUI_API_URL = os.getenv("COMFYUI_API_URL", "http://localhost:8188").rstrip("/")
+# Comma-separated list of ComfyUI instances to balance across; defaults to COMFYUI_API_URL alone.
+COMFYUI_API_URLS = [
+    url.strip().rstrip("/") for url in os.getenv("COMFYUI_API_URLS", "").split(",") if url.strip()
+] or [COMFYUI_API_URL]
+COMFYUI_HEALTH_INTERVAL = float(os.getenv("COMFYUI_HEALTH_INTERVAL", "5"))
+COMFYUI_HEALTH_TIMEOUT = float(os.getenv("COMFYUI_HEALTH_TIMEOUT", "3"))
+COMFYUI_AFFINITY_SLACK = int(os.getenv("COMFYUI_AFFINITY_SLACK", "2"))
+COMFYUI_AFFINITY_MEMORY = int(os.getenv("COMFYUI_AFFINITY_MEMORY", "4"))
+# ComfyUI scheduling lanes (see its --queue-lanes); empty leaves the choice to ComfyUI.
+COMFYUI_PREVIEW_LANE = os.getenv("COMFYUI_PREVIEW_LANE", "interactive")
+COMFYUI_JOB_LANE = os.getenv("COMFYUI_JOB_LANE", "batch")
 COMFYUI_POLL_INTERVAL = float(os.getenv("COMFYUI_POLL_INTERVAL", "2.0"))
 COMFYUI_POLL_TIMEOUT = float(os.getenv("COMFYUI_POLL_TIMEOUT", "180"))
+COMFYUI_REQUEST_TIMEOUT = float(os.getenv("COMFYUI_REQUEST_TIMEOUT", "30"))
+COMFYUI_MAX_CONNECTIONS = int(os.getenv("COMFYUI_MAX_CONNECTIONS", "100"))
+COMFYUI_MAX_RETRIES = int(os.getenv("COMFYUI_MAX_RETRIES", "3"))
+COMFYUI_RETRY_BACKOFF = float(os.getenv("COMFYUI_RETRY_BACKOFF", "0.5"))
+COMFYUI_USE_WEBSOCKET = os.getenv("COMFYUI_USE_WEBSOCKET", "1").lower() not in ("0", "false", "no")
 COMFYUI_BASE_MODEL = os.getenv("COMFYUI_BASE_MODEL", "sd_xl_base_1.0.safetensors")
 OUTPUT_DIR = Path(
     ensure_output_dir(os.getenv("OUTPUT_DIR", DEFAULT_OUTPUT_DIR))
 )
 
+# Optional zero-copy mode: when the worker shares a filesystem with ComfyUI,
+# images are hardlinked/reflinked from COMFYUI_LOCAL_DIR instead of fetched.
+COMFYUI_LOCAL_DIR = os.getenv("COMFYUI_LOCAL_DIR")
+COMFYUI_LINK_MODE = os.getenv("COMFYUI_LINK_MODE", "off").lower()
+if COMFYUI_LINK_MODE not in LINK_MODES:
+    logger.warning("Unknown COMFYUI_LINK_MODE %r; downloading images instead", COMFYUI_LINK_MODE)
+    COMFYUI_LINK_MODE = "off"
+COMFYUI_DOWNLOAD_TIMEOUT = float(os.getenv("COMFYUI_DOWNLOAD_TIMEOUT", "300"))
+
 GENERATION_WORKFLOW_PATH = os.getenv("COMFYUI_WORKFLOW_PATH")
 UPSCALE_WORKFLOW_PATH = os.getenv("COMFYUI_UPSCALE_WORKFLOW_PATH")
 
@@ -38,8 +80,16 @@ class ComfyResult:
     image_path: Path
     history: Dict[str, Any]
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "prompt_id": self.prompt_id,
+            "status": self.status,
+            "image_path": str(self.image_path),
+            "history": self.history,
+        }
+
 
-def _load_workflow(path: Optional[str]) -> Dict[str, Any]:
+def _load_workflow(path: Optional[str]) -> WorkflowTemplate:
     if not path:
         raise ComfyUIError(
             "ComfyUI workflow template not configured. "
@@ -47,91 +97,563 @@ def _load_workflow(path: Optional[str]) -> Dict[str, Any]:
         )
 
     template_path = Path(path)
-    if not template_path.exists():
-        raise ComfyUIError(f"Workflow template file not found: {template_path}")
-
     try:
-        with template_path.open("r", encoding="utf-8") as fp:
-            return json.load(fp)
+        return load_template(template_path)
+    except FileNotFoundError as exc:
+        raise ComfyUIError(f"Workflow template file not found: {template_path}") from exc
     except json.JSONDecodeError as exc:
         raise ComfyUIError(f"Invalid JSON in workflow template: {template_path}") from exc
 
 
-def _replace_placeholders(data: Any, replacements: Dict[str, Any]) -> Any:
-    if isinstance(data, dict):
-        return {key: _replace_placeholders(value, replacements) for key, value in data.items()}
-    if isinstance(data, list):
-        return [_replace_placeholders(item, replacements) for item in data]
-    if isinstance(data, str):
-        result = data
-        for key, value in replacements.items():
-            placeholder = f"{{{{{key}}}}}"
-            if placeholder in result:
-                replacement = "" if value is None else str(value)
-                result = result.replace(placeholder, replacement)
-        return result
-    return data
-
-
-def _submit_workflow(workflow: Dict[str, Any]) -> str:
-    client_id = str(uuid4())
-    url = f"{COMFYUI_API_URL}/api/prompt"
-
-    response = requests.post(
-        url,
-        json={"prompt": workflow, "client_id": client_id},
-        timeout=30,
-    )
-    _raise_for_status(response, "submit workflow")
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+WS_CONNECT_TIMEOUT = 5.0
+
+
+class ComfyClient:
+    """Asyncio client for the ComfyUI REST API.
+
+    A single keep-alive connection pool is shared by every request issued
+    through the client. Connection failures are retried with exponential
+    backoff; timeouts and 5xx gateway errors are only retried for
+    idempotent calls so a prompt is never queued twice.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        max_connections: int = COMFYUI_MAX_CONNECTIONS,
+        timeout: float = COMFYUI_REQUEST_TIMEOUT,
+        max_retries: int = COMFYUI_MAX_RETRIES,
+        backoff: float = COMFYUI_RETRY_BACKOFF,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session binds to the running loop, so it is created lazily.
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=60,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        context: str,
+        idempotent: bool = True,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        **kwargs: Any,
+    ) -> aiohttp.ClientResponse:
+        """Send a request and return the (unread) successful response.
+
+        Callers own the returned response and must read or release it.
+        Failing to reach the backend raises :class:`ComfyUnavailableError`.
+        """
+        session = self._get_session()
+        url = f"{self.base_url}{path}"
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        max_retries = self.max_retries if retries is None else retries
+
+        attempt = 0
+        while True:
+            try:
+                response = await session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                retryable = idempotent or isinstance(exc, aiohttp.ClientConnectorError)
+                if not retryable or attempt >= max_retries:
+                    raise ComfyUnavailableError(f"Failed to {context}: {exc or type(exc).__name__}") from exc
+            else:
+                if response.status < 400:
+                    return response
+                if not (idempotent and response.status in RETRYABLE_STATUSES and attempt < max_retries):
+                    detail = await response.text()
+                    response.release()
+                    error = ComfyUnavailableError if response.status in RETRYABLE_STATUSES else ComfyUIError
+                    raise error(f"Failed to {context}: {detail}")
+                response.release()
+
+            delay = self.backoff * (2**attempt)
+            attempt += 1
+            logger.debug("Retrying ComfyUI %s %s in %.2fs (attempt %s)", method, path, delay, attempt)
+            await asyncio.sleep(delay)
+
+    async def get_json(self, path: str, *, context: str, **kwargs: Any) -> Any:
+        response = await self.request("GET", path, context=context, **kwargs)
+        async with response:
+            return await response.json(content_type=None)
+
+    async def post_json(self, path: str, payload: Any, *, context: str, **kwargs: Any) -> Any:
+        response = await self.request(
+            "POST", path, context=context, idempotent=False, json=payload, **kwargs
+        )
+        async with response:
+            return await response.json(content_type=None)
+
 
-    payload = response.json()
+@dataclass
+class _PromptWatch:
+    event: asyncio.Event = field(default_factory=asyncio.Event)
+    outcome: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ComfyEventMonitor:
+    """Single multiplexed websocket subscription to ComfyUI's ``/ws`` feed.
+
+    Every prompt submitted by this worker carries the monitor's client id, so
+    ComfyUI pushes their ``executing``/``execution_error`` events over one
+    socket. Events are routed to the jobs waiting on the matching prompt id.
+    Waiters are woken whenever the connection state changes so they can fall
+    back to history polling while the socket is down.
+    """
+
+    FINISHED_BACKLOG = 1024
+
+    def __init__(self, client: ComfyClient) -> None:
+        self.client = client
+        self.client_id = uuid4().hex
+        self.connected = False
+        self._watches: Dict[str, _PromptWatch] = {}
+        # Outcomes that arrived before anyone started watching the prompt.
+        self._finished: "OrderedDict[str, Tuple[str, Optional[str]]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._first_attempt: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Start the listener and wait for its first connection attempt."""
+        if self._task is None or self._task.done():
+            self._first_attempt = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        assert self._first_attempt is not None
+        try:
+            await asyncio.wait_for(self._first_attempt.wait(), timeout=WS_CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.debug("ComfyUI websocket still connecting; using history polling meanwhile")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):  # pragma: no cover - best effort
+                pass
+        self._task = None
+        self._set_connected(False)
+
+    def watch(self, prompt_id: str) -> _PromptWatch:
+        watch = _PromptWatch()
+        finished = self._finished.pop(prompt_id, None)
+        if finished is not None:
+            watch.outcome, watch.error = finished
+            watch.event.set()
+        self._watches[prompt_id] = watch
+        return watch
+
+    def unwatch(self, prompt_id: str) -> None:
+        self._watches.pop(prompt_id, None)
+
+    def _set_connected(self, connected: bool) -> None:
+        if self.connected == connected:
+            return
+        self.connected = connected
+        for watch in self._watches.values():
+            watch.event.set()
+
+    def _resolve(self, prompt_id: str, outcome: str, error: Optional[str] = None) -> None:
+        watch = self._watches.get(prompt_id)
+        if watch is None:
+            self._finished[prompt_id] = (outcome, error)
+            while len(self._finished) > self.FINISHED_BACKLOG:
+                self._finished.popitem(last=False)
+            return
+        if watch.outcome is None:
+            watch.outcome, watch.error = outcome, error
+        watch.event.set()
+
+    def _handle_message(self, message: Dict[str, Any]) -> None:
+        event = message.get("type")
+        data = message.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+        if event == "executing" and data.get("node") is None:
+            # Sent after the prompt has been written to history.
+            self._resolve(prompt_id, "completed")
+        elif event == "execution_error":
+            self._resolve(
+                prompt_id,
+                "error",
+                data.get("exception_message") or "ComfyUI reported an error.",
+            )
+        elif event == "execution_interrupted":
+            self._resolve(prompt_id, "error", "ComfyUI execution was interrupted.")
+
+    async def _run(self) -> None:
+        ws_url = f"{self.client.base_url}/ws"
+        delay = 1.0
+        while True:
+            try:
+                session = self.client._get_session()
+                async with session.ws_connect(
+                    ws_url,
+                    params={"clientId": self.client_id},
+                    heartbeat=30,
+                    timeout=aiohttp.ClientWSTimeout(ws_close=self.client.timeout),
+                ) as ws:
+                    self._set_connected(True)
+                    self._first_attempt.set()
+                    delay = 1.0
+                    logger.info("Connected to ComfyUI websocket as %s", self.client_id)
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            continue
+                        try:
+                            self._handle_message(json.loads(msg.data))
+                        except (ValueError, AttributeError):
+                            logger.debug("Ignoring malformed ComfyUI websocket message")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Only warn on the first failure of an outage, not every retry.
+                log = logger.warning if self.connected or delay == 1.0 else logger.debug
+                log(
+                    "ComfyUI websocket unavailable; falling back to history polling",
+                    exc_info=logger.isEnabledFor(logging.DEBUG),
+                )
+            self._set_connected(False)
+            self._first_attempt.set()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+Affinity = Tuple[str, ...]
+
+
+@dataclass(eq=False)
+class ComfyBackend:
+    """One ComfyUI instance in the pool and what the worker knows about it."""
+
+    client: ComfyClient
+    monitor: Optional[ComfyEventMonitor] = None
+    healthy: bool = True
+    queue_depth: int = 0
+    inflight: int = 0
+    inflight_at_check: int = 0
+    vram_free: Optional[int] = None
+    checked_at: Optional[float] = None
+    last_error: Optional[str] = None
+    # Affinity keys (base model, LoRA) of recent jobs, most recent last.
+    resident: "OrderedDict[Affinity, None]" = field(default_factory=OrderedDict)
+
+    @property
+    def url(self) -> str:
+        return self.client.base_url
+
+    @property
+    def load(self) -> int:
+        """Queued work from other clients at the last check plus our jobs now."""
+        return max(self.queue_depth - self.inflight_at_check, 0) + self.inflight
+
+    def remember(self, affinity: Optional[Affinity]) -> None:
+        if affinity is None:
+            return
+        self.resident.pop(affinity, None)
+        self.resident[affinity] = None
+        while len(self.resident) > COMFYUI_AFFINITY_MEMORY:
+            self.resident.popitem(last=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "load": self.load,
+            "queue_depth": self.queue_depth,
+            "inflight": self.inflight,
+            "vram_free": self.vram_free,
+            "checked_at": self.checked_at,
+            "last_error": self.last_error,
+            "resident": [list(key) for key in self.resident],
+            "websocket": self.monitor is not None and self.monitor.connected,
+        }
+
+
+class ComfyBackendPool:
+    """Routes prompts across several ComfyUI instances.
+
+    Backends are health-checked every ``COMFYUI_HEALTH_INTERVAL`` seconds
+    through ``/system_stats`` and ``/queue``. A job goes to the healthy
+    backend with the least load, except that a backend which recently ran the
+    same base model/LoRA wins as long as it is within
+    ``COMFYUI_AFFINITY_SLACK`` queued prompts of the least loaded one, since
+    that saves a checkpoint reload. A backend that stops answering is marked
+    down and its jobs are resubmitted elsewhere (see :func:`_run_prompt`).
+    """
+
+    def __init__(self, urls: Sequence[str], *, use_websocket: bool = COMFYUI_USE_WEBSOCKET) -> None:
+        if not urls:
+            raise ValueError("At least one ComfyUI URL is required.")
+        self.backends: List[ComfyBackend] = []
+        for url in urls:
+            client = ComfyClient(url)
+            monitor = ComfyEventMonitor(client) if use_websocket else None
+            self.backends.append(ComfyBackend(client=client, monitor=monitor))
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        monitors = [b.monitor.start() for b in self.backends if b.monitor is not None]
+        if len(self.backends) > 1 and (self._health_task is None or self._health_task.done()):
+            await asyncio.gather(self.check_all(), *monitors)
+            self._health_task = asyncio.create_task(self._health_loop())
+        elif monitors:
+            await asyncio.gather(*monitors)
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except (asyncio.CancelledError, Exception):  # pragma: no cover - best effort
+                pass
+        self._health_task = None
+        for backend in self.backends:
+            if backend.monitor is not None:
+                await backend.monitor.close()
+            await backend.client.close()
+
+    async def check(self, backend: ComfyBackend) -> bool:
+        inflight = backend.inflight
+        try:
+            stats, queue = await asyncio.gather(
+                backend.client.get_json(
+                    "/system_stats", context="check ComfyUI health", timeout=COMFYUI_HEALTH_TIMEOUT, retries=0
+                ),
+                backend.client.get_json(
+                    "/queue", context="check ComfyUI queue", timeout=COMFYUI_HEALTH_TIMEOUT, retries=0
+                ),
+            )
+        except ComfyUIError as exc:
+            self.mark_down(backend, str(exc))
+            return False
+
+        if not backend.healthy:
+            logger.info("ComfyUI backend %s is healthy again", backend.url)
+        devices = (stats or {}).get("devices") or []
+        backend.vram_free = sum(d.get("vram_free") or 0 for d in devices) if devices else None
+        backend.queue_depth = len(queue.get("queue_running") or []) + len(queue.get("queue_pending") or [])
+        backend.inflight_at_check = inflight
+        backend.checked_at = time.time()
+        backend.healthy = True
+        backend.last_error = None
+        return True
+
+    async def check_all(self) -> None:
+        await asyncio.gather(*(self.check(backend) for backend in self.backends))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(COMFYUI_HEALTH_INTERVAL)
+            try:
+                await self.check_all()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pragma: no cover - keep checking
+                logger.exception("ComfyUI health check failed")
+
+    def mark_down(self, backend: ComfyBackend, reason: str) -> None:
+        if backend.healthy:
+            logger.warning("ComfyUI backend %s is unavailable: %s", backend.url, reason)
+        backend.healthy = False
+        backend.last_error = reason
+        backend.checked_at = time.time()
+
+    def select(
+        self, affinity: Optional[Affinity] = None, exclude: Sequence[ComfyBackend] = ()
+    ) -> ComfyBackend:
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            raise ComfyUnavailableError("No ComfyUI backend is available.")
+        # When every backend looks down, still try them rather than failing outright.
+        candidates = [b for b in candidates if b.healthy] or candidates
+        if affinity is not None:
+            least = min(b.load for b in candidates)
+            warm = [b for b in candidates if affinity in b.resident and b.load <= least + COMFYUI_AFFINITY_SLACK]
+            if warm:
+                candidates = warm
+        return min(candidates, key=lambda b: (b.load, -(b.vram_free or 0)))
+
+    @asynccontextmanager
+    async def lease(self, backend: ComfyBackend, affinity: Optional[Affinity] = None):
+        backend.inflight += 1
+        try:
+            yield backend
+            backend.remember(affinity)
+        finally:
+            backend.inflight -= 1
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [backend.to_dict() for backend in self.backends]
+
+
+_pool: Optional[ComfyBackendPool] = None
+
+
+def _get_pool() -> ComfyBackendPool:
+    global _pool
+    if _pool is None:
+        _pool = ComfyBackendPool(COMFYUI_API_URLS)
+    return _pool
+
+
+async def get_backend_pool() -> ComfyBackendPool:
+    """Return the backend pool with its monitors and health checks running."""
+    pool = _get_pool()
+    await pool.start()
+    return pool
+
+
+def get_comfy_client() -> ComfyClient:
+    """Client for the first configured backend."""
+    return _get_pool().backends[0].client
+
+
+async def close_comfy_client() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def _submit_workflow(
+    workflow: Dict[str, Any], backend: ComfyBackend, lane: Optional[str] = None
+) -> str:
+    monitor = backend.monitor
+    client_id = monitor.client_id if monitor is not None else uuid4().hex
+
+    body: Dict[str, Any] = {"prompt": workflow, "client_id": client_id}
+    if lane:
+        body["lane"] = lane
+    payload = await backend.client.post_json("/api/prompt", body, context="submit workflow")
     prompt_id = payload.get("prompt_id") or payload.get("id")
     if not prompt_id:
         raise ComfyUIError("ComfyUI did not return a prompt_id.")
     return prompt_id
 
 
-def _poll_history(prompt_id: str) -> Dict[str, Any]:
-    url = f"{COMFYUI_API_URL}/api/history/{prompt_id}"
-    deadline = time.time() + COMFYUI_POLL_TIMEOUT
+def _history_outcome(prompt_history: Dict[str, Any]) -> Optional[str]:
+    status = prompt_history.get("status") or {}
+    state = status.get("status") or status.get("status_str")
+    if state in ("completed", "success") or status.get("completed"):
+        return "completed"
+    if state == "error":
+        return "error"
+    return None
 
-    while True:
-        response = requests.get(url, timeout=30)
-        _raise_for_status(response, "poll workflow history")
-        history = response.json()
-
-        prompt_history = history.get(prompt_id)
-        if prompt_history is None:
-            # History key sometimes omitted until processing starts.
-            if time.time() > deadline:
-                raise ComfyUIError("ComfyUI did not provide history for this prompt.")
-        else:
-            status = prompt_history.get("status", {})
-            if status.get("status") == "completed":
-                return prompt_history
-            if status.get("status") == "error":
-                raise ComfyUIError(status.get("error", "ComfyUI reported an error."))
 
-        if time.time() > deadline:
-            raise ComfyUIError("Timed out waiting for ComfyUI to complete the workflow.")
+def _history_error(prompt_history: Dict[str, Any]) -> str:
+    status = prompt_history.get("status") or {}
+    if status.get("error"):
+        return status["error"]
+    for event, data in status.get("messages") or []:
+        if event == "execution_error" and data.get("exception_message"):
+            return data["exception_message"]
+    return "ComfyUI reported an error."
+
+
+async def _fetch_history(prompt_id: str, backend: ComfyBackend) -> Optional[Dict[str, Any]]:
+    history = await backend.client.get_json(
+        f"/api/history/{prompt_id}", context="poll workflow history"
+    )
+    # History key sometimes omitted until processing starts.
+    return history.get(prompt_id)
+
 
-        time.sleep(COMFYUI_POLL_INTERVAL)
+async def _wait_for_history(prompt_id: str, backend: ComfyBackend) -> Dict[str, Any]:
+    """Wait for a prompt to finish and return its history entry.
 
+    With a connected websocket monitor this blocks on the completion event
+    and fetches history once; history is only polled every
+    ``COMFYUI_POLL_INTERVAL`` seconds while the socket is unavailable.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + COMFYUI_POLL_TIMEOUT
+    monitor = backend.monitor
+    watch = monitor.watch(prompt_id) if monitor is not None else None
 
-def _find_image(history: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        while True:
+            if watch is None:
+                should_fetch = True
+            else:
+                if watch.outcome == "error":
+                    raise ComfyUIError(watch.error or "ComfyUI reported an error.")
+                # Fetch when signalled (completion or a socket state change)
+                # or when the socket is down and we are back to polling.
+                should_fetch = (
+                    watch.event.is_set() or watch.outcome is not None or not monitor.connected
+                )
+                watch.event.clear()
+
+            if should_fetch:
+                prompt_history = await _fetch_history(prompt_id, backend)
+                if prompt_history is not None:
+                    outcome = _history_outcome(prompt_history)
+                    if outcome == "completed":
+                        return prompt_history
+                    if outcome == "error":
+                        raise ComfyUIError(_history_error(prompt_history))
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise ComfyUIError("Timed out waiting for ComfyUI to complete the workflow.")
+
+            if watch is None:
+                await asyncio.sleep(min(COMFYUI_POLL_INTERVAL, remaining))
+                continue
+
+            if monitor.connected and watch.outcome is None:
+                timeout = remaining
+            else:
+                timeout = min(COMFYUI_POLL_INTERVAL, remaining)
+            try:
+                await asyncio.wait_for(watch.event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if monitor is not None:
+            monitor.unwatch(prompt_id)
+
+
+def _find_images(history: Dict[str, Any]) -> List[Dict[str, Any]]:
     outputs: Dict[str, Any] = history.get("outputs", {})
 
+    images: List[Dict[str, Any]] = []
     for node_output in outputs.values():
-        images = node_output.get("images")
-        if not images:
-            continue
-        # Return the first image descriptor.
-        return images[0]
-
-    raise ComfyUIError("No images were returned by the workflow.")
+        images.extend(node_output.get("images") or [])
+    return images
 
 
-def _download_image(image_meta: Dict[str, Any]) -> Path:
+async def _download_image(image_meta: Dict[str, Any], backend: ComfyBackend) -> Path:
     filename = image_meta.get("filename")
     subfolder = image_meta.get("subfolder", "")
     image_type = image_meta.get("type", "output")
@@ -139,74 +661,210 @@ def _download_image(image_meta: Dict[str, Any]) -> Path:
     if not filename:
         raise ComfyUIError("Image metadata missing filename.")
 
+    if COMFYUI_LINK_MODE != "off" and COMFYUI_LOCAL_DIR:
+        linked = await _link_local_image(filename, subfolder, image_type)
+        if linked is not None:
+            return linked
+
     params = {
         "filename": filename,
         "subfolder": subfolder,
         "type": image_type,
     }
-    url = f"{COMFYUI_API_URL}/view"
 
-    response = requests.get(url, params=params, timeout=30)
-    _raise_for_status(response, "download generated image")
+    response = await backend.client.request(
+        "GET",
+        "/view",
+        context="download generated image",
+        timeout=COMFYUI_DOWNLOAD_TIMEOUT,
+        params=params,
+    )
 
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    destination = OUTPUT_DIR / f"{int(time.time())}_{filename}"
-    destination.write_bytes(response.content)
-    return destination
-
+    temp_path = OUTPUT_DIR / f".{uuid4().hex}.part"
+    digest = hashlib.sha256()
+    try:
+        async with response:
+            with temp_path.open("wb") as fp:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    fp.write(chunk)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        temp_path.unlink(missing_ok=True)
+        raise ComfyUIError(f"Failed to download generated image: {exc or type(exc).__name__}") from exc
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return commit_temp_file(temp_path, OUTPUT_DIR, digest.hexdigest(), Path(filename).suffix)
+
+
+async def _link_local_image(filename: str, subfolder: str, image_type: str) -> Optional[Path]:
+    """Link an image straight out of a ComfyUI install on the same filesystem."""
+    if image_type not in ("output", "temp", "input"):
+        return None
+    source = resolve_inside(Path(COMFYUI_LOCAL_DIR) / image_type, subfolder, filename)
+    if source is None:
+        return None
 
-def _raise_for_status(response: Response, context: str) -> None:
     try:
-        response.raise_for_status()
-    except requests.HTTPError as exc:
-        detail = response.text
-        raise ComfyUIError(f"Failed to {context}: {detail}") from exc
+        # Named by content like downloads, so linking the same image twice
+        # leaves a single file.
+        digest = await asyncio.to_thread(sha256_file, source)
+    except OSError:
+        return None
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = OUTPUT_DIR / f".{uuid4().hex}.part"
+    if await asyncio.to_thread(link_file, source, temp_path, COMFYUI_LINK_MODE):
+        return commit_temp_file(temp_path, OUTPUT_DIR, digest, Path(filename).suffix)
+    logger.debug("Could not %s %s; downloading it instead", COMFYUI_LINK_MODE, source)
+    return None
 
 
-def generate_image_workflow(
-    prompt: str,
-    negative_prompt: str = "",
-    *,
-    lora_path: Optional[str] = None,
-    cfg_scale: float = 7.0,
-    steps: int = 30,
-    seed: Optional[int] = None,
-    sampler: str = "euler",
-    scheduler: str = "normal",
-    width: int = 1024,
-    height: int = 1024,
-    base_model: Optional[str] = None,
-) -> ComfyResult:
-    workflow = _load_workflow(GENERATION_WORKFLOW_PATH)
+async def _run_on_backend(
+    workflow: Dict[str, Any], backend: ComfyBackend, lane: Optional[str] = None
+) -> Tuple[str, Dict[str, Any], List[Path]]:
+    prompt_id = await _submit_workflow(workflow, backend, lane)
+    logger.info("Submitted ComfyUI prompt %s to %s", prompt_id, backend.url)
 
+    history = await _wait_for_history(prompt_id, backend)
+    images = _find_images(history)
+    if not images:
+        raise ComfyUIError(f"No images were returned by the workflow for prompt {prompt_id}.")
+    paths = list(await asyncio.gather(*(_download_image(image_meta, backend) for image_meta in images)))
+    return prompt_id, history, paths
+
+
+async def _run_prompt(
+    workflow: Dict[str, Any],
+    *,
+    affinity: Optional[Affinity] = None,
+    cacheable: bool = False,
+    lane: Optional[str] = COMFYUI_JOB_LANE,
+) -> Tuple[str, Dict[str, Any], List[Path]]:
+    """Render ``workflow`` (or reuse a cached render) and download every image.
+
+    The prompt runs on the backend picked by the pool for ``affinity``, in
+    ComfyUI's scheduling ``lane``. If
+    that backend becomes unreachable before the images are downloaded, it is
+    marked down and the prompt is resubmitted to the next one.
+
+    Only pass ``cacheable=True`` for deterministic workflows, i.e. ones whose
+    seed was chosen by the caller rather than derived from the clock.
+    """
+    cache = get_result_cache(OUTPUT_DIR) if cacheable else None
+    key: Optional[str] = None
+    if cache is not None and cache.enabled:
+        key = await asyncio.to_thread(workflow_cache_key, workflow)
+        cached_paths = await asyncio.to_thread(cache.get, key)
+        if cached_paths:
+            logger.info("Result cache hit for workflow %s", key[:16])
+            return f"cache:{key[:16]}", {"cached": True, "cache_key": key}, cached_paths
+
+    pool = await get_backend_pool()
+    tried: List[ComfyBackend] = []
+    while True:
+        backend = pool.select(affinity, exclude=tried)
+        try:
+            async with pool.lease(backend, affinity):
+                prompt_id, history, paths = await _run_on_backend(workflow, backend, lane)
+            break
+        except ComfyUnavailableError as exc:
+            pool.mark_down(backend, str(exc))
+            tried.append(backend)
+            if len(tried) >= len(pool.backends):
+                raise
+            logger.warning("Resubmitting workflow after ComfyUI backend %s failed", backend.url)
+
+    if key is not None:
+        await asyncio.to_thread(cache.put, key, paths)
+    return prompt_id, history, paths
+
+
+def _generation_replacements(
+    *,
+    prompt: str,
+    negative_prompt: str,
+    lora_path: Optional[str],
+    cfg_scale: float,
+    steps: int,
+    seed: int,
+    sampler: str,
+    scheduler: str,
+    width: int,
+    height: int,
+    base_model: Optional[str],
+    batch_size: int = 1,
+) -> Dict[str, Any]:
     base_model_value = base_model or COMFYUI_BASE_MODEL
     if not base_model_value:
         raise ComfyUIError(
             "COMFYUI_BASE_MODEL is not configured. Update your worker environment to point to a valid checkpoint filename."
         )
 
-    replacements = {
+    return {
         "prompt": prompt,
         "negative_prompt": negative_prompt,
         "lora_path": lora_path or "",
         "cfg_scale": cfg_scale,
         "steps": steps,
-        "seed": seed or int(time.time()),
+        "seed": seed,
         "sampler": sampler,
         "scheduler": scheduler,
         "width": width,
         "height": height,
         "base_model": base_model_value,
+        "batch_size": batch_size,
     }
 
-    prepared_workflow = _replace_placeholders(workflow, replacements)
 
-    prompt_id = _submit_workflow(prepared_workflow)
-    logger.info("Submitted ComfyUI generation prompt %s", prompt_id)
+def _model_affinity(replacements: Dict[str, Any]) -> Affinity:
+    """Routing key for the checkpoint and LoRA a generation loads."""
+    return (replacements["base_model"], replacements["lora_path"])
+
+
+async def generate_image_workflow(
+    prompt: str,
+    negative_prompt: str = "",
+    *,
+    lora_path: Optional[str] = None,
+    cfg_scale: float = 7.0,
+    steps: int = 30,
+    seed: Optional[int] = None,
+    sampler: str = "euler",
+    scheduler: str = "normal",
+    width: int = 1024,
+    height: int = 1024,
+    base_model: Optional[str] = None,
+    lane: Optional[str] = COMFYUI_JOB_LANE,
+) -> ComfyResult:
+    template = _load_workflow(GENERATION_WORKFLOW_PATH)
+    # A seed of 0 also falls back to the clock.
+    render_seed = seed or int(time.time())
+
+    replacements = _generation_replacements(
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        lora_path=lora_path,
+        cfg_scale=cfg_scale,
+        steps=steps,
+        seed=render_seed,
+        sampler=sampler,
+        scheduler=scheduler,
+        width=width,
+        height=height,
+        base_model=base_model,
+    )
+
+    prepared_workflow = template.render(replacements)
 
-    history = _poll_history(prompt_id)
-    image_meta = _find_image(history)
-    output_path = _download_image(image_meta)
+    prompt_id, history, paths = await _run_prompt(
+        prepared_workflow,
+        affinity=_model_affinity(replacements),
+        cacheable=render_seed == seed,
+        lane=lane,
+    )
+    output_path = paths[0]
 
     logger.info("Saved generated image to %s", output_path)
     return ComfyResult(
@@ -217,14 +875,14 @@ def generate_image_workflow(
     )
 
 
-def upscale_image_workflow(
+async def upscale_image_workflow(
     image_path: str,
     *,
     model_name: str = "4x-UltraSharp.pth",
     tile_size: int = 0,
     upscale_factor: float = 2.0,
 ) -> ComfyResult:
-    workflow = _load_workflow(UPSCALE_WORKFLOW_PATH)
+    template = _load_workflow(UPSCALE_WORKFLOW_PATH)
 
     replacements = {
         "image_path": image_path,
@@ -233,14 +891,10 @@ def upscale_image_workflow(
         "upscale_factor": upscale_factor,
     }
 
-    prepared_workflow = _replace_placeholders(workflow, replacements)
+    prepared_workflow = template.render(replacements)
 
-    prompt_id = _submit_workflow(prepared_workflow)
-    logger.info("Submitted ComfyUI upscale prompt %s", prompt_id)
-
-    history = _poll_history(prompt_id)
-    image_meta = _find_image(history)
-    output_path = _download_image(image_meta)
+    prompt_id, history, paths = await _run_prompt(prepared_workflow, affinity=("upscale", model_name))
+    output_path = paths[0]
 
     logger.info("Saved upscaled image to %s", output_path)
     return ComfyResult(
@@ -250,3 +904,115 @@ def upscale_image_workflow(
         history=history,
     )
 
+
+@dataclass
+class ComfyBatchResult:
+    prompt_ids: List[str]
+    status: str
+    items: List[Dict[str, Any]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "prompt_ids": self.prompt_ids,
+            "status": self.status,
+            "image_paths": [item["image_path"] for item in self.items],
+            "items": self.items,
+        }
+
+
+async def _run_batch_submission(
+    workflow: Dict[str, Any],
+    affinity: Affinity,
+    entries: List[Dict[str, Any]],
+    cacheable: bool,
+) -> List[Dict[str, Any]]:
+    """Submit one prompt and map its output images onto ``entries``.
+
+    ``entries`` describes the images the submission is expected to produce,
+    in batch order; any extra images (e.g. from additional output nodes)
+    reuse the last entry.
+    """
+    prompt_id, _history, paths = await _run_prompt(workflow, affinity=affinity, cacheable=cacheable)
+    items = []
+    for index, path in enumerate(paths):
+        entry = entries[min(index, len(entries) - 1)]
+        items.append({**entry, "batch_index": index, "prompt_id": prompt_id, "image_path": str(path)})
+    return items
+
+
+async def generate_image_batch(
+    prompts: Sequence[str],
+    negative_prompt: str = "",
+    *,
+    seeds: Optional[Sequence[int]] = None,
+    seed_start: Optional[int] = None,
+    count: int = 1,
+    lora_path: Optional[str] = None,
+    cfg_scale: float = 7.0,
+    steps: int = 30,
+    sampler: str = "euler",
+    scheduler: str = "normal",
+    width: int = 1024,
+    height: int = 1024,
+    base_model: Optional[str] = None,
+) -> ComfyBatchResult:
+    """Render every prompt for a seed range or an explicit list of seeds.
+
+    The template is prepared once for the whole batch. For a seed range and
+    a template exposing ``{{batch_size}}``, each prompt becomes a single
+    submission with a latent batch of ``count`` images (ComfyUI derives the
+    per-image noise from ``seed_start`` and the batch index). Otherwise one
+    submission per (prompt, seed) is pipelined over the shared connection
+    pool. All output images of every submission are downloaded.
+    """
+    if not prompts:
+        raise ComfyUIError("At least one prompt is required for a batch.")
+
+    template = _load_workflow(GENERATION_WORKFLOW_PATH)
+    common = dict(
+        negative_prompt=negative_prompt,
+        lora_path=lora_path,
+        cfg_scale=cfg_scale,
+        steps=steps,
+        sampler=sampler,
+        scheduler=scheduler,
+        width=width,
+        height=height,
+        base_model=base_model,
+    )
+
+    submissions: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = []
+    if seeds:
+        for prompt in prompts:
+            for seed in seeds:
+                values = _generation_replacements(prompt=prompt, seed=seed, **common)
+                submissions.append((template.render(values), [{"prompt": prompt, "seed": seed}]))
+    else:
+        start = seed_start if seed_start is not None else int(time.time())
+        if "batch_size" in template.placeholders:
+            for prompt in prompts:
+                values = _generation_replacements(
+                    prompt=prompt, seed=start, batch_size=count, **common
+                )
+                entries = [{"prompt": prompt, "seed": start} for _ in range(count)]
+                submissions.append((template.render(values), entries))
+        else:
+            for prompt in prompts:
+                for seed in range(start, start + count):
+                    values = _generation_replacements(prompt=prompt, seed=seed, **common)
+                    submissions.append((template.render(values), [{"prompt": prompt, "seed": seed}]))
+
+    # Seeds picked from the clock are not reproducible, so skip the cache.
+    cacheable = bool(seeds) or seed_start is not None
+    affinity = _model_affinity(_generation_replacements(prompt="", seed=0, **common))
+    results = await asyncio.gather(
+        *(
+            _run_batch_submission(workflow, affinity, entries, cacheable)
+            for workflow, entries in submissions
+        )
+    )
+
+    items = [item for submission_items in results for item in submission_items]
+    prompt_ids = list(dict.fromkeys(item["prompt_id"] for item in items))
+    logger.info("Saved %s batch image(s) from %s prompt(s)", len(items), len(prompt_ids))
+    return ComfyBatchResult(prompt_ids=prompt_ids, status="completed", items=items)
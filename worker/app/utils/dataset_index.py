@@ -0,0 +1,293 @@
+"""
+Persistent index of dataset folders.
+
+Per-folder summaries (file count, bytes, image count, captioned images and
+a resolution histogram) are stored in SQLite together with the directory's
+mtime. A folder is only rescanned when its mtime changes, and files whose
+size and mtime are unchanged keep their recorded dimensions, so listing is a
+single ``stat`` per folder. Uploads made through the worker update the
+summary incrementally instead of triggering a rescan.
+
+Only directory mtimes are watched: a file rewritten in place with the same
+name is picked up on the next change to its folder.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .storage import ensure_output_dir
+
+logger = logging.getLogger(__name__)
+
+DATASET_INDEX_PATH = os.getenv("DATASET_INDEX_PATH", "storage/dataset_index.sqlite3")
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp"})
+CAPTION_EXTENSIONS = (".txt", ".caption")
+
+
+def read_image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """Return ``(width, height)`` from the image header without decoding it."""
+    try:
+        with path.open("rb") as fp:
+            head = fp.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head.startswith(b"BM") and len(head) >= 26:
+                width, height = struct.unpack("<ii", head[18:26])
+                return width, abs(height)
+            if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+                chunk = head[12:16]
+                if chunk == b"VP8X":
+                    width = int.from_bytes(head[24:27], "little") + 1
+                    height = int.from_bytes(head[27:30], "little") + 1
+                    return width, height
+                if chunk == b"VP8L":
+                    bits = int.from_bytes(head[21:25], "little")
+                    return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+                if chunk == b"VP8 ":
+                    width, height = struct.unpack("<HH", head[26:30])
+                    return width & 0x3FFF, height & 0x3FFF
+                return None
+            if head.startswith(b"\xff\xd8"):
+                return _jpeg_size(fp)
+    except (OSError, struct.error):
+        return None
+    return None
+
+
+def _jpeg_size(fp) -> Optional[Tuple[int, int]]:
+    fp.seek(2)
+    while True:
+        marker = fp.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code in (0xD8, 0x01) or 0xD0 <= code <= 0xD7:
+            continue
+        length_bytes = fp.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        # SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC) carry the size.
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            data = fp.read(5)
+            height, width = struct.unpack(">HH", data[1:5])
+            return width, height
+        fp.seek(length - 2, os.SEEK_CUR)
+
+
+def _caption_stems(names: List[str]) -> set:
+    return {os.path.splitext(name)[0] for name in names if name.lower().endswith(CAPTION_EXTENSIONS)}
+
+
+def _is_image(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+class DatasetIndex:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            folder TEXT NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            PRIMARY KEY (folder, name)
+        );
+        CREATE TABLE IF NOT EXISTS folders (
+            path TEXT PRIMARY KEY,
+            dir_mtime_ns INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            images INTEGER NOT NULL,
+            captioned INTEGER NOT NULL,
+            resolutions TEXT NOT NULL,
+            scanned_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = DATASET_INDEX_PATH) -> None:
+        if path != ":memory:":
+            ensure_output_dir(str(Path(path).expanduser().parent))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "count": row["count"],
+            "bytes": row["bytes"],
+            "images": row["images"],
+            "captioned": row["captioned"],
+            "resolutions": json.loads(row["resolutions"]),
+        }
+
+    def mtime_token(self, folder: Path) -> int:
+        """Directory mtime to pass to ``note_added`` after writing a file."""
+        return os.stat(folder).st_mtime_ns
+
+    def summary(self, folder: Path) -> Dict[str, Any]:
+        key = str(folder.resolve())
+        dir_mtime = os.stat(key).st_mtime_ns
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM folders WHERE path = ?", (key,)).fetchone()
+            if row is not None and row["dir_mtime_ns"] == dir_mtime:
+                return self._summary(row)
+            return self._rescan(key, dir_mtime)
+
+    def note_added(self, folder: Path, file_path: Path, mtime_token: int) -> Dict[str, Any]:
+        """Account for one file written by the worker into ``folder``.
+
+        ``mtime_token`` is the folder mtime captured before the write. If the
+        index was current at that point the summary is updated in place;
+        otherwise something else changed the folder too and it is rescanned.
+        """
+        key = str(folder.resolve())
+        dir_mtime = os.stat(key).st_mtime_ns
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM folders WHERE path = ?", (key,)).fetchone()
+            if row is None or row["dir_mtime_ns"] != mtime_token:
+                return self._rescan(key, dir_mtime)
+
+            name = file_path.name
+            stat = file_path.stat()
+            existing = self._conn.execute(
+                "SELECT 1 FROM files WHERE folder = ? AND name = ?", (key, name)
+            ).fetchone()
+            if existing is not None:
+                # Overwrote a tracked file; counts may shift in several ways.
+                return self._rescan(key, dir_mtime)
+
+            summary = self._summary(row)
+            summary["count"] += 1
+            summary["bytes"] += stat.st_size
+            size: Optional[Tuple[int, int]] = None
+            stem = os.path.splitext(name)[0]
+            if _is_image(name):
+                size = read_image_size(file_path)
+                summary["images"] += 1
+                if any((file_path.parent / f"{stem}{ext}").exists() for ext in CAPTION_EXTENSIONS):
+                    summary["captioned"] += 1
+                if size is not None:
+                    label = f"{size[0]}x{size[1]}"
+                    summary["resolutions"][label] = summary["resolutions"].get(label, 0) + 1
+            elif name.lower().endswith(CAPTION_EXTENSIONS):
+                siblings = [
+                    other["name"]
+                    for other in self._conn.execute(
+                        "SELECT name FROM files WHERE folder = ? AND name LIKE ?",
+                        (key, f"{stem}.%"),
+                    )
+                    if os.path.splitext(other["name"])[0] == stem
+                ]
+                already = any(other.lower().endswith(CAPTION_EXTENSIONS) for other in siblings)
+                if not already and any(_is_image(other) for other in siblings):
+                    summary["captioned"] += 1
+
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO files (folder, name, size, mtime_ns, width, height) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, name, stat.st_size, stat.st_mtime_ns, *(size or (None, None))),
+            )
+            self._store_summary(key, dir_mtime, summary)
+            self._conn.execute("COMMIT")
+            return summary
+
+    def _store_summary(self, key: str, dir_mtime: int, summary: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO folders"
+            " (path, dir_mtime_ns, count, bytes, images, captioned, resolutions, scanned_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                dir_mtime,
+                summary["count"],
+                summary["bytes"],
+                summary["images"],
+                summary["captioned"],
+                json.dumps(summary["resolutions"], sort_keys=True),
+                time.time(),
+            ),
+        )
+
+    def _rescan(self, key: str, dir_mtime: int) -> Dict[str, Any]:
+        # Caller holds the lock.
+        known = {
+            row["name"]: row
+            for row in self._conn.execute("SELECT * FROM files WHERE folder = ?", (key,))
+        }
+        rows: List[Tuple[Any, ...]] = []
+        with os.scandir(key) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                width = height = None
+                if _is_image(entry.name):
+                    previous = known.get(entry.name)
+                    if (
+                        previous is not None
+                        and previous["size"] == stat.st_size
+                        and previous["mtime_ns"] == stat.st_mtime_ns
+                    ):
+                        width, height = previous["width"], previous["height"]
+                    else:
+                        size = read_image_size(Path(entry.path))
+                        if size is not None:
+                            width, height = size
+                rows.append((key, entry.name, stat.st_size, stat.st_mtime_ns, width, height))
+
+        captions = _caption_stems([row[1] for row in rows])
+        summary: Dict[str, Any] = {
+            "count": len(rows),
+            "bytes": sum(row[2] for row in rows),
+            "images": 0,
+            "captioned": 0,
+            "resolutions": {},
+        }
+        for _, name, _, _, width, height in rows:
+            if not _is_image(name):
+                continue
+            summary["images"] += 1
+            if os.path.splitext(name)[0] in captions:
+                summary["captioned"] += 1
+            if width is not None and height is not None:
+                label = f"{width}x{height}"
+                summary["resolutions"][label] = summary["resolutions"].get(label, 0) + 1
+
+        self._conn.execute("BEGIN")
+        self._conn.execute("DELETE FROM files WHERE folder = ?", (key,))
+        self._conn.executemany(
+            "INSERT INTO files (folder, name, size, mtime_ns, width, height) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self._store_summary(key, dir_mtime, summary)
+        self._conn.execute("COMMIT")
+        logger.debug("Indexed dataset folder %s (%s files)", key, len(rows))
+        return summary
+
+
+_index: Optional[DatasetIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_dataset_index() -> DatasetIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DatasetIndex(DATASET_INDEX_PATH)
+        return _index
@@ -0,0 +1,283 @@
+"""
+Bulk dataset ingestion.
+
+Uploaded images (individually or inside zip/tar archives) are decoded,
+validated and optionally normalized in a process pool. Each child process
+writes its result straight into the dataset folder, so only the raw upload
+bytes cross the process boundary. Caption files (``.txt``/``.caption``) in
+an archive are stored next to the image with the same original stem.
+
+Archives are read on a worker thread, one member at a time, and rejected
+once they exceed ``INGEST_MAX_MEMBERS`` files or ``INGEST_MAX_ARCHIVE_BYTES``
+of uncompressed data. No single file may exceed ``INGEST_MAX_FILE_BYTES``.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))
+INGEST_MAX_MEMBERS = int(os.getenv("INGEST_MAX_MEMBERS", "10000"))
+INGEST_MAX_ARCHIVE_BYTES = int(os.getenv("INGEST_MAX_ARCHIVE_BYTES", str(4 * 1024**3)))
+INGEST_MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", str(128 * 1024**2)))
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif"})
+CAPTION_EXTENSIONS = frozenset({".txt", ".caption"})
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+OUTPUT_FORMATS = {"png": ("PNG", ".png"), "jpeg": ("JPEG", ".jpg"), "webp": ("WEBP", ".webp")}
+
+
+class IngestError(ValueError):
+    """Raised for ingestion requests that cannot be processed at all."""
+
+
+@dataclass(frozen=True)
+class IngestOptions:
+    output_format: Optional[str] = None
+    max_side: int = 0
+    strip_exif: bool = False
+
+    def requires_reencode(self) -> bool:
+        return bool(self.output_format or self.max_side or self.strip_exif)
+
+
+def _process_image(
+    data: bytes, source: str, destination_dir: str, stem: str, options: IngestOptions
+) -> Dict[str, Any]:
+    """Decode, validate, normalize and write one image (runs in a child process)."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except UnidentifiedImageError:
+        return {"source": source, "status": "failed", "error": "Invalid image: unrecognized format."}
+    except Image.DecompressionBombError as exc:
+        return {"source": source, "status": "failed", "error": f"Image too large: {exc}"}
+    except (OSError, SyntaxError, ValueError) as exc:
+        return {"source": source, "status": "failed", "error": f"Invalid image: {exc}"}
+
+    source_format = (image.format or "PNG").upper()
+    if options.output_format:
+        pil_format, extension = OUTPUT_FORMATS[options.output_format]
+    else:
+        pil_format = source_format if source_format in ("PNG", "JPEG", "WEBP") else "PNG"
+        extension = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}[pil_format]
+    # Sources outside PNG/JPEG/WEBP (BMP, GIF) are always converted so the
+    # written bytes match the extension.
+    reencode = options.requires_reencode() or pil_format != source_format
+
+    destination = Path(destination_dir) / f"{stem}{extension}"
+    temp_path = destination.with_name(f".{destination.name}.part")
+
+    try:
+        if reencode:
+            # Bake in the EXIF orientation before metadata is dropped.
+            image = ImageOps.exif_transpose(image)
+            if options.max_side and max(image.size) > options.max_side:
+                image.thumbnail((options.max_side, options.max_side), Image.Resampling.LANCZOS)
+            if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            save_kwargs: Dict[str, Any] = {}
+            if pil_format in ("JPEG", "WEBP"):
+                save_kwargs["quality"] = 95
+            if not options.strip_exif and "exif" in image.info:
+                save_kwargs["exif"] = image.info["exif"]
+            image.save(temp_path, format=pil_format, **save_kwargs)
+        else:
+            temp_path.write_bytes(data)
+        os.replace(temp_path, destination)
+    except (OSError, ValueError) as exc:
+        temp_path.unlink(missing_ok=True)
+        return {"source": source, "status": "failed", "error": f"Could not write image: {exc}"}
+
+    width, height = image.size
+    return {
+        "source": source,
+        "status": "saved",
+        "file_name": destination.name,
+        "width": width,
+        "height": height,
+        "bytes": destination.stat().st_size,
+    }
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_ingest_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(1, INGEST_WORKERS))
+    return _executor
+
+
+def shutdown_ingest_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def read_limited(fileobj, name: str, limit: Optional[int] = None) -> bytes:
+    """Read ``fileobj`` to the end, refusing more than ``limit`` bytes (``INGEST_MAX_FILE_BYTES``)."""
+    if limit is None:
+        limit = INGEST_MAX_FILE_BYTES
+    data = fileobj.read(limit + 1)
+    if len(data) > limit:
+        raise IngestError(f"{name} is larger than {limit} bytes.")
+    return data
+
+
+def iter_archive(
+    filename: str,
+    fileobj,
+    *,
+    max_members: int = INGEST_MAX_MEMBERS,
+    max_bytes: int = INGEST_MAX_ARCHIVE_BYTES,
+) -> Iterator[Tuple[str, bytes]]:
+    """Yield ``(member name, bytes)`` for every regular file in an archive.
+
+    Sizes are counted from the data actually decompressed, not the sizes the
+    archive declares. Raises ``IngestError`` once a limit is exceeded.
+    """
+    members = 0
+    total = 0
+
+    def account(name: str, data: bytes) -> Tuple[str, bytes]:
+        nonlocal members, total
+        members += 1
+        total += len(data)
+        if members > max_members:
+            raise IngestError(f"Archive has more than {max_members} files.")
+        if total > max_bytes:
+            raise IngestError(f"Archive expands to more than {max_bytes} bytes.")
+        return name, data
+
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield account(info.filename, read_limited(member, info.filename))
+        return
+
+    with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            extracted = archive.extractfile(member)
+            if extracted is not None:
+                yield account(member.name, read_limited(extracted, member.name))
+
+
+def _kind(name: str) -> Optional[str]:
+    base = os.path.basename(name)
+    if not base or base.startswith("."):
+        return None
+    extension = os.path.splitext(base)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        return "image"
+    if extension in CAPTION_EXTENSIONS:
+        return "caption"
+    return None
+
+
+class DatasetIngest:
+    """Collects uploads for one dataset folder and processes them concurrently."""
+
+    def __init__(self, dataset_dir: Path, model_id: str, options: IngestOptions) -> None:
+        if options.output_format and options.output_format not in OUTPUT_FORMATS:
+            raise IngestError(
+                f"Unsupported format {options.output_format!r}; use one of {', '.join(OUTPUT_FORMATS)}."
+            )
+        self.dataset_dir = dataset_dir
+        self.model_id = model_id
+        self.options = options
+        self.results: List[Dict[str, Any]] = []
+        self._stems: Dict[str, str] = {}
+        self._imaged: Set[str] = set()
+        self._captions: List[Tuple[str, str, bytes]] = []
+        self._pending: List[Tuple["asyncio.Future[Dict[str, Any]]", Optional[str]]] = []
+        self._slots = asyncio.Semaphore(max(1, INGEST_WORKERS) * 2)
+
+    def _stem_for(self, source: str) -> str:
+        # Images and captions sharing an original stem share the new stem too.
+        original = os.path.splitext(source)[0]
+        if original not in self._stems:
+            self._stems[original] = f"{self.model_id}-{uuid4().hex}"
+        return self._stems[original]
+
+    async def add(self, source: str, data: bytes) -> None:
+        kind = _kind(source)
+        if kind == "caption":
+            self._captions.append((source, self._stem_for(source), data))
+            return
+        if kind != "image":
+            self.results.append({"source": source, "status": "skipped", "error": "Unsupported file type."})
+            return
+
+        original = os.path.splitext(source)[0]
+        warning = None
+        if original in self._imaged:
+            # a.png next to a.jpg: keep both under separate names; the caption
+            # stays with the first one.
+            stem = f"{self.model_id}-{uuid4().hex}"
+            warning = "Another image has the same name; saved under a new name without its caption."
+        else:
+            self._imaged.add(original)
+            stem = self._stem_for(source)
+
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            get_ingest_executor(),
+            _process_image,
+            data,
+            source,
+            str(self.dataset_dir),
+            stem,
+            self.options,
+        )
+        future.add_done_callback(lambda _future: self._slots.release())
+        self._pending.append((future, warning))
+
+    async def finish(self) -> List[Dict[str, Any]]:
+        outcomes = await asyncio.gather(*(future for future, _ in self._pending), return_exceptions=True)
+        saved_stems = set()
+        for outcome, (_, warning) in zip(outcomes, self._pending):
+            if isinstance(outcome, BaseException):
+                logger.warning("Dataset ingestion worker failed", exc_info=outcome)
+                self.results.append({"source": None, "status": "failed", "error": str(outcome)})
+                continue
+            if warning is not None and outcome["status"] == "saved":
+                outcome["warning"] = warning
+            self.results.append(outcome)
+            if outcome["status"] == "saved":
+                saved_stems.add(os.path.splitext(outcome["file_name"])[0])
+
+        for source, stem, data in self._captions:
+            if stem not in saved_stems:
+                self.results.append(
+                    {"source": source, "status": "skipped", "error": "Caption has no matching image."}
+                )
+                continue
+            file_name = f"{stem}{os.path.splitext(source)[1].lower()}"
+            await asyncio.to_thread((self.dataset_dir / file_name).write_bytes, data)
+            self.results.append({"source": source, "status": "saved", "file_name": file_name})
+        return self.results
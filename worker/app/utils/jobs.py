@@ -0,0 +1,394 @@
+"""
+Durable job tracking for generation, upscale and training work.
+
+Jobs are persisted in SQLite (WAL mode) so their state survives worker
+restarts. ``JobStore`` defines the storage interface; ``SQLiteJobStore`` is
+the default implementation and ``set_job_store`` allows swapping it out.
+
+Each job records the process that owns it (boot id, pid and process start
+time), so a worker starting next to others sharing the database only fails
+the jobs whose owner is gone.
+"""
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from uuid import uuid4
+
+from ..schemas import JobKind, JobStatus
+from .storage import ensure_output_dir
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "storage/jobs.sqlite3")
+ACTIVE_STATUSES = (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+
+
+def _read_boot_id() -> str:
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r", encoding="utf-8") as handle:
+            return handle.read().strip()
+    except OSError:
+        return ""
+
+
+BOOT_ID = _read_boot_id()
+
+
+def _process_start(pid: int) -> Optional[str]:
+    """Start time of ``pid`` in clock ticks since boot, "" where /proc is unavailable, None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf-8") as handle:
+            stat = handle.read()
+    except FileNotFoundError:
+        return None if os.path.isdir("/proc") else ""
+    except OSError:
+        return ""
+    # Field 22 (starttime); the command name in field 2 may contain spaces.
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+_owners: Dict[int, str] = {}
+
+
+def current_owner() -> str:
+    """Owner token for jobs created by this process."""
+    pid = os.getpid()
+    owner = _owners.get(pid)
+    if owner is None:
+        owner = _owners[pid] = f"{BOOT_ID}:{pid}:{_process_start(pid) or ''}"
+    return owner
+
+
+def owner_alive(owner: str) -> bool:
+    try:
+        boot_id, pid_text, start = owner.rsplit(":", 2)
+        pid = int(pid_text)
+    except ValueError:
+        return False
+    if boot_id != BOOT_ID:
+        return False
+    if start:
+        return _process_start(pid) == start
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobNotFoundError(KeyError):
+    """Raised when a job id is not present in the store."""
+
+
+@dataclass
+class JobRecord:
+    id: str
+    kind: str
+    status: str
+    model_id: Optional[str] = None
+    payload: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    owner: Optional[str] = field(default_factory=current_owner)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "model_id": self.model_id,
+            "payload": self.payload,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobStore(abc.ABC):
+    """Storage interface for job records."""
+
+    @abc.abstractmethod
+    def create(self, record: JobRecord) -> JobRecord:
+        ...
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        ...
+
+    @abc.abstractmethod
+    def update(
+        self,
+        job_id: str,
+        *,
+        status: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> JobRecord:
+        ...
+
+    @abc.abstractmethod
+    def list(
+        self,
+        *,
+        model_id: Optional[str] = None,
+        status: Optional[str] = None,
+        kind: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> List[JobRecord]:
+        ...
+
+    @abc.abstractmethod
+    def fail_interrupted(self, reason: str) -> int:
+        """Mark active jobs whose owning process is no longer running as failed."""
+        ...
+
+
+class SQLiteJobStore(JobStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            model_id TEXT,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            owner TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_model ON jobs (model_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_kind ON jobs (kind, created_at);
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH) -> None:
+        if path != ":memory:":
+            ensure_output_dir(str(Path(path).expanduser().parent))
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    @staticmethod
+    def _row_to_record(row: sqlite3.Row) -> JobRecord:
+        return JobRecord(
+            id=row["id"],
+            kind=row["kind"],
+            status=row["status"],
+            model_id=row["model_id"],
+            payload=json.loads(row["payload"]),
+            result=json.loads(row["result"]) if row["result"] is not None else None,
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            owner=row["owner"],
+        )
+
+    def create(self, record: JobRecord) -> JobRecord:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, model_id, payload, result, error, created_at, updated_at, owner)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record.id,
+                    record.kind,
+                    record.status,
+                    record.model_id,
+                    json.dumps(record.payload, default=str),
+                    json.dumps(record.result, default=str) if record.result is not None else None,
+                    record.error,
+                    record.created_at,
+                    record.updated_at,
+                    record.owner,
+                ),
+            )
+        return record
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_record(row) if row is not None else None
+
+    def update(
+        self,
+        job_id: str,
+        *,
+        status: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> JobRecord:
+        assignments = ["updated_at = ?"]
+        params: List[Any] = [time.time()]
+        if status is not None:
+            assignments.append("status = ?")
+            params.append(status)
+        if result is not None:
+            assignments.append("result = ?")
+            params.append(json.dumps(result, default=str))
+        if error is not None:
+            assignments.append("error = ?")
+            params.append(error)
+        params.append(job_id)
+
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?", params
+            )
+            if cursor.rowcount == 0:
+                raise JobNotFoundError(job_id)
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_record(row)
+
+    def list(
+        self,
+        *,
+        model_id: Optional[str] = None,
+        status: Optional[str] = None,
+        kind: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> List[JobRecord]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column, value in (("model_id", model_id), ("status", status), ("kind", kind)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.extend([limit, offset])
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                params,
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def fail_interrupted(self, reason: str) -> int:
+        failed = 0
+        with self._lock:
+            owners = self._conn.execute(
+                "SELECT DISTINCT owner FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchall()
+            for (owner,) in owners:
+                if owner is not None and owner_alive(owner):
+                    continue
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ?"
+                    " WHERE status IN (?, ?) AND owner IS ?",
+                    (JobStatus.FAILED.value, reason, time.time(), *ACTIVE_STATUSES, owner),
+                )
+                failed += cursor.rowcount
+        return failed
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+_tasks: Set[asyncio.Task] = set()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteJobStore(JOB_STORE_PATH)
+            interrupted = _store.fail_interrupted("Worker restarted before the job finished.")
+            if interrupted:
+                logger.warning("Marked %s interrupted job(s) as failed", interrupted)
+        return _store
+
+
+def set_job_store(store: JobStore) -> None:
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def create_job(
+    kind: JobKind,
+    *,
+    model_id: Optional[str] = None,
+    payload: Optional[Dict[str, Any]] = None,
+    status: JobStatus = JobStatus.QUEUED,
+    job_id: Optional[str] = None,
+) -> JobRecord:
+    record = JobRecord(
+        id=job_id or str(uuid4()),
+        kind=kind.value,
+        status=status.value,
+        model_id=model_id,
+        payload=payload or {},
+    )
+    return get_job_store().create(record)
+
+
+async def submit_job(
+    kind: JobKind,
+    work: Callable[[JobRecord], Awaitable[Dict[str, Any]]],
+    *,
+    model_id: Optional[str] = None,
+    payload: Optional[Dict[str, Any]] = None,
+) -> JobRecord:
+    """Persist a queued job and run ``work`` for it in the background.
+
+    ``work`` returns the job's result mapping; any exception marks the job as
+    failed with the exception message.
+    """
+    record = await asyncio.to_thread(create_job, kind, model_id=model_id, payload=payload)
+    task = asyncio.create_task(_run_job(record, work))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return record
+
+
+async def _run_job(
+    record: JobRecord, work: Callable[[JobRecord], Awaitable[Dict[str, Any]]]
+) -> None:
+    store = get_job_store()
+    try:
+        await asyncio.to_thread(store.update, record.id, status=JobStatus.RUNNING.value)
+        result = await work(record)
+    except asyncio.CancelledError:
+        await asyncio.to_thread(
+            store.update, record.id, status=JobStatus.FAILED.value, error="Worker shut down before the job finished."
+        )
+        raise
+    except Exception as exc:
+        logger.exception("%s job %s failed", record.kind, record.id)
+        await asyncio.to_thread(
+            store.update, record.id, status=JobStatus.FAILED.value, error=str(exc) or type(exc).__name__
+        )
+    else:
+        await asyncio.to_thread(store.update, record.id, status=JobStatus.COMPLETED.value, result=result)
+
+
+async def cancel_background_jobs() -> None:
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,16 +1,22 @@
+import heapq
+import itertools
 import logging
 import os
+import signal
 import subprocess
 import sys
 import threading
 import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, IO, List, Optional
+from typing import Any, Callable, Dict, IO, List, Optional, Tuple
 from uuid import uuid4
 
-from ..schemas import TrainLoraRequest
+from ..schemas import JobKind, JobStatus, TrainLoraRequest
+from .jobs import create_job, get_job_store
+from .latent_cache import LatentStaging, get_latent_cache, latent_settings, model_fingerprint
 from .storage import ensure_output_dir
+from .training_telemetry import TRAINING_TELEMETRY_INTERVAL, TrainingTelemetry, batch_size_from_command
 
 logger = logging.getLogger(__name__)
 
@@ -26,23 +32,11 @@ DEFAULT_OUTPUT_ROOT = Path(
 )
 DEFAULT_DATASET_ROOT = os.getenv("KOHYA_DATASET_ROOT")
 DEFAULT_BASE_MODEL = os.getenv("KOHYA_BASE_MODEL")
-
-
-@dataclass
-class KohyaJob:
-    job_id: str
-    command: List[str]
-    process: subprocess.Popen
-    log_path: Path
-    output_dir: Path
-    output_weight: Path
-    status: str = "running"
-    created_at: float = field(default_factory=time.time)
-    log_handle: Optional[IO[str]] = field(default=None, repr=False)
-
-
-_jobs: Dict[str, KohyaJob] = {}
-_jobs_lock = threading.Lock()
+# Either an explicit device list (one slot per device, pinned through
+# CUDA_VISIBLE_DEVICES) or a plain slot count without pinning.
+KOHYA_GPU_DEVICES = [d.strip() for d in os.getenv("KOHYA_GPU_DEVICES", "").split(",") if d.strip()]
+KOHYA_GPU_SLOTS = len(KOHYA_GPU_DEVICES) or int(os.getenv("KOHYA_GPU_SLOTS", "1"))
+KOHYA_CANCEL_GRACE = float(os.getenv("KOHYA_CANCEL_GRACE", "10"))
 
 
 def _resolve_dataset_path(dataset_path: str) -> Path:
@@ -77,24 +71,388 @@ def _resolve_base_model(requested: Optional[str]) -> str:
     return str(model_path)
 
 
-def _watch_job(job: KohyaJob) -> None:
-    logger.info("Monitoring kohya_ss job %s", job.job_id)
-    return_code = job.process.wait()
-    if job.log_handle:
+@dataclass
+class KohyaJob:
+    job_id: str
+    command: List[str]
+    log_path: Path
+    output_dir: Path
+    output_weight: Path
+    model_id: str = ""
+    priority: int = 0
+    process: Optional[subprocess.Popen] = field(default=None, repr=False)
+    device: Optional[str] = None
+    status: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    cancel_requested: bool = False
+    log_handle: Optional[IO[str]] = field(default=None, repr=False)
+    telemetry: Optional[TrainingTelemetry] = field(default=None, repr=False)
+    latent_staging: Optional[LatentStaging] = field(default=None, repr=False)
+    finished_at: Optional[float] = None
+    sweep_id: Optional[str] = None
+    # A job that must finish before this one may start.
+    blocked_by: Optional[str] = None
+    on_finish: Optional[Callable[["KohyaJob"], None]] = field(default=None, repr=False)
+    watcher: Optional[threading.Thread] = field(default=None, repr=False)
+
+
+class TrainingScheduler:
+    """Runs kohya_ss jobs one per device slot, highest priority first.
+
+    Jobs with equal priority run in submission order. Running trainers are
+    started in their own process group so cancellation also stops any
+    children they spawn (accelerate workers, dataloader processes). Being in
+    their own session they also miss the worker's Ctrl-C, so the worker must
+    call shutdown() on exit or they keep the GPU after it is gone.
+    """
+
+    def __init__(self, slots: int = KOHYA_GPU_SLOTS, devices: Optional[List[str]] = None) -> None:
+        devices = devices if devices is not None else KOHYA_GPU_DEVICES
+        self._free: List[Optional[str]] = list(devices) if devices else [None] * max(1, slots)
+        self.slots = len(self._free)
+        self._queue: List[Tuple[int, int, str]] = []
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, KohyaJob] = {}
+        self._running: Dict[str, KohyaJob] = {}
+        self._lock = threading.RLock()
+        self._closed = False
+
+    def submit(self, job: KohyaJob) -> KohyaJob:
+        with self._lock:
+            if self._closed:
+                raise KohyaError("The training scheduler is shutting down.")
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._queue, (-job.priority, next(self._sequence), job.job_id))
+            failures = self._dispatch()
+        if job.job_id in failures:
+            # Surface launch errors for jobs that started straight away.
+            raise failures[job.job_id]
+        return job
+
+    def get(self, job_id: str) -> Optional[KohyaJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position among queued jobs, or ``None`` if not queued."""
+        with self._lock:
+            for position, (_, _, queued_id) in enumerate(sorted(self._queue), start=1):
+                if queued_id == job_id:
+                    return position
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = [job_id for _, _, job_id in sorted(self._queue)]
+            return {
+                "slots": self.slots,
+                "free_slots": len(self._free),
+                "running": [
+                    {"job_id": job.job_id, "model_id": job.model_id, "device": job.device, "started_at": job.started_at}
+                    for job in self._running.values()
+                ],
+                "queued": [
+                    {
+                        "job_id": job_id,
+                        "model_id": self._jobs[job_id].model_id,
+                        "priority": self._jobs[job_id].priority,
+                        "position": position,
+                    }
+                    for position, job_id in enumerate(queued, start=1)
+                ],
+            }
+
+    def cancel(self, job_id: str) -> KohyaJob:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                raise KohyaError(f"Training job not found: {job_id}")
+            if job.status == "queued":
+                self._queue = [entry for entry in self._queue if entry[2] != job_id]
+                heapq.heapify(self._queue)
+                self._finish(job, "cancelled", error="Cancelled before it started.")
+                _release_staging(job, harvest=False)
+                return job
+            if job.status != "running" or job.process is None:
+                return job
+            job.cancel_requested = True
+            process = job.process
+
+        logger.info("Cancelling kohya_ss job %s", job_id)
+        _signal_process_group(process, signal.SIGTERM)
+        timer = threading.Timer(KOHYA_CANCEL_GRACE, _kill_if_alive, args=(process,))
+        timer.daemon = True
+        timer.start()
+        return job
+
+    def shutdown(self, grace: float = KOHYA_CANCEL_GRACE) -> None:
+        """Cancel queued jobs and stop every running trainer.
+
+        Each trainer's process group gets SIGTERM, and SIGKILL once ``grace``
+        seconds have passed. Blocks until the trainers have exited.
+        """
+        with self._lock:
+            self._closed = True
+            queued = [self._jobs[job_id] for _, _, job_id in self._queue]
+            self._queue = []
+            for job in queued:
+                self._finish(job, "cancelled", error="Worker shut down before it started.")
+                _release_staging(job, harvest=False)
+            running = [job for job in self._running.values() if job.process is not None]
+            for job in running:
+                job.cancel_requested = True
+
+        if not running:
+            return
+        logger.info("Stopping %d running kohya_ss job(s)", len(running))
+        for job in running:
+            _signal_process_group(job.process, signal.SIGTERM)
+        deadline = time.monotonic() + grace
+        for job in running:
+            try:
+                job.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logger.warning("kohya_ss process %s ignored SIGTERM; killing it", job.process.pid)
+        for job in running:
+            # Also reaches children that outlived the trainer itself.
+            _signal_process_group(job.process, getattr(signal, "SIGKILL", signal.SIGTERM))
+            job.process.wait()
+            if job.watcher is not None:
+                job.watcher.join(timeout=5)
+
+    def _dispatch(self) -> Dict[str, KohyaError]:
+        # Caller holds the lock.
+        failures: Dict[str, KohyaError] = {}
+        if self._closed:
+            return failures
+        deferred: List[Tuple[int, int, str]] = []
+        while self._free and self._queue:
+            entry = heapq.heappop(self._queue)
+            job_id = entry[2]
+            job = self._jobs[job_id]
+            blocker = self._jobs.get(job.blocked_by) if job.blocked_by else None
+            if blocker is not None and blocker.status in ("queued", "running"):
+                deferred.append(entry)
+                continue
+            device = self._free.pop(0)
+            try:
+                self._start(job, device)
+            except KohyaError as exc:
+                self._free.insert(0, device)
+                logger.error("Failed to start kohya_ss job %s: %s", job_id, exc)
+                self._finish(job, "failed", error=str(exc))
+                _release_staging(job, harvest=False)
+                failures[job_id] = exc
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+        return failures
+
+    def _start(self, job: KohyaJob, device: Optional[str]) -> None:
+        logger.info("Launching kohya_ss with command: %s", " ".join(job.command))
+        job.log_path.parent.mkdir(parents=True, exist_ok=True)
+        log_file = open(job.log_path, "w", encoding="utf-8")
+
+        env = os.environ.copy()
+        if device is not None:
+            env["CUDA_VISIBLE_DEVICES"] = device
         try:
-            job.log_handle.close()
-        except Exception:  # pragma: no cover - best effort
-            logger.debug("Failed to close log file for job %s", job.job_id, exc_info=True)
-        job.log_handle = None
-    job.status = "completed" if return_code == 0 else "failed"
-    logger.info(
-        "kohya_ss job %s finished with code %s",
-        job.job_id,
-        return_code,
-    )
+            process = subprocess.Popen(
+                job.command,
+                cwd=KOHYA_ROOT,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                text=True,
+                env=env,
+                start_new_session=os.name == "posix",
+            )
+        except FileNotFoundError as exc:
+            log_file.close()
+            raise KohyaError(
+                "Failed to start kohya_ss. Ensure dependencies are installed."
+            ) from exc
+
+        job.process = process
+        job.log_handle = log_file
+        job.telemetry = TrainingTelemetry(
+            job.job_id, job.log_path, batch_size=batch_size_from_command(job.command)
+        )
+        job.device = device
+        job.status = "running"
+        job.started_at = time.time()
+        self._running[job.job_id] = job
+        get_job_store().update(job.job_id, status=JobStatus.RUNNING.value)
+
+        job.watcher = threading.Thread(target=self._watch, args=(job, device), daemon=True)
+        job.watcher.start()
+
+    def _watch(self, job: KohyaJob, device: Optional[str]) -> None:
+        logger.info("Monitoring kohya_ss job %s", job.job_id)
+        return_code: Optional[int] = None
+        error: Optional[str] = None
+        try:
+            while True:
+                try:
+                    return_code = job.process.wait(timeout=TRAINING_TELEMETRY_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    try:
+                        job.telemetry.poll()
+                    except Exception:
+                        logger.warning("Failed to read progress for job %s", job.job_id, exc_info=True)
+            if job.log_handle:
+                try:
+                    job.log_handle.close()
+                except Exception:  # pragma: no cover - best effort
+                    logger.debug("Failed to close log file for job %s", job.job_id, exc_info=True)
+                job.log_handle = None
+            try:
+                job.telemetry.close()
+            except Exception:
+                logger.warning("Failed to read final progress for job %s", job.job_id, exc_info=True)
+            try:
+                _release_staging(job, harvest=return_code == 0 and not job.cancel_requested)
+            except Exception as exc:
+                logger.exception("Failed to collect outputs of job %s", job.job_id)
+                error = f"Failed to collect outputs: {exc}"
+            logger.info(
+                "kohya_ss job %s finished with code %s",
+                job.job_id,
+                return_code,
+            )
+        except Exception as exc:
+            logger.exception("Lost track of kohya_ss job %s", job.job_id)
+            error = f"Lost track of kohya_ss: {exc}"
+        finally:
+            with self._lock:
+                self._running.pop(job.job_id, None)
+                self._free.append(device)
+                if job.cancel_requested:
+                    self._finish(job, "cancelled", return_code=return_code, error="Cancelled while running.")
+                elif error is not None:
+                    self._finish(job, "failed", return_code=return_code, error=error)
+                elif return_code == 0:
+                    self._finish(job, "completed", return_code=return_code)
+                else:
+                    self._finish(
+                        job, "failed", return_code=return_code, error=f"kohya_ss exited with code {return_code}"
+                    )
+                self._dispatch()
+
+    def _finish(
+        self,
+        job: KohyaJob,
+        status: str,
+        *,
+        return_code: Optional[int] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        job.status = status
+        job.finished_at = time.time()
+        get_job_store().update(
+            job.job_id,
+            status=status,
+            result={
+                "return_code": return_code,
+                "log_path": str(job.log_path),
+                "output_dir": str(job.output_dir),
+                "output_weight": str(job.output_weight),
+                "wall_time": job.finished_at - job.started_at if job.started_at else None,
+                "final_loss": job.telemetry.last_loss() if job.telemetry else None,
+            },
+            error=error,
+        )
+        if job.on_finish is not None:
+            try:
+                job.on_finish(job)
+            except Exception:  # pragma: no cover - best effort
+                logger.exception("Finish callback failed for job %s", job.job_id)
+
+
+def _release_staging(job: KohyaJob, *, harvest: bool) -> None:
+    staging = job.latent_staging
+    if staging is None:
+        return
+    job.latent_staging = None
+    cache = get_latent_cache()
+    try:
+        if harvest:
+            cache.harvest(staging)
+    except OSError:
+        logger.warning("Failed to store latents for job %s", job.job_id, exc_info=True)
+    finally:
+        cache.cleanup(staging)
+
+
+def _stage_latents(
+    job_id: str, dataset_path: Path, base_model: str, command: List[str]
+) -> Optional[LatentStaging]:
+    """Point ``command`` at a staging copy of the dataset seeded from the latent cache."""
+    cache = get_latent_cache()
+    settings = latent_settings(command)
+    if not cache.enabled or settings is None:
+        return None
 
+    try:
+        staging = cache.stage(dataset_path, job_id, model_fingerprint(base_model), settings)
+    except OSError:
+        logger.warning("Latent cache staging failed; training from %s directly", dataset_path, exc_info=True)
+        return None
 
-def launch_kohya_training(request: TrainLoraRequest) -> KohyaJob:
+    _use_staging(command, staging)
+    return staging
+
+
+def _use_staging(command: List[str], staging: LatentStaging) -> None:
+    command[:] = [
+        f"--train_data_dir={staging.directory}" if argument.startswith("--train_data_dir=") else argument
+        for argument in command
+    ]
+    for flag in ("--cache_latents", "--cache_latents_to_disk"):
+        if flag not in command:
+            command.append(flag)
+
+
+def _signal_process_group(process: subprocess.Popen, sig: int) -> None:
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, sig)
+        elif sig == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _kill_if_alive(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        logger.warning("kohya_ss process %s ignored SIGTERM; killing it", process.pid)
+        _signal_process_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+
+_scheduler: Optional[TrainingScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_training_scheduler() -> TrainingScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TrainingScheduler()
+        return _scheduler
+
+
+def shutdown_training_scheduler() -> None:
+    """Stop the trainers started by this process, if any."""
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.shutdown()
+
+
+def _build_job(request: TrainLoraRequest, job_id: str) -> Tuple[KohyaJob, Path, str]:
     if not KOHYA_ROOT.exists():
         raise KohyaError(f"KOHYA_PATH directory not found: {KOHYA_ROOT}")
 
@@ -128,47 +486,82 @@ def launch_kohya_training(request: TrainLoraRequest) -> KohyaJob:
     additional_args = request.additional_args or []
     command.extend(additional_args)
 
-    logger.info("Launching kohya_ss with command: %s", " ".join(command))
-
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    log_file = open(log_path, "w", encoding="utf-8")
-
-    try:
-        process = subprocess.Popen(
-            command,
-            cwd=KOHYA_ROOT,
-            stdout=log_file,
-            stderr=subprocess.STDOUT,
-            text=True,
-        )
-    except FileNotFoundError as exc:
-        log_file.close()
-        raise KohyaError(
-            "Failed to start kohya_ss. Ensure dependencies are installed."
-        ) from exc
-
-    job_id = str(uuid4())
     job = KohyaJob(
         job_id=job_id,
         command=command,
-        process=process,
         log_path=log_path,
-        log_handle=log_file,
         output_dir=output_dir,
         output_weight=output_weight,
+        model_id=request.model_id,
+        priority=request.priority,
     )
+    return job, dataset_path, base_model
 
-    with _jobs_lock:
-        _jobs[job_id] = job
 
-    watcher = threading.Thread(target=_watch_job, args=(job,), daemon=True)
-    watcher.start()
+def launch_kohya_training(request: TrainLoraRequest) -> KohyaJob:
+    """Validate a training request and queue it on the training scheduler."""
+    job, dataset_path, base_model = _build_job(request, str(uuid4()))
+    job.latent_staging = _stage_latents(job.job_id, dataset_path, base_model, job.command)
+
+    create_job(
+        JobKind.TRAINING,
+        job_id=job.job_id,
+        model_id=request.model_id,
+        payload=request.model_dump(),
+        status=JobStatus.QUEUED,
+    )
+    return get_training_scheduler().submit(job)
+
+
+def launch_kohya_sweep(
+    requests: List[TrainLoraRequest], *, sweep_id: str, on_finish: Callable[[KohyaJob], None]
+) -> List[KohyaJob]:
+    """Queue several runs over one dataset as a group.
+
+    All runs share one latent staging folder. When some latents still have
+    to be encoded, the first run encodes them and the rest wait for it, so
+    the VAE pass happens once per sweep rather than once per run. Runs are
+    queued contiguously at the same priority and therefore run back to back.
+    """
+    jobs: List[KohyaJob] = []
+    prepared = [_build_job(request, str(uuid4())) for request in requests]
+    first, dataset_path, base_model = prepared[0]
+    staging = _stage_latents(first.job_id, dataset_path, base_model, first.command)
+
+    for index, ((job, _, _), request) in enumerate(zip(prepared, requests)):
+        job.sweep_id = sweep_id
+        job.on_finish = on_finish
+        if staging is not None:
+            if index:
+                _use_staging(job.command, staging)
+                staging.refs += 1
+                if staging.misses:
+                    job.blocked_by = first.job_id
+            job.latent_staging = staging
+        payload = request.model_dump()
+        payload["sweep_id"] = sweep_id
+        create_job(
+            JobKind.TRAINING,
+            job_id=job.job_id,
+            model_id=request.model_id,
+            payload=payload,
+            status=JobStatus.QUEUED,
+        )
+        jobs.append(job)
 
-    return job
+    scheduler = get_training_scheduler()
+    for job in jobs:
+        try:
+            scheduler.submit(job)
+        except KohyaError:
+            # Already recorded as failed; the sweep summary reports it.
+            logger.warning("Sweep %s run %s failed to start", sweep_id, job.job_id)
+    return jobs
 
 
 def get_kohya_job(job_id: str) -> Optional[KohyaJob]:
-    with _jobs_lock:
-        return _jobs.get(job_id)
+    return get_training_scheduler().get(job_id)
 
 
+def cancel_kohya_job(job_id: str) -> KohyaJob:
+    return get_training_scheduler().cancel(job_id)
@@ -0,0 +1,300 @@
+"""
+Content-addressed cache of kohya_ss latents shared between training runs.
+
+kohya writes ``--cache_latents_to_disk`` output as ``.npz`` files next to
+each training image and only checks their shape when reusing them, so the
+cache cannot safely live in the dataset folder itself. Instead every run
+trains from a staging copy of the dataset: images and captions are linked
+in, and any ``.npz`` previously produced for the same image bytes, base
+model and bucketing settings is copied next to them. kohya then encodes only
+the images it has no cache for, and after a successful run the new ``.npz``
+files are copied into the cache. A changed image hashes differently, so only
+its entry is recomputed.
+
+Image hashes are remembered by ``(path, size, mtime)`` and the base model is
+fingerprinted by path, size, mtime and its first and last MiB, so a repeat
+run reads neither the images nor the model in full.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .storage import ensure_output_dir, link_file
+
+logger = logging.getLogger(__name__)
+
+KOHYA_LATENT_CACHE_DIR = os.getenv("KOHYA_LATENT_CACHE_DIR", "storage/latent_cache")
+KOHYA_LATENT_CACHE_MAX_BYTES = int(os.getenv("KOHYA_LATENT_CACHE_MAX_BYTES", str(20 * 1024**3)))
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp", ".bmp"})
+# Arguments that change what the VAE/text encoders see for an image.
+LATENT_ARGUMENTS = (
+    "--resolution",
+    "--enable_bucket",
+    "--min_bucket_reso",
+    "--max_bucket_reso",
+    "--bucket_reso_steps",
+    "--bucket_no_upscale",
+    "--vae",
+    "--no_half_vae",
+    "--flip_aug",
+    "--alpha_mask",
+)
+# kohya refuses to cache latents when images are augmented per step.
+UNCACHEABLE_ARGUMENTS = ("--random_crop", "--color_aug")
+FINGERPRINT_WINDOW = 1024 * 1024
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_fingerprint(reference: str) -> str:
+    """Cheap identity for a base model file (or a hub id when not a file)."""
+    path = Path(reference).expanduser()
+    if not path.is_file():
+        return hashlib.sha256(reference.encode("utf-8")).hexdigest()
+    stat = path.stat()
+    digest = hashlib.sha256(f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    with path.open("rb") as fp:
+        digest.update(fp.read(FINGERPRINT_WINDOW))
+        if stat.st_size > FINGERPRINT_WINDOW:
+            fp.seek(max(FINGERPRINT_WINDOW, stat.st_size - FINGERPRINT_WINDOW))
+            digest.update(fp.read(FINGERPRINT_WINDOW))
+    return digest.hexdigest()
+
+
+def latent_settings(command: Sequence[str]) -> Optional[str]:
+    """Canonical latent-affecting arguments, or ``None`` if caching is unsafe."""
+    if any(argument.split("=", 1)[0] in UNCACHEABLE_ARGUMENTS for argument in command):
+        return None
+    relevant = sorted(
+        argument for argument in command if argument.split("=", 1)[0] in LATENT_ARGUMENTS
+    )
+    script = next((argument for argument in command if argument.endswith(".py")), "")
+    return json.dumps([os.path.basename(script), relevant])
+
+
+@dataclass
+class LatentStaging:
+    """A linked copy of a dataset prepared for one training run."""
+
+    directory: Path
+    model_key: str
+    settings: str
+    # Staged image path (without extension) -> latent cache key.
+    images: Dict[Path, str] = field(default_factory=dict)
+    hits: int = 0
+    # Runs sharing this staging folder; it is removed when the last one ends.
+    refs: int = 1
+
+    @property
+    def misses(self) -> int:
+        return len(self.images) - self.hits
+
+
+class LatentCache:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS image_hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            suffixes TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access);
+    """
+
+    def __init__(
+        self, directory: str = KOHYA_LATENT_CACHE_DIR, *, max_bytes: int = KOHYA_LATENT_CACHE_MAX_BYTES
+    ) -> None:
+        self.directory = Path(ensure_output_dir(directory))
+        self.blobs = Path(ensure_output_dir(str(self.directory / "blobs")))
+        self.staging_root = Path(ensure_output_dir(str(self.directory / "staging")))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.directory / "index.sqlite3"), check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def image_hash(self, path: Path) -> str:
+        stat = path.stat()
+        key = str(path.resolve())
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, sha256 FROM image_hashes WHERE path = ?", (key,)
+            ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = _sha256_file(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, digest),
+            )
+        return digest
+
+    def _entry_key(self, image_digest: str, model_key: str, settings: str) -> str:
+        return hashlib.sha256(f"{image_digest}:{model_key}:{settings}".encode("utf-8")).hexdigest()
+
+    def _blob(self, key: str, suffix: str) -> Path:
+        return self.blobs / key[:2] / f"{key}{suffix}"
+
+    def stage(self, dataset: Path, job_id: str, model_key: str, settings: str) -> LatentStaging:
+        """Mirror ``dataset`` into a staging folder seeded with cached latents."""
+        staging = LatentStaging(
+            directory=self.staging_root / job_id, model_key=model_key, settings=settings
+        )
+        for source in sorted(dataset.rglob("*")):
+            if not source.is_file() or source.suffix.lower() == ".npz":
+                continue
+            target = staging.directory / source.relative_to(dataset)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if not link_file(source, target, "hardlink"):
+                os.symlink(source.resolve(), target)
+            if source.suffix.lower() not in IMAGE_EXTENSIONS:
+                continue
+
+            key = self._entry_key(self.image_hash(source), model_key, settings)
+            stem = target.with_suffix("")
+            staging.images[stem] = key
+            if self._restore(key, stem):
+                staging.hits += 1
+
+        logger.info(
+            "Staged dataset %s for job %s: %s cached latent(s), %s to encode",
+            dataset,
+            job_id,
+            staging.hits,
+            staging.misses,
+        )
+        return staging
+
+    def _restore(self, key: str, stem: Path) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT suffixes FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+        suffixes = json.loads(row[0])
+        if not all(self._blob(key, suffix).exists() for suffix in suffixes):
+            self._remove([key])
+            return False
+        for suffix in suffixes:
+            destination = Path(f"{stem}{suffix}")
+            # Copy-on-write or a real copy: kohya may rewrite a cache file it
+            # considers stale, which must not corrupt the shared blob.
+            if not link_file(self._blob(key, suffix), destination, "reflink"):
+                shutil.copyfile(self._blob(key, suffix), destination)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+        return True
+
+    def harvest(self, staging: LatentStaging) -> int:
+        """Copy latents kohya wrote for uncached images into the cache."""
+        stems = sorted(staging.images, key=lambda stem: len(str(stem)), reverse=True)
+        produced: Dict[Path, List[Tuple[str, Path]]] = {}
+        for npz in staging.directory.rglob("*.npz"):
+            for stem in stems:
+                # Longest stem first so "a_b.png" is not claimed by "a.png".
+                if npz.parent == stem.parent and npz.name.startswith(stem.name):
+                    produced.setdefault(stem, []).append((npz.name[len(stem.name):], npz))
+                    break
+
+        stored = 0
+        now = time.time()
+        for stem, files in produced.items():
+            key = staging.images[stem]
+            with self._lock:
+                known = self._conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+            if known is not None:
+                continue
+            size = 0
+            for suffix, path in files:
+                blob = self._blob(key, suffix)
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                # Copy, not move: other runs may still train from this folder.
+                if not link_file(path, blob, "reflink"):
+                    shutil.copyfile(path, blob)
+                size += blob.stat().st_size
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, suffixes, size, created_at, last_access)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, json.dumps(sorted(suffix for suffix, _ in files)), size, now, now),
+                )
+            stored += 1
+        if stored:
+            logger.info("Cached latents for %s image(s)", stored)
+            self._evict()
+        return stored
+
+    def cleanup(self, staging: LatentStaging) -> None:
+        with self._lock:
+            staging.refs -= 1
+            if staging.refs > 0:
+                return
+        shutil.rmtree(staging.directory, ignore_errors=True)
+
+    def _remove(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            with self._lock:
+                row = self._conn.execute("SELECT suffixes FROM entries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            for suffix in json.loads(row[0]) if row is not None else []:
+                self._blob(key, suffix).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims: List[str] = []
+            for key, size in self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access ASC"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+        self._remove(victims)
+        logger.info("Evicted %s latent cache entr(ies)", len(victims))
+
+
+_cache: Optional[LatentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_latent_cache() -> LatentCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LatentCache(KOHYA_LATENT_CACHE_DIR)
+        return _cache
@@ -0,0 +1,262 @@
+"""
+Content-addressed cache of finished ComfyUI renders.
+
+A fully rendered workflow with a fixed seed is deterministic, so its outputs
+can be reused. Entries are keyed by a canonical hash of the workflow JSON and
+of the size and mtime of every model file it references, so retraining a
+LoRA in place invalidates renders made with the old weights. Entries
+point at image files linked into ``<OUTPUT_DIR>/cache``. An SQLite index
+tracks access times and sizes so the cache can be trimmed least recently
+used first once it exceeds its byte or entry budget.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from .storage import DEFAULT_OUTPUT_DIR, ensure_output_dir
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024**3)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+MODEL_EXTENSIONS = (".safetensors", ".sft", ".ckpt", ".pt", ".pth", ".bin")
+
+
+def _default_model_dirs() -> List[str]:
+    configured = os.getenv("RESULT_CACHE_MODEL_DIRS")
+    if configured is not None:
+        return [d for d in configured.split(os.pathsep) if d]
+    local_dir = os.getenv("COMFYUI_LOCAL_DIR")
+    return [os.path.join(local_dir, "models")] if local_dir else []
+
+
+RESULT_CACHE_MODEL_DIRS = _default_model_dirs()
+
+
+def _model_references(value: Any) -> Iterator[str]:
+    if isinstance(value, str):
+        if value.lower().endswith(MODEL_EXTENSIONS):
+            yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _model_references(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _model_references(item)
+
+
+def _model_identity(reference: str, model_dirs: Sequence[str]) -> Optional[List[int]]:
+    """``[size, mtime_ns]`` of the file ``reference`` names, or ``None`` if it is not found here."""
+    path = Path(reference).expanduser()
+    candidates = [path]
+    if not path.is_absolute():
+        # ComfyUI resolves names inside a folder per model type (checkpoints, loras, ...).
+        for directory in map(Path, model_dirs):
+            candidates.append(directory / path)
+            if directory.is_dir():
+                candidates.extend(sub / path for sub in directory.iterdir() if sub.is_dir())
+    for candidate in candidates:
+        try:
+            stat = candidate.stat()
+        except OSError:
+            continue
+        if candidate.is_file():
+            return [stat.st_size, stat.st_mtime_ns]
+    return None
+
+
+def workflow_cache_key(workflow: Dict[str, Any], model_dirs: Sequence[str] = RESULT_CACHE_MODEL_DIRS) -> str:
+    """Hash of ``workflow`` and of the identity of the model files it loads.
+
+    Model files the worker cannot see (ComfyUI on another host without a
+    shared ``RESULT_CACHE_MODEL_DIRS``) only contribute their name.
+    """
+    models = {reference: _model_identity(reference, model_dirs) for reference in _model_references(workflow)}
+    canonical = json.dumps(
+        {"workflow": workflow, "models": models}, sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(source: Path, destination: Path) -> None:
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class ResultCache:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            files TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access);
+        CREATE TABLE IF NOT EXISTS entry_files (
+            key TEXT NOT NULL,
+            blob TEXT NOT NULL,
+            PRIMARY KEY (key, blob)
+        );
+        CREATE INDEX IF NOT EXISTS idx_entry_files_blob ON entry_files (blob);
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        *,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.output_dir = Path(output_dir)
+        self.directory = Path(ensure_output_dir(str(self.output_dir / "cache")))
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.directory / "index.sqlite3"), check_same_thread=False, isolation_level=None
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_entries > 0
+
+    def get(self, key: str) -> Optional[List[Path]]:
+        """Return result paths inside ``output_dir`` for ``key``, or ``None``."""
+        with self._lock:
+            row = self._conn.execute("SELECT files FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+
+        paths: List[Path] = []
+        for blob in json.loads(row[0]):
+            cached = self.directory / blob
+            if not cached.exists():
+                # Blob vanished underneath us; treat the entry as stale.
+                self.discard(key)
+                return None
+            result = self.output_dir / blob
+            if not result.exists():
+                _link_or_copy(cached, result)
+            paths.append(result)
+        return paths
+
+    def put(self, key: str, paths: Sequence[Path]) -> None:
+        if not self.enabled or not paths:
+            return
+
+        blobs: List[str] = []
+        size = 0
+        for path in paths:
+            blob = path.name
+            cached = self.directory / blob
+            if not cached.exists():
+                _link_or_copy(path, cached)
+            size += cached.stat().st_size
+            blobs.append(blob)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, files, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(blobs), size, now, now),
+            )
+            self._conn.execute("DELETE FROM entry_files WHERE key = ?", (key,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO entry_files (key, blob) VALUES (?, ?)",
+                [(key, blob) for blob in blobs],
+            )
+            self._conn.execute("COMMIT")
+        self._evict()
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._remove_entries([key])
+
+    def _remove_entries(self, keys: Sequence[str]) -> None:
+        # Caller holds the lock. Blobs shared with surviving entries are kept.
+        orphaned: List[str] = []
+        self._conn.execute("BEGIN")
+        for key in keys:
+            blobs = [
+                row[0]
+                for row in self._conn.execute("SELECT blob FROM entry_files WHERE key = ?", (key,))
+            ]
+            self._conn.execute("DELETE FROM entry_files WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            for blob in blobs:
+                still_used = self._conn.execute(
+                    "SELECT 1 FROM entry_files WHERE blob = ? LIMIT 1", (blob,)
+                ).fetchone()
+                if still_used is None:
+                    orphaned.append(blob)
+        self._conn.execute("COMMIT")
+        for blob in orphaned:
+            (self.directory / blob).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        with self._lock:
+            total_bytes, total_entries = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+            ).fetchone()
+            if total_bytes <= self.max_bytes and total_entries <= self.max_entries:
+                return
+
+            victims: List[str] = []
+            rows = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access ASC"
+            ).fetchall()
+            for key, size in rows:
+                if total_bytes <= self.max_bytes and total_entries <= self.max_entries:
+                    break
+                victims.append(key)
+                total_bytes -= size
+                total_entries -= 1
+            self._remove_entries(victims)
+        logger.info("Evicted %s result cache entr(ies)", len(victims))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total_bytes, total_entries = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries"
+            ).fetchone()
+        return {
+            "entries": total_entries,
+            "bytes": total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache(output_dir: Optional[Path] = None) -> ResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = output_dir or Path(
+                ensure_output_dir(os.getenv("OUTPUT_DIR", DEFAULT_OUTPUT_DIR))
+            )
+            _cache = ResultCache(directory)
+        return _cache
@@ -1,7 +1,14 @@
+import errno
+import hashlib
 import os
-from typing import Final
+from pathlib import Path
+from typing import Final, Optional
 
 DEFAULT_OUTPUT_DIR: Final[str] = "storage/results"
+LINK_MODES: Final = ("off", "hardlink", "reflink", "auto")
+
+# Linux FICLONE ioctl: share the source's extents copy-on-write.
+_FICLONE: Final[int] = 0x40049409
 
 
 def ensure_output_dir(base_path: str = DEFAULT_OUTPUT_DIR) -> str:
@@ -9,3 +16,74 @@ def ensure_output_dir(base_path: str = DEFAULT_OUTPUT_DIR) -> str:
     os.makedirs(absolute, exist_ok=True)
     return absolute
 
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def commit_temp_file(temp_path: Path, directory: Path, digest: str, suffix: str) -> Path:
+    """Move a fully written temp file to its content-addressed name.
+
+    The rename is atomic, so readers never observe a partial file. When a
+    file with the same digest already exists the temp file is discarded and
+    the existing path is returned.
+    """
+    destination = directory / f"{digest[:32]}{suffix.lower()}"
+    if destination.exists():
+        temp_path.unlink(missing_ok=True)
+        return destination
+    os.replace(temp_path, destination)
+    return destination
+
+
+def _reflink(source: Path, destination: Path) -> None:
+    import fcntl
+
+    with source.open("rb") as src, destination.open("wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            destination.unlink(missing_ok=True)
+            raise
+
+
+def link_file(source: Path, destination: Path, mode: str) -> bool:
+    """Materialize ``source`` at ``destination`` without copying bytes.
+
+    ``mode`` is one of ``LINK_MODES``; ``auto`` tries a reflink first and
+    then a hardlink. Returns ``False`` when linking is disabled or not
+    supported (different filesystem, unsupported platform), in which case
+    the caller should fall back to a regular copy.
+    """
+    if mode == "off":
+        return False
+
+    attempts = ("reflink", "hardlink") if mode == "auto" else (mode,)
+    for attempt in attempts:
+        try:
+            if attempt == "reflink":
+                _reflink(source, destination)
+            else:
+                os.link(source, destination)
+            return True
+        except (OSError, ImportError) as exc:
+            if isinstance(exc, OSError) and exc.errno == errno.ENOENT:
+                return False
+            continue
+    return False
+
+
+def resolve_inside(root: Path, *parts: str) -> Optional[Path]:
+    """Join ``parts`` onto ``root`` and reject paths that escape it."""
+    root = root.resolve()
+    candidate = root.joinpath(*parts).resolve()
+    try:
+        candidate.relative_to(root)
+    except ValueError:
+        return None
+    return candidate
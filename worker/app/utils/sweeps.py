@@ -0,0 +1,132 @@
+"""
+Hyperparameter sweeps over LoRA training runs.
+
+A sweep expands ``network_dim`` x ``learning_rate`` x ``max_train_steps``
+into a grid (or a random sample of it) and queues one training run per
+point through ``launch_kohya_sweep``, which shares dataset staging and the
+latent cache between them. The sweep itself is a job record whose result is
+recomputed from its runs' records whenever one of them finishes.
+"""
+
+import itertools
+import logging
+import os
+import random
+from typing import Any, Dict, List
+from uuid import uuid4
+
+from ..schemas import JobKind, JobStatus, TrainLoraRequest, TrainLoraSweepRequest
+from .jobs import JobRecord, create_job, get_job_store
+from .kohya import KohyaJob, launch_kohya_sweep
+
+logger = logging.getLogger(__name__)
+
+SWEEP_MAX_RUNS = int(os.getenv("SWEEP_MAX_RUNS", "32"))
+TERMINAL_STATUSES = (JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value)
+
+
+class SweepError(ValueError):
+    """Raised for sweep requests that expand to no runs or too many."""
+
+
+def expand_sweep(request: TrainLoraSweepRequest) -> List[Dict[str, Any]]:
+    points = [
+        {"network_dim": dim, "learning_rate": rate, "max_train_steps": steps}
+        for dim, rate, steps in itertools.product(
+            request.network_dim, request.learning_rate, request.max_train_steps
+        )
+    ]
+    if request.search == "random":
+        count = min(request.trials or len(points), len(points))
+        points = random.Random(request.seed).sample(points, count)
+    if len(points) > SWEEP_MAX_RUNS:
+        raise SweepError(f"Sweep expands to {len(points)} runs; the limit is {SWEEP_MAX_RUNS}.")
+    return points
+
+
+def launch_sweep(request: TrainLoraSweepRequest) -> JobRecord:
+    points = expand_sweep(request)
+    base_name = request.output_name or request.model_id
+    run_requests = [
+        TrainLoraRequest(
+            model_id=request.model_id,
+            dataset_path=request.dataset_path,
+            base_model=request.base_model,
+            output_dir=request.output_dir,
+            output_name=f"{base_name}_sweep{index:02d}",
+            additional_args=request.additional_args,
+            priority=request.priority,
+            **point,
+        )
+        for index, point in enumerate(points)
+    ]
+
+    sweep_id = str(uuid4())
+    create_job(
+        JobKind.SWEEP,
+        job_id=sweep_id,
+        model_id=request.model_id,
+        payload=request.model_dump(),
+        status=JobStatus.RUNNING,
+    )
+    try:
+        jobs = launch_kohya_sweep(run_requests, sweep_id=sweep_id, on_finish=_on_run_finished)
+    except Exception as exc:
+        get_job_store().update(sweep_id, status=JobStatus.FAILED.value, error=str(exc))
+        raise
+
+    get_job_store().update(sweep_id, result={"run_ids": [job.job_id for job in jobs]})
+    return summarize_sweep(sweep_id)
+
+
+def _on_run_finished(job: KohyaJob) -> None:
+    if job.sweep_id is not None:
+        summarize_sweep(job.sweep_id)
+
+
+def summarize_sweep(sweep_id: str) -> JobRecord:
+    """Aggregate run outcomes into the sweep's job record."""
+    store = get_job_store()
+    sweep = store.get(sweep_id)
+    if sweep is None or not sweep.result or "run_ids" not in sweep.result:
+        # Runs can finish before the sweep has recorded their ids.
+        return sweep
+
+    runs: List[Dict[str, Any]] = []
+    for run_id in sweep.result["run_ids"]:
+        record = store.get(run_id)
+        if record is None:
+            continue
+        result = record.result or {}
+        runs.append(
+            {
+                "job_id": run_id,
+                "status": record.status,
+                "network_dim": record.payload.get("network_dim"),
+                "learning_rate": record.payload.get("learning_rate"),
+                "max_train_steps": record.payload.get("max_train_steps"),
+                "final_loss": result.get("final_loss"),
+                "wall_time": result.get("wall_time"),
+                "output_weight": result.get("output_weight"),
+                "error": record.error,
+            }
+        )
+
+    finished = [run for run in runs if run["status"] in TERMINAL_STATUSES]
+    completed = [run for run in runs if run["status"] == JobStatus.COMPLETED.value]
+    scored = [run for run in completed if run["final_loss"] is not None]
+    summary = {
+        "run_ids": sweep.result["run_ids"],
+        "runs": runs,
+        "finished": len(finished),
+        "completed": len(completed),
+        "total": len(runs),
+        "total_wall_time": sum(run["wall_time"] or 0 for run in finished),
+        "best": min(scored, key=lambda run: run["final_loss"]) if scored else None,
+    }
+
+    status = None
+    if len(finished) == len(runs):
+        status = JobStatus.COMPLETED.value if completed else JobStatus.FAILED.value
+        logger.info("Sweep %s finished: %s/%s runs completed", sweep_id, len(completed), len(runs))
+    return store.update(sweep_id, status=status, result=summary)
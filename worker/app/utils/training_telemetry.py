@@ -0,0 +1,209 @@
+"""
+Structured progress for running kohya_ss trainers.
+
+kohya reports progress through tqdm bars and plain ``epoch N/M`` lines in
+its log. ``LogTailer`` reads only the bytes appended since the previous poll
+and splits them on both ``\\n`` and the ``\\r`` tqdm uses to redraw, so a long
+log is never re-read. ``TrainingTelemetry`` turns those lines into samples
+(step, epoch, loss, it/s, samples/s, ETA) kept in a bounded ring buffer per
+job.
+"""
+
+import codecs
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+TRAINING_TELEMETRY_SAMPLES = int(os.getenv("TRAINING_TELEMETRY_SAMPLES", "512"))
+TRAINING_TELEMETRY_INTERVAL = float(os.getenv("TRAINING_TELEMETRY_INTERVAL", "1.0"))
+
+TQDM_PATTERN = re.compile(
+    r"(?P<step>\d+)/(?P<total>\d+)\s*\[(?P<elapsed>[\d:]+)<(?P<eta>[\d:?]+),\s*"
+    r"(?P<rate>[\d.]+|\?)\s*(?P<unit>it/s|s/it)(?:,\s*(?P<postfix>[^\]]*))?\]"
+)
+EPOCH_PATTERN = re.compile(r"\bepoch\s+(?P<epoch>\d+)\s*/\s*(?P<epochs>\d+)", re.IGNORECASE)
+LOSS_PATTERN = re.compile(r"\b(?:avr_loss|loss)\s*=\s*(?P<loss>[-+\d.eE]+|nan)")
+BATCH_SIZE_PATTERN = re.compile(r"batch size per device[^:]*:\s*(?P<batch>\d+)", re.IGNORECASE)
+LINE_SPLIT = re.compile(r"[\r\n]")
+
+
+def _seconds(clock: str) -> Optional[int]:
+    if "?" in clock:
+        return None
+    seconds = 0
+    for part in clock.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+@dataclass
+class ProgressSample:
+    seq: int
+    timestamp: float
+    step: int
+    total_steps: int
+    epoch: Optional[int]
+    total_epochs: Optional[int]
+    loss: Optional[float]
+    it_per_sec: Optional[float]
+    samples_per_sec: Optional[float]
+    elapsed_seconds: Optional[int]
+    eta_seconds: Optional[int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class LogTailer:
+    """Incrementally reads lines appended to a log file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._offset = 0
+        self._partial = ""
+        # Keeps multibyte characters split across two reads intact.
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def read_lines(self) -> List[str]:
+        try:
+            with self.path.open("rb") as fp:
+                fp.seek(self._offset)
+                chunk = fp.read()
+        except FileNotFoundError:
+            return []
+        if not chunk:
+            return []
+        self._offset += len(chunk)
+        parts = LINE_SPLIT.split(self._partial + self._decoder.decode(chunk))
+        # The last piece has no terminator yet; keep it for the next read.
+        self._partial = parts.pop()
+        return [part for part in parts if part.strip()]
+
+    def flush(self) -> List[str]:
+        lines = self.read_lines()
+        self._partial += self._decoder.decode(b"", final=True)
+        if self._partial.strip():
+            lines.append(self._partial)
+        self._partial = ""
+        return lines
+
+
+class TrainingTelemetry:
+    def __init__(
+        self,
+        job_id: str,
+        log_path: Path,
+        *,
+        batch_size: int = 1,
+        max_samples: int = TRAINING_TELEMETRY_SAMPLES,
+    ) -> None:
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.samples: Deque[ProgressSample] = deque(maxlen=max(1, max_samples))
+        self.finished = False
+        self._tailer = LogTailer(log_path)
+        self._seq = 0
+        self._epoch: Optional[int] = None
+        self._total_epochs: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def poll(self) -> int:
+        """Parse newly written log output; returns the number of new samples."""
+        return self._feed(self._tailer.read_lines())
+
+    def close(self) -> None:
+        self._feed(self._tailer.flush())
+        with self._lock:
+            self.finished = True
+
+    def _feed(self, lines: List[str]) -> int:
+        added = 0
+        with self._lock:
+            for line in lines:
+                batch = BATCH_SIZE_PATTERN.search(line)
+                if batch:
+                    self.batch_size = int(batch.group("batch"))
+                epoch = EPOCH_PATTERN.search(line)
+                if epoch:
+                    self._epoch = int(epoch.group("epoch"))
+                    self._total_epochs = int(epoch.group("epochs"))
+                progress = TQDM_PATTERN.search(line)
+                if progress and self._record(progress):
+                    added += 1
+        return added
+
+    def _record(self, match: "re.Match[str]") -> bool:
+        # Caller holds the lock.
+        step = int(match.group("step"))
+        last = self.samples[-1] if self.samples else None
+        if last is not None and last.step == step and last.total_steps == int(match.group("total")):
+            # tqdm redraws the same step (e.g. to update the postfix).
+            if match.group("postfix") is None or LOSS_PATTERN.search(match.group("postfix")) is None:
+                return False
+            self.samples.pop()
+
+        rate: Optional[float] = None
+        if match.group("rate") != "?":
+            value = float(match.group("rate"))
+            rate = value if match.group("unit") == "it/s" else (1.0 / value if value else None)
+        loss: Optional[float] = None
+        postfix = match.group("postfix")
+        if postfix:
+            loss_match = LOSS_PATTERN.search(postfix)
+            if loss_match:
+                loss = float(loss_match.group("loss"))
+
+        self._seq += 1
+        self.samples.append(
+            ProgressSample(
+                seq=self._seq,
+                timestamp=time.time(),
+                step=step,
+                total_steps=int(match.group("total")),
+                epoch=self._epoch,
+                total_epochs=self._total_epochs,
+                loss=loss,
+                it_per_sec=rate,
+                samples_per_sec=rate * self.batch_size if rate is not None else None,
+                elapsed_seconds=_seconds(match.group("elapsed")),
+                eta_seconds=_seconds(match.group("eta")),
+            )
+        )
+        return True
+
+    def since(self, seq: int) -> List[ProgressSample]:
+        with self._lock:
+            return [sample for sample in self.samples if sample.seq > seq]
+
+    def last_loss(self) -> Optional[float]:
+        with self._lock:
+            for sample in reversed(self.samples):
+                if sample.loss is not None:
+                    return sample.loss
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latest = self.samples[-1] if self.samples else None
+            return {
+                "job_id": self.job_id,
+                "finished": self.finished,
+                "batch_size": self.batch_size,
+                "latest": latest.to_dict() if latest else None,
+                "samples": len(self.samples),
+            }
+
+
+def batch_size_from_command(command: List[str]) -> int:
+    for argument in command:
+        if argument.startswith("--train_batch_size="):
+            try:
+                return max(1, int(argument.split("=", 1)[1]))
+            except ValueError:
+                break
+    return 1
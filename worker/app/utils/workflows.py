@@ -0,0 +1,129 @@
+"""
+Compiled ComfyUI workflow templates.
+
+A template is parsed once and the location of every ``{{placeholder}}`` is
+recorded. Rendering copies only the containers on the way to those slots and
+assigns the values directly, so the untouched parts of the graph are shared
+between renders and must be treated as read-only.
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Tuple, Union
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+PathKey = Union[str, int]
+# Alternating literal text and placeholder names: even indexes are literals.
+Segments = Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class _Slot:
+    path: Tuple[PathKey, ...]
+    segments: Segments
+
+    def render(self, values: Mapping[str, Any]) -> Any:
+        segments = self.segments
+        if len(segments) == 3 and not segments[0] and not segments[2]:
+            # The whole string is one placeholder: keep the value's type.
+            name = segments[1]
+            if name not in values:
+                return f"{{{{{name}}}}}"
+            value = values[name]
+            return "" if value is None else value
+
+        parts: List[str] = []
+        for index, segment in enumerate(segments):
+            if index % 2 == 0:
+                parts.append(segment)
+            elif segment in values:
+                value = values[segment]
+                parts.append("" if value is None else str(value))
+            else:
+                parts.append(f"{{{{{segment}}}}}")
+        return "".join(parts)
+
+
+def _collect_slots(data: Any, path: Tuple[PathKey, ...], slots: List[_Slot]) -> None:
+    if isinstance(data, dict):
+        for key, value in data.items():
+            _collect_slots(value, path + (key,), slots)
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            _collect_slots(value, path + (index,), slots)
+    elif isinstance(data, str) and "{{" in data:
+        segments = tuple(PLACEHOLDER_PATTERN.split(data))
+        if len(segments) > 1:
+            slots.append(_Slot(path=path, segments=segments))
+
+
+class WorkflowTemplate:
+    """A parsed workflow with precomputed placeholder slots."""
+
+    def __init__(self, workflow: Dict[str, Any], *, source: str = "<memory>") -> None:
+        self.source = source
+        self.workflow = workflow
+        slots: List[_Slot] = []
+        _collect_slots(workflow, (), slots)
+        self.slots: Tuple[_Slot, ...] = tuple(slots)
+        self.placeholders = frozenset(
+            name for slot in self.slots for name in slot.segments[1::2]
+        )
+
+    def render(self, values: Mapping[str, Any]) -> Dict[str, Any]:
+        root = dict(self.workflow)
+        copied: Dict[Tuple[PathKey, ...], Any] = {(): root}
+
+        for slot in self.slots:
+            parent = root
+            path = slot.path
+            for depth in range(len(path) - 1):
+                prefix = path[: depth + 1]
+                child = copied.get(prefix)
+                if child is None:
+                    original = parent[path[depth]]
+                    child = dict(original) if isinstance(original, dict) else list(original)
+                    parent[path[depth]] = child
+                    copied[prefix] = child
+                parent = child
+            parent[path[-1]] = slot.render(values)
+
+        return root
+
+
+_cache: Dict[str, Tuple[Tuple[int, int], WorkflowTemplate]] = {}
+_cache_lock = threading.Lock()
+
+
+def load_template(path: Union[str, Path]) -> WorkflowTemplate:
+    """Return the compiled template for ``path``, reparsing only on change.
+
+    Raises ``FileNotFoundError`` when the file is missing and
+    ``json.JSONDecodeError`` when it is not valid JSON.
+    """
+    template_path = Path(path)
+    key = str(template_path.resolve())
+    stat = os.stat(key)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with template_path.open("r", encoding="utf-8") as fp:
+        template = WorkflowTemplate(json.load(fp), source=key)
+
+    with _cache_lock:
+        _cache[key] = (signature, template)
+    return template
+
+
+def clear_template_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
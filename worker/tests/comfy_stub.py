@@ -0,0 +1,136 @@
+"""A minimal in-process ComfyUI for exercising the worker's client code."""
+
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from aiohttp import WSMsgType, web
+from aiohttp.test_utils import TestServer
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+class StubComfy:
+    """Serves the endpoints the worker uses and records what it was asked.
+
+    ``fail`` maps a path to a list of HTTP statuses returned (in order) before
+    the real handler answers. Prompts complete as soon as they are queued
+    unless ``hold`` is set, in which case they stay pending until
+    :meth:`complete` is called.
+    """
+
+    def __init__(self, *, hold: bool = False, queue_depth: int = 0) -> None:
+        self.hold = hold
+        self.queue_depth = queue_depth
+        self.fail: Dict[str, List[int]] = {}
+        self.requests: List[str] = []
+        self.prompts: Dict[str, Dict[str, Any]] = {}
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.sockets: Dict[str, web.WebSocketResponse] = {}
+        self._ids = itertools.count(1)
+        self.server: Optional[TestServer] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/system_stats", self.system_stats)
+        self.app.router.add_get("/queue", self.queue)
+        self.app.router.add_post("/api/prompt", self.prompt)
+        self.app.router.add_get("/api/history/{prompt_id}", self.prompt_history)
+        self.app.router.add_get("/view", self.view)
+        self.app.router.add_get("/ws", self.websocket)
+        self.app.middlewares.append(self._record)
+
+    @property
+    def url(self) -> str:
+        assert self.server is not None
+        return str(self.server.make_url("")).rstrip("/")
+
+    def count(self, path: str) -> int:
+        return sum(1 for p in self.requests if p == path)
+
+    @web.middleware
+    async def _record(self, request: web.Request, handler):
+        self.requests.append(request.path)
+        statuses = self.fail.get(request.path)
+        if statuses:
+            return web.Response(status=statuses.pop(0), text=f"stub failure on {request.path}")
+        return await handler(request)
+
+    async def system_stats(self, _request: web.Request) -> web.Response:
+        return web.json_response({"devices": [{"vram_free": 8 << 30}]})
+
+    async def queue(self, _request: web.Request) -> web.Response:
+        pending = [[i] for i in range(self.queue_depth)]
+        return web.json_response({"queue_running": [], "queue_pending": pending})
+
+    async def prompt(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        prompt_id = f"p{next(self._ids)}"
+        self.prompts[prompt_id] = body
+        if not self.hold:
+            await self.complete(prompt_id)
+        return web.json_response({"prompt_id": prompt_id})
+
+    async def complete(self, prompt_id: str, error: Optional[str] = None) -> None:
+        body = self.prompts[prompt_id]
+        if error is None:
+            images = [{"filename": f"{prompt_id}.png", "subfolder": "", "type": "output"}]
+            self.history[prompt_id] = {
+                "status": {"status_str": "success", "completed": True},
+                "outputs": {"9": {"images": images}},
+            }
+            message = {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}}
+        else:
+            self.history[prompt_id] = {"status": {"status_str": "error", "error": error}, "outputs": {}}
+            message = {"type": "execution_error", "data": {"prompt_id": prompt_id, "exception_message": error}}
+        ws = self.sockets.get(body.get("client_id"))
+        if ws is not None and not ws.closed:
+            await ws.send_json(message)
+
+    async def prompt_history(self, request: web.Request) -> web.Response:
+        prompt_id = request.match_info["prompt_id"]
+        entry = self.history.get(prompt_id)
+        return web.json_response({prompt_id: entry} if entry is not None else {})
+
+    async def view(self, request: web.Request) -> web.Response:
+        return web.Response(body=PNG + request.query["filename"].encode("utf-8"), content_type="image/png")
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        client_id = request.query.get("clientId", "")
+        self.sockets[client_id] = ws
+        async for msg in ws:
+            if msg.type == WSMsgType.ERROR:
+                break
+        self.sockets.pop(client_id, None)
+        return ws
+
+    async def start(self) -> "StubComfy":
+        self.server = TestServer(self.app)
+        await self.server.start_server()
+        return self
+
+    async def close(self) -> None:
+        for ws in list(self.sockets.values()):
+            await ws.close()
+        if self.server is not None:
+            await self.server.close()
+
+
+@asynccontextmanager
+async def stub_comfy(**kwargs: Any):
+    stub = await StubComfy(**kwargs).start()
+    try:
+        yield stub
+    finally:
+        await stub.close()
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("condition was not met in time")
+        await asyncio.sleep(0.01)
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+# The worker reads its storage locations when modules are imported, so point
+# them at a scratch directory before anything from ``app`` is loaded.
+_ROOT = tempfile.mkdtemp(prefix="studionova-worker-tests-")
+for _name, _path in (
+    ("JOB_STORE_PATH", "jobs.sqlite3"),
+    ("KOHYA_PATH", "kohya"),
+    ("KOHYA_OUTPUT_DIR", "lora"),
+    ("KOHYA_LATENT_CACHE_DIR", "latent_cache"),
+    ("OUTPUT_DIR", "results"),
+    ("DATASET_INDEX_PATH", "dataset_index.sqlite3"),
+):
+    os.environ.setdefault(_name, os.path.join(_ROOT, _path))
+os.makedirs(os.environ["KOHYA_PATH"], exist_ok=True)
+
+import pytest  # noqa: E402
+
+from app.utils.jobs import SQLiteJobStore, set_job_store  # noqa: E402
+
+
+@pytest.fixture
+def job_store():
+    store = SQLiteJobStore(":memory:")
+    set_job_store(store)
+    yield store
+    set_job_store(None)
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app.utils import comfy
+from app.utils.comfy import ComfyBackendPool, ComfyUnavailableError
+
+from .comfy_stub import PNG, stub_comfy
+
+AFFINITY = ("sdxl.safetensors", "hero.safetensors")
+
+
+@pytest.fixture
+def output_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(comfy, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(comfy, "COMFYUI_LINK_MODE", "off")
+    return tmp_path
+
+
+async def checked_pool(*stubs):
+    pool = ComfyBackendPool([stub.url for stub in stubs], use_websocket=False)
+    await pool.check_all()
+    return pool
+
+
+def test_least_loaded_healthy_backend_is_selected():
+    async def run():
+        async with stub_comfy(queue_depth=3) as busy, stub_comfy(queue_depth=1) as idle, stub_comfy() as gone:
+            url = gone.url
+            await gone.close()
+            pool = ComfyBackendPool([busy.url, idle.url, url], use_websocket=False)
+            try:
+                await pool.check_all()
+                selected = pool.select()
+                snapshot = pool.snapshot()
+            finally:
+                await pool.close()
+            return selected.url, idle.url, snapshot
+
+    selected, idle, snapshot = asyncio.run(run())
+    assert selected == idle
+    assert [b["queue_depth"] for b in snapshot[:2]] == [3, 1]
+    assert snapshot[2]["healthy"] is False and snapshot[2]["last_error"]
+
+
+def test_affinity_wins_within_the_slack(monkeypatch):
+    monkeypatch.setattr(comfy, "COMFYUI_AFFINITY_SLACK", 2)
+
+    async def run():
+        async with stub_comfy(queue_depth=2) as warm, stub_comfy() as cold:
+            pool = await checked_pool(warm, cold)
+            try:
+                warm_backend, cold_backend = pool.backends
+                warm_backend.remember(AFFINITY)
+                within = pool.select(AFFINITY)
+                other_model = pool.select(("other.safetensors", ""))
+                warm.queue_depth = 3
+                await pool.check_all()
+                beyond = pool.select(AFFINITY)
+            finally:
+                await pool.close()
+            return [b is warm_backend for b in (within, other_model, beyond)]
+
+    assert asyncio.run(run()) == [True, False, False]
+
+
+def test_leases_count_towards_load_and_record_residency():
+    async def run():
+        async with stub_comfy() as a, stub_comfy() as b:
+            pool = await checked_pool(a, b)
+            try:
+                first = pool.select(AFFINITY)
+                async with pool.lease(first, AFFINITY):
+                    assert first.load == 1
+                    # The busy backend is skipped while it works on our prompt.
+                    assert pool.select() is not first
+                assert first.load == 0
+                assert AFFINITY in first.resident
+            finally:
+                await pool.close()
+
+    asyncio.run(run())
+
+
+def test_prompts_fail_over_to_another_backend(monkeypatch, output_dir):
+    async def run():
+        async with stub_comfy() as broken, stub_comfy(queue_depth=1) as healthy:
+            broken.fail["/api/prompt"] = [503]
+            pool = ComfyBackendPool([broken.url, healthy.url], use_websocket=False)
+            monkeypatch.setattr(comfy, "_pool", pool)
+            try:
+                prompt_id, _history, paths = await comfy._run_prompt({"1": {}}, affinity=AFFINITY)
+                backends = {b.url: b for b in pool.backends}
+            finally:
+                await pool.close()
+            return prompt_id, paths, backends[broken.url], backends[healthy.url], broken, healthy
+
+    prompt_id, paths, broken_backend, healthy_backend, broken, healthy = asyncio.run(run())
+    assert broken.count("/api/prompt") == 1 and broken.prompts == {}
+    assert list(healthy.prompts) == [prompt_id]
+    assert paths[0].read_bytes() == PNG + f"{prompt_id}.png".encode()
+    assert broken_backend.healthy is False
+    assert AFFINITY in healthy_backend.resident and AFFINITY not in broken_backend.resident
+
+
+def test_failover_gives_up_once_every_backend_failed(monkeypatch, output_dir):
+    async def run():
+        async with stub_comfy() as a, stub_comfy() as b:
+            a.fail["/api/prompt"] = [503]
+            b.fail["/api/prompt"] = [503]
+            pool = ComfyBackendPool([a.url, b.url], use_websocket=False)
+            monkeypatch.setattr(comfy, "_pool", pool)
+            try:
+                with pytest.raises(ComfyUnavailableError):
+                    await comfy._run_prompt({"1": {}})
+            finally:
+                await pool.close()
+            return a.count("/api/prompt") + b.count("/api/prompt")
+
+    assert asyncio.run(run()) == 2
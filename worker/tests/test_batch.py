@@ -0,0 +1,80 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from app.utils import comfy
+from app.utils.comfy import ComfyUIError
+
+WORKFLOWS = Path(__file__).resolve().parent.parent / "workflows"
+
+
+@pytest.fixture
+def submissions(monkeypatch):
+    """Workflows passed to _run_prompt; each returns one image per latent in its batch."""
+    calls = []
+
+    async def fake_run_prompt(workflow, *, affinity=None, cacheable=False, lane=None):
+        calls.append((workflow, cacheable))
+        batch = next((n["inputs"]["batch_size"] for n in workflow.values() if "batch_size" in n["inputs"]), 1)
+        return f"p{len(calls)}", {}, [Path(f"p{len(calls)}_{i}.png") for i in range(batch)]
+
+    monkeypatch.setattr(comfy, "_run_prompt", fake_run_prompt)
+    return calls
+
+
+def use_template(monkeypatch, tmp_path, batch_placeholder=True):
+    workflow = json.loads((WORKFLOWS / "generation.json").read_text())
+    if not batch_placeholder:
+        for node in workflow.values():
+            node["inputs"].pop("batch_size", None)
+    path = tmp_path / "generation.json"
+    path.write_text(json.dumps(workflow))
+    monkeypatch.setattr(comfy, "GENERATION_WORKFLOW_PATH", str(path))
+
+
+def sampler_seed(workflow):
+    return next(n["inputs"]["seed"] for n in workflow.values() if "seed" in n["inputs"])
+
+
+def test_seed_range_is_one_latent_batch_per_prompt(monkeypatch, tmp_path, submissions):
+    use_template(monkeypatch, tmp_path)
+    result = asyncio.run(comfy.generate_image_batch(["a cat", "a dog"], seed_start=10, count=3))
+
+    assert len(submissions) == 2
+    assert all(cacheable for _, cacheable in submissions)
+    assert [sampler_seed(workflow) for workflow, _ in submissions] == [10, 10]
+    assert result.prompt_ids == ["p1", "p2"]
+    assert [(item["prompt"], item["batch_index"]) for item in result.items] == [
+        ("a cat", 0), ("a cat", 1), ("a cat", 2), ("a dog", 0), ("a dog", 1), ("a dog", 2),
+    ]
+
+
+def test_templates_without_batch_size_get_one_submission_per_seed(monkeypatch, tmp_path, submissions):
+    use_template(monkeypatch, tmp_path, batch_placeholder=False)
+    result = asyncio.run(comfy.generate_image_batch(["a cat"], seed_start=5, count=3))
+
+    assert sorted(sampler_seed(workflow) for workflow, _ in submissions) == [5, 6, 7]
+    assert [item["seed"] for item in result.items] == [5, 6, 7]
+
+
+def test_explicit_seeds_fan_out_over_every_prompt(monkeypatch, tmp_path, submissions):
+    use_template(monkeypatch, tmp_path)
+    result = asyncio.run(comfy.generate_image_batch(["a", "b"], seeds=[1, 2]))
+
+    assert len(submissions) == 4
+    assert [(item["prompt"], item["seed"]) for item in result.items] == [("a", 1), ("a", 2), ("b", 1), ("b", 2)]
+    assert len(result.to_dict()["image_paths"]) == 4
+
+
+def test_clock_seeds_are_not_cached(monkeypatch, tmp_path, submissions):
+    use_template(monkeypatch, tmp_path)
+    asyncio.run(comfy.generate_image_batch(["a"], count=2))
+    assert [cacheable for _, cacheable in submissions] == [False]
+
+
+def test_empty_batches_are_rejected(monkeypatch, tmp_path, submissions):
+    use_template(monkeypatch, tmp_path)
+    with pytest.raises(ComfyUIError):
+        asyncio.run(comfy.generate_image_batch([]))
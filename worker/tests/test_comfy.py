@@ -0,0 +1,177 @@
+import asyncio
+import socket
+
+import pytest
+
+from app.utils import comfy
+from app.utils.comfy import ComfyBackendPool, ComfyClient, ComfyUIError, ComfyUnavailableError
+
+from .comfy_stub import stub_comfy, wait_until
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Delays the client backed off for, without actually waiting."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args, **kwargs):
+        if delay > 0:
+            delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    return delays
+
+
+def unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_gateway_errors_are_retried_with_backoff(sleeps):
+    async def run():
+        async with stub_comfy() as stub:
+            stub.fail["/queue"] = [503, 502]
+            client = ComfyClient(stub.url, max_retries=3, backoff=0.5)
+            try:
+                queue = await client.get_json("/queue", context="read queue")
+            finally:
+                await client.close()
+            return stub.count("/queue"), queue
+
+    calls, queue = asyncio.run(run())
+    assert calls == 3
+    assert queue == {"queue_running": [], "queue_pending": []}
+    assert sleeps == [0.5, 1.0]
+
+
+def test_retries_are_bounded(sleeps):
+    async def run():
+        async with stub_comfy() as stub:
+            stub.fail["/queue"] = [503] * 5
+            client = ComfyClient(stub.url, max_retries=2, backoff=0.1)
+            try:
+                with pytest.raises(ComfyUnavailableError, match="stub failure"):
+                    await client.get_json("/queue", context="read queue")
+            finally:
+                await client.close()
+            return stub.count("/queue")
+
+    assert asyncio.run(run()) == 3
+    assert sleeps == [0.1, 0.2]
+
+
+def test_prompts_are_never_resubmitted_after_a_gateway_error(sleeps):
+    async def run():
+        async with stub_comfy() as stub:
+            stub.fail["/api/prompt"] = [503]
+            client = ComfyClient(stub.url, backoff=0.1)
+            try:
+                with pytest.raises(ComfyUnavailableError):
+                    await client.post_json("/api/prompt", {"prompt": {}}, context="submit workflow")
+            finally:
+                await client.close()
+            return stub.count("/api/prompt"), stub.prompts
+
+    assert asyncio.run(run()) == (1, {})
+    assert sleeps == []
+
+
+def test_client_errors_are_not_retried(sleeps):
+    async def run():
+        async with stub_comfy() as stub:
+            stub.fail["/queue"] = [400]
+            client = ComfyClient(stub.url)
+            try:
+                with pytest.raises(ComfyUIError) as raised:
+                    await client.get_json("/queue", context="read queue")
+            finally:
+                await client.close()
+            return raised.value, stub.count("/queue")
+
+    error, calls = asyncio.run(run())
+    assert not isinstance(error, ComfyUnavailableError)
+    assert calls == 1
+
+
+def test_refused_connections_are_retried_even_for_prompts(sleeps):
+    async def run():
+        client = ComfyClient(unused_url(), max_retries=2, backoff=0.1)
+        try:
+            with pytest.raises(ComfyUnavailableError, match="submit workflow"):
+                await client.post_json("/api/prompt", {"prompt": {}}, context="submit workflow")
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert sleeps == [0.1, 0.2]
+
+
+def test_requests_share_one_session():
+    async def run():
+        async with stub_comfy() as stub:
+            client = ComfyClient(stub.url, max_connections=4)
+            try:
+                session = client._get_session()
+                await asyncio.gather(*(client.get_json("/queue", context="read queue") for _ in range(10)))
+                assert client._get_session() is session
+                assert session.connector.limit == 4
+            finally:
+                await client.close()
+            return stub.count("/queue")
+
+    assert asyncio.run(run()) == 10
+
+
+def test_completion_arrives_over_the_websocket(monkeypatch):
+    # Polling would take far longer than the test runs.
+    monkeypatch.setattr(comfy, "COMFYUI_POLL_INTERVAL", 60)
+
+    async def run():
+        async with stub_comfy(hold=True) as stub:
+            pool = ComfyBackendPool([stub.url], use_websocket=True)
+            await pool.start()
+            backend = pool.backends[0]
+            try:
+                await wait_until(lambda: backend.monitor.connected and stub.sockets)
+                prompt_id = await comfy._submit_workflow({"1": {}}, backend)
+                assert stub.prompts[prompt_id]["client_id"] == backend.monitor.client_id
+                waiter = asyncio.create_task(comfy._wait_for_history(prompt_id, backend))
+                await asyncio.sleep(0.05)
+                assert not waiter.done()
+                await stub.complete(prompt_id)
+                history = await asyncio.wait_for(waiter, 5)
+
+                failed = await comfy._submit_workflow({"1": {}}, backend)
+                await stub.complete(failed, error="CUDA out of memory")
+                with pytest.raises(ComfyUIError, match="CUDA out of memory"):
+                    await asyncio.wait_for(comfy._wait_for_history(failed, backend), 5)
+            finally:
+                await pool.close()
+            return history, stub.count(f"/api/history/{prompt_id}")
+
+    history, polls = asyncio.run(run())
+    assert history["outputs"]["9"]["images"][0]["filename"] == "p1.png"
+    # One fetch after the completion event; none while waiting.
+    assert polls == 1
+
+
+def test_history_is_polled_without_a_websocket(monkeypatch):
+    monkeypatch.setattr(comfy, "COMFYUI_POLL_INTERVAL", 0.01)
+
+    async def run():
+        async with stub_comfy(hold=True) as stub:
+            pool = ComfyBackendPool([stub.url], use_websocket=False)
+            backend = pool.backends[0]
+            try:
+                prompt_id = await comfy._submit_workflow({"1": {}}, backend)
+                waiter = asyncio.create_task(comfy._wait_for_history(prompt_id, backend))
+                await wait_until(lambda: stub.count(f"/api/history/{prompt_id}") >= 3)
+                await stub.complete(prompt_id)
+                await asyncio.wait_for(waiter, 5)
+            finally:
+                await pool.close()
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from app.utils.dataset_index import DatasetIndex, read_image_size
+
+
+def image(path: Path, size=(64, 32), fmt=None):
+    Image.new("RGB", size, (120, 80, 40)).save(path, format=fmt)
+    return path
+
+
+def bump(folder: Path):
+    # Move the directory mtime on even on filesystems with coarse timestamps.
+    stat = folder.stat()
+    os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    folder = tmp_path / "dataset"
+    folder.mkdir()
+    image(folder / "a.png")
+    image(folder / "b.jpg", (32, 32))
+    (folder / "a.txt").write_text("a caption")
+    return folder
+
+
+@pytest.mark.parametrize("fmt,suffix", [("PNG", "png"), ("JPEG", "jpg"), ("GIF", "gif"), ("BMP", "bmp"), ("WEBP", "webp")])
+def test_image_sizes_come_from_headers(tmp_path, fmt, suffix):
+    assert read_image_size(image(tmp_path / f"x.{suffix}", (300, 200), fmt)) == (300, 200)
+
+
+def test_summary_counts_images_captions_and_resolutions(dataset):
+    summary = DatasetIndex(":memory:").summary(dataset)
+    assert summary["count"] == 3
+    assert summary["images"] == 2
+    assert summary["captioned"] == 1
+    assert summary["resolutions"] == {"64x32": 1, "32x32": 1}
+    assert summary["bytes"] == sum(p.stat().st_size for p in dataset.iterdir())
+
+
+def test_unchanged_folders_are_not_rescanned(dataset):
+    index = DatasetIndex(":memory:")
+    first = index.summary(dataset)
+    with patch.object(index, "_rescan", wraps=index._rescan) as rescan:
+        assert index.summary(dataset) == first
+        assert rescan.call_count == 0
+
+        (dataset / "c.png").write_bytes(b"not really an image")
+        bump(dataset)
+        with patch("app.utils.dataset_index.read_image_size", wraps=read_image_size) as read:
+            assert index.summary(dataset)["count"] == 4
+            # Files whose size and mtime are unchanged keep their recorded dimensions.
+            assert [call.args[0].name for call in read.call_args_list] == ["c.png"]
+        assert rescan.call_count == 1
+
+
+def test_uploads_update_the_summary_in_place(dataset):
+    index = DatasetIndex(":memory:")
+    index.summary(dataset)
+    with patch.object(index, "_rescan") as rescan:
+        token = index.mtime_token(dataset)
+        image(dataset / "c.png", (16, 16))
+        index.note_added(dataset, dataset / "c.png", token)
+        token = index.mtime_token(dataset)
+        (dataset / "c.txt").write_text("caption")
+        summary = index.note_added(dataset, dataset / "c.txt", token)
+        assert rescan.call_count == 0
+
+    assert summary == DatasetIndex(":memory:").summary(dataset)
+    assert summary["captioned"] == 2
+
+
+def test_outside_changes_force_a_rescan_on_upload(dataset):
+    index = DatasetIndex(":memory:")
+    index.summary(dataset)
+    (dataset / "a.txt").unlink()
+    bump(dataset)
+    token = index.mtime_token(dataset)
+    image(dataset / "d.png")
+
+    summary = index.note_added(dataset, dataset / "d.png", token)
+    assert summary == DatasetIndex(":memory:").summary(dataset)
+    assert summary["captioned"] == 0
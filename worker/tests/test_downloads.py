@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from app.utils import comfy
+from app.utils.comfy import ComfyBackendPool, ComfyUIError
+from app.utils.storage import link_file, resolve_inside
+
+from .comfy_stub import PNG, stub_comfy
+
+
+@pytest.fixture
+def output_dir(monkeypatch, tmp_path):
+    output = tmp_path / "results"
+    monkeypatch.setattr(comfy, "OUTPUT_DIR", output)
+    monkeypatch.setattr(comfy, "COMFYUI_LINK_MODE", "off")
+    return output
+
+
+def download(*images):
+    async def run():
+        async with stub_comfy() as stub:
+            pool = ComfyBackendPool([stub.url], use_websocket=False)
+            try:
+                return [await comfy._download_image(image, pool.backends[0]) for image in images]
+            finally:
+                await pool.close()
+
+    return asyncio.run(run())
+
+
+def test_downloads_are_content_addressed(output_dir):
+    first, again, other = download({"filename": "a.png"}, {"filename": "a.png"}, {"filename": "b.PNG"})
+
+    body = PNG + b"a.png"
+    assert first.read_bytes() == body
+    assert first.name == hashlib.sha256(body).hexdigest()[:32] + ".png"
+    assert again == first
+    assert other.suffix == ".png" and other != first
+    # No partial files are left behind.
+    assert sorted(p.name for p in output_dir.iterdir()) == sorted([first.name, other.name])
+
+
+def test_missing_filenames_are_rejected(output_dir):
+    with pytest.raises(ComfyUIError, match="missing filename"):
+        download({"subfolder": ""})
+
+
+def test_local_outputs_are_linked_instead_of_downloaded(monkeypatch, output_dir, tmp_path):
+    comfy_dir = tmp_path / "comfy"
+    (comfy_dir / "output" / "sub").mkdir(parents=True)
+    source = comfy_dir / "output" / "sub" / "local.png"
+    source.write_bytes(b"rendered")
+    monkeypatch.setattr(comfy, "COMFYUI_LOCAL_DIR", str(comfy_dir))
+    monkeypatch.setattr(comfy, "COMFYUI_LINK_MODE", "hardlink")
+
+    linked, again, escaped = download(
+        {"filename": "local.png", "subfolder": "sub", "type": "output"},
+        {"filename": "local.png", "subfolder": "sub", "type": "output"},
+        {"filename": "passwd", "subfolder": "../../../etc", "type": "output"},
+    )
+    assert os.path.samefile(linked, source)
+    # Linked images are named by content, so linking twice keeps one file.
+    assert linked.name == hashlib.sha256(b"rendered").hexdigest()[:32] + ".png"
+    assert again == linked
+    assert sorted(p.name for p in output_dir.iterdir()) == sorted([linked.name, escaped.name])
+    # Paths outside the ComfyUI folder fall back to a download.
+    assert escaped.read_bytes() == PNG + b"passwd"
+
+
+def test_link_file_modes(tmp_path):
+    source = tmp_path / "source.png"
+    source.write_bytes(b"x")
+    assert link_file(source, tmp_path / "off.png", "off") is False
+    assert link_file(source, tmp_path / "hard.png", "hardlink") is True
+    assert os.path.samefile(tmp_path / "hard.png", source)
+    assert link_file(tmp_path / "missing.png", tmp_path / "none.png", "auto") is False
+
+
+def test_resolve_inside_rejects_escapes(tmp_path):
+    assert resolve_inside(tmp_path, "a", "b.png") == (tmp_path / "a" / "b.png").resolve()
+    assert resolve_inside(tmp_path, "..", "b.png") is None
+    assert resolve_inside(tmp_path, "/etc/passwd") is None
@@ -0,0 +1,154 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.utils import ingest
+from app.utils.ingest import IngestError, IngestOptions, iter_archive
+
+
+def png(color=(255, 0, 0), size=(8, 8)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (0, 0, 255)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def zip_of(files) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch, job_store):
+    monkeypatch.setenv("DATASET_ROOT", str(tmp_path))
+    with TestClient(app) as client:
+        yield client
+
+
+def test_iter_archive_reads_zip_and_tar():
+    assert list(iter_archive("a.zip", zip_of([("x/a.png", b"1"), ("b.txt", b"2")]))) == [
+        ("x/a.png", b"1"),
+        ("b.txt", b"2"),
+    ]
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        info = tarfile.TarInfo("a.png")
+        info.size = 3
+        archive.addfile(info, io.BytesIO(b"abc"))
+    buffer.seek(0)
+    assert list(iter_archive("a.tar.gz", buffer)) == [("a.png", b"abc")]
+
+
+def test_iter_archive_enforces_limits():
+    many = zip_of([(f"{i}.png", b"x") for i in range(5)])
+    with pytest.raises(IngestError, match="more than 4 files"):
+        list(iter_archive("a.zip", many, max_members=4))
+
+    large = zip_of([("a.png", b"x" * 60), ("b.png", b"x" * 60)])
+    with pytest.raises(IngestError, match="expands to more than 100 bytes"):
+        list(iter_archive("a.zip", large, max_bytes=100))
+
+
+def test_iter_archive_rejects_bombs(monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MAX_FILE_BYTES", 1024)
+    # Compresses to about a kilobyte; the declared size is not trusted.
+    bomb = zip_of([("bomb.png", b"\0" * (1024**2))])
+    with pytest.raises(IngestError, match="larger than"):
+        list(iter_archive("bomb.zip", bomb))
+
+
+def test_decompression_bombs_fail_per_image(tmp_path, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100)
+    result = ingest._process_image(png(size=(64, 64)), "big.png", str(tmp_path), "stem", IngestOptions())
+    assert result["status"] == "failed"
+    assert "too large" in result["error"]
+    assert not list(tmp_path.iterdir())
+
+
+def test_images_are_stored_as_uploaded_by_default(tmp_path):
+    data = jpeg()
+    result = ingest._process_image(data, "a.jpg", str(tmp_path), "stem", IngestOptions())
+    assert result["status"] == "saved"
+    assert (tmp_path / result["file_name"]).read_bytes() == data
+
+
+@pytest.mark.parametrize("source_format", ["BMP", "GIF"])
+def test_other_formats_are_converted_to_png(tmp_path, source_format):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (0, 255, 0)).save(buffer, format=source_format)
+    result = ingest._process_image(buffer.getvalue(), "a.img", str(tmp_path), "stem", IngestOptions())
+    assert result["file_name"] == "stem.png"
+    assert (tmp_path / "stem.png").read_bytes().startswith(b"\x89PNG")
+
+
+def test_failed_writes_leave_no_partial_files(tmp_path, monkeypatch):
+    data = png()
+
+    def fail(self, fp, *args, **kwargs):
+        fp.write_text("partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Image.Image, "save", fail)
+    result = ingest._process_image(data, "a.png", str(tmp_path), "stem", IngestOptions(max_side=4))
+    assert result["status"] == "failed"
+    assert "disk full" in result["error"]
+    assert not list(tmp_path.iterdir())
+
+
+def test_bulk_upload_of_archive(client, tmp_path):
+    archive = zip_of([("a.png", png()), ("a.txt", b"a red square"), ("notes.md", b"?"), ("bad.png", b"nope")])
+    response = client.post(
+        "/api/models/m1/dataset/bulk",
+        files=[("files", ("set.zip", archive.getvalue(), "application/zip"))],
+        data={"dataset_path": str(tmp_path / "set")},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["saved"], body["failed"], body["images"], body["captioned"]) == (2, 1, 1, 1)
+    statuses = {result["source"]: result["status"] for result in body["results"]}
+    assert statuses == {
+        "set.zip/a.png": "saved",
+        "set.zip/a.txt": "saved",
+        "set.zip/notes.md": "skipped",
+        "set.zip/bad.png": "failed",
+    }
+
+
+def test_bulk_upload_keeps_images_with_the_same_name(client, tmp_path):
+    response = client.post(
+        "/api/models/m1/dataset/bulk",
+        files=[("files", ("a.png", png(), "image/png")), ("files", ("a.jpg", jpeg(), "image/jpeg"))],
+        data={"dataset_path": str(tmp_path / "set"), "output_format": "png"},
+    )
+    body = response.json()
+    names = [result["file_name"] for result in body["results"]]
+    assert body["saved"] == 2 and len(set(names)) == 2
+    assert sum("warning" in result for result in body["results"]) == 1
+    assert sorted(p.name for p in (tmp_path / "set").iterdir()) == sorted(names)
+
+
+def test_bulk_upload_reports_oversized_archives(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "INGEST_MAX_FILE_BYTES", 1024)
+    archive = zip_of([("a.png", png()), ("bomb.png", b"\0" * (1024**2))])
+    response = client.post(
+        "/api/models/m1/dataset/bulk",
+        files=[("files", ("set.zip", archive.getvalue(), "application/zip"))],
+        data={"dataset_path": str(tmp_path / "set")},
+    )
+    body = response.json()
+    assert body["saved"] == 1
+    assert body["results"][0] == {"source": "set.zip", "status": "failed", "error": "bomb.png is larger than 1024 bytes."}
@@ -0,0 +1,79 @@
+import asyncio
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from app.schemas import JobKind, JobStatus
+from app.utils import jobs
+from app.utils.jobs import JobRecord, JobStore, SQLiteJobStore, current_owner, submit_job
+
+
+def dead_owner():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{jobs.BOOT_ID}:{process.pid}:{jobs._process_start(process.pid) or 1}"
+
+
+def test_only_jobs_of_gone_owners_are_failed():
+    store = SQLiteJobStore(":memory:")
+    store.create(JobRecord(id="mine", kind="generation", status=JobStatus.RUNNING.value))
+    store.create(JobRecord(id="dead", kind="generation", status=JobStatus.RUNNING.value, owner=dead_owner()))
+    store.create(JobRecord(id="rebooted", kind="generation", status=JobStatus.QUEUED.value, owner="other-boot:1:1"))
+    store.create(JobRecord(id="legacy", kind="generation", status=JobStatus.QUEUED.value, owner=None))
+    store.create(JobRecord(id="done", kind="generation", status=JobStatus.COMPLETED.value, owner=dead_owner()))
+
+    assert store.fail_interrupted("gone") == 3
+    assert store.get("mine").status == JobStatus.RUNNING.value
+    assert store.get("done").status == JobStatus.COMPLETED.value
+    for job_id in ("dead", "rebooted", "legacy"):
+        record = store.get(job_id)
+        assert (record.status, record.error) == (JobStatus.FAILED.value, "gone")
+
+
+def test_owner_column_is_added_to_existing_databases(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, model_id TEXT,"
+        " payload TEXT NOT NULL, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO jobs VALUES ('old', 'upscale', 'running', NULL, '{}', NULL, NULL, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    store = SQLiteJobStore(path)
+    assert store.get("old").owner is None
+    assert store.fail_interrupted("restarted") == 1
+    assert store.create(JobRecord(id="new", kind="upscale", status="queued")).owner == current_owner()
+    assert store.get("new").owner == current_owner()
+
+
+def test_submitted_jobs_record_their_outcome(job_store):
+    async def succeed(record):
+        return {"id": record.id}
+
+    async def fail(_record):
+        raise RuntimeError("boom")
+
+    async def run():
+        ok = await submit_job(JobKind.GENERATION, succeed, model_id="m")
+        bad = await submit_job(JobKind.UPSCALE, fail)
+        assert ok.status == JobStatus.QUEUED.value
+        await asyncio.gather(*list(jobs._tasks))
+        return ok, bad
+
+    ok, bad = asyncio.run(run())
+    assert job_store.get(ok.id).status == JobStatus.COMPLETED.value
+    assert job_store.get(ok.id).result == {"id": ok.id}
+    assert (job_store.get(bad.id).status, job_store.get(bad.id).error) == (JobStatus.FAILED.value, "boom")
+
+
+def test_partial_job_stores_are_rejected_up_front():
+    class GetOnly(JobStore):
+        def get(self, job_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
@@ -0,0 +1,175 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from app.schemas import JobKind, JobStatus
+from app.utils.jobs import create_job
+from app.utils.kohya import KohyaError, KohyaJob, TrainingScheduler
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="trainers are signalled through process groups")
+
+# Ignores SIGTERM and leaves a child behind in its process group.
+STUBBORN = (
+    "import signal, subprocess, sys, time;"
+    "signal.signal(signal.SIGTERM, signal.SIG_IGN);"
+    "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']);"
+    "print(child.pid, flush=True);"
+    "time.sleep(60)"
+)
+
+
+def make_job(tmp_path: Path, name: str, code: str = "import time; time.sleep(60)", priority: int = 0) -> KohyaJob:
+    create_job(JobKind.TRAINING, job_id=name, model_id=name, status=JobStatus.QUEUED)
+    return KohyaJob(
+        job_id=name,
+        command=[sys.executable, "-c", code],
+        log_path=tmp_path / f"{name}.log",
+        output_dir=tmp_path,
+        output_weight=tmp_path / f"{name}.safetensors",
+        model_id=name,
+        priority=priority,
+    )
+
+
+def wait_for(predicate, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A zombie still answers kill(pid, 0); it has exited all the same.
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+def test_shutdown_stops_trainers_and_their_children(tmp_path, job_store):
+    scheduler = TrainingScheduler(slots=1)
+    running = scheduler.submit(make_job(tmp_path, "running", STUBBORN))
+    queued = scheduler.submit(make_job(tmp_path, "queued"))
+    wait_for(lambda: running.log_path.read_text().strip())
+    child = int(running.log_path.read_text().split()[0])
+
+    scheduler.shutdown(grace=0.2)
+
+    assert running.process.poll() is not None
+    wait_for(lambda: not alive(child))
+    assert queued.status == "cancelled" and queued.process is None
+    assert job_store.get("running").status == "cancelled"
+    assert job_store.get("queued").status == "cancelled"
+    with pytest.raises(KohyaError):
+        scheduler.submit(make_job(tmp_path, "late"))
+
+
+PRINT_DEVICE = "import os, time; print(os.environ.get('CUDA_VISIBLE_DEVICES'), flush=True); time.sleep(0.3)"
+
+
+@pytest.fixture
+def scheduler_factory():
+    schedulers = []
+
+    def factory(**kwargs) -> TrainingScheduler:
+        schedulers.append(TrainingScheduler(**kwargs))
+        return schedulers[-1]
+
+    yield factory
+    for scheduler in schedulers:
+        scheduler.shutdown(grace=0.2)
+
+
+def test_jobs_are_pinned_to_free_devices(tmp_path, job_store, scheduler_factory):
+    scheduler = scheduler_factory(devices=["0", "1"])
+    jobs = [scheduler.submit(make_job(tmp_path, f"job{i}", PRINT_DEVICE)) for i in range(3)]
+
+    assert [job.status for job in jobs] == ["running", "running", "queued"]
+    assert {jobs[0].device, jobs[1].device} == {"0", "1"}
+    assert scheduler.queue_position("job2") == 1
+    assert scheduler.snapshot()["free_slots"] == 0
+
+    wait_for(lambda: all(job.status == "completed" for job in jobs))
+    assert [job.log_path.read_text().strip() for job in jobs] == [job.device for job in jobs]
+    assert scheduler.snapshot()["free_slots"] == 2
+    assert job_store.get("job2").status == JobStatus.COMPLETED.value
+
+
+def test_higher_priority_jobs_start_first(tmp_path, job_store, scheduler_factory):
+    scheduler = scheduler_factory(slots=1)
+    scheduler.submit(make_job(tmp_path, "first", PRINT_DEVICE))
+    low = scheduler.submit(make_job(tmp_path, "low", PRINT_DEVICE))
+    also_low = scheduler.submit(make_job(tmp_path, "also_low", PRINT_DEVICE))
+    high = scheduler.submit(make_job(tmp_path, "high", PRINT_DEVICE, priority=5))
+    assert [entry["job_id"] for entry in scheduler.snapshot()["queued"]] == ["high", "low", "also_low"]
+
+    wait_for(lambda: also_low.status == "completed")
+    assert high.started_at < low.started_at < also_low.started_at
+
+
+def test_blocked_jobs_wait_for_their_blocker(tmp_path, job_store, scheduler_factory):
+    scheduler = scheduler_factory(slots=2)
+    blocker = scheduler.submit(make_job(tmp_path, "blocker", PRINT_DEVICE))
+    blocked = make_job(tmp_path, "blocked", PRINT_DEVICE)
+    blocked.blocked_by = "blocker"
+    scheduler.submit(blocked)
+    free = scheduler.submit(make_job(tmp_path, "free", PRINT_DEVICE))
+
+    # The blocked job leaves its slot to the one queued behind it.
+    assert (blocked.status, free.status) == ("queued", "running")
+    wait_for(lambda: blocked.status == "completed")
+    assert blocked.started_at >= blocker.finished_at
+
+
+def test_cancel_queued_and_running_jobs(tmp_path, job_store, scheduler_factory, monkeypatch):
+    monkeypatch.setattr("app.utils.kohya.KOHYA_CANCEL_GRACE", 0.2)
+    scheduler = scheduler_factory(slots=1)
+    running = scheduler.submit(make_job(tmp_path, "running"))
+    queued = scheduler.submit(make_job(tmp_path, "queued"))
+
+    scheduler.cancel("queued")
+    assert queued.status == "cancelled"
+    assert scheduler.queue_position("queued") is None
+
+    scheduler.cancel("running")
+    wait_for(lambda: running.status == "cancelled")
+    assert running.process.poll() is not None
+    assert job_store.get("running").error == "Cancelled while running."
+    with pytest.raises(KohyaError):
+        scheduler.cancel("unknown")
+
+
+def test_launch_failures_free_the_slot(tmp_path, job_store, scheduler_factory):
+    scheduler = scheduler_factory(slots=1)
+    broken = make_job(tmp_path, "broken")
+    broken.command = [str(tmp_path / "no-such-python")]
+    with pytest.raises(KohyaError):
+        scheduler.submit(broken)
+
+    assert broken.status == "failed"
+    assert job_store.get("broken").status == JobStatus.FAILED.value
+    assert scheduler.submit(make_job(tmp_path, "next", PRINT_DEVICE)).status == "running"
+
+
+def test_watcher_errors_fail_the_job_and_free_the_slot(tmp_path, job_store, scheduler_factory, monkeypatch):
+    monkeypatch.setattr("app.utils.kohya.TRAINING_TELEMETRY_INTERVAL", 0.05)
+
+    def broken_release(job, harvest):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("app.utils.kohya._release_staging", broken_release)
+    monkeypatch.setattr("app.utils.kohya.TrainingTelemetry.poll", lambda self: 1 / 0)
+    scheduler = scheduler_factory(slots=1)
+    job = scheduler.submit(make_job(tmp_path, "job", "import time; time.sleep(0.3)"))
+
+    wait_for(lambda: job.status == "failed")
+    assert "disk full" in job_store.get("job").error
+    assert scheduler.snapshot()["free_slots"] == 1
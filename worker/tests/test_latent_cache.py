@@ -0,0 +1,90 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.utils.latent_cache import LatentCache, latent_settings, model_fingerprint
+
+SETTINGS = latent_settings(["train_network.py", "--resolution=1024,1024", "--enable_bucket"])
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    folder = tmp_path / "dataset" / "10_subject"
+    folder.mkdir(parents=True)
+    for name in ("a", "a_b", "c"):
+        (folder / f"{name}.png").write_bytes(f"image {name}".encode())
+        (folder / f"{name}.txt").write_text(f"caption {name}")
+    return tmp_path / "dataset"
+
+
+def train(staging):
+    """Stand-in for kohya: write a latent next to every image that has none."""
+    for stem in staging.images:
+        npz = Path(f"{stem}_1024x1024.npz")
+        if not npz.exists():
+            npz.write_bytes(b"latent for " + stem.name.encode())
+
+
+def test_latents_are_reused_across_runs(tmp_path, dataset):
+    cache = LatentCache(str(tmp_path / "cache"))
+    first = cache.stage(dataset, "run1", "model", SETTINGS)
+    assert (first.hits, first.misses) == (0, 3)
+    assert (first.directory / "10_subject" / "a.txt").read_text() == "caption a"
+    train(first)
+    assert cache.harvest(first) == 3
+    cache.cleanup(first)
+    assert not first.directory.exists()
+
+    (dataset / "10_subject" / "c.png").write_bytes(b"retouched")
+    second = cache.stage(dataset, "run2", "model", SETTINGS)
+    assert (second.hits, second.misses) == (2, 1)
+    # "a_b" keeps its own latent rather than the one of "a".
+    assert (second.directory / "10_subject" / "a_b_1024x1024.npz").read_bytes() == b"latent for a_b"
+    assert not (second.directory / "10_subject" / "c_1024x1024.npz").exists()
+
+    other_model = cache.stage(dataset, "run3", "other-model", SETTINGS)
+    assert other_model.hits == 0
+
+
+def test_image_hashes_are_remembered(tmp_path, dataset):
+    cache = LatentCache(str(tmp_path / "cache"))
+    cache.stage(dataset, "run1", "model", SETTINGS)
+    with patch("app.utils.latent_cache._sha256_file") as sha:
+        cache.stage(dataset, "run2", "model", SETTINGS)
+        assert sha.call_count == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, dataset):
+    cache = LatentCache(str(tmp_path / "cache"), max_bytes=30)
+    first = cache.stage(dataset, "run1", "model", SETTINGS)
+    train(first)
+    cache.harvest(first)
+    blobs = list(cache.blobs.rglob("*.npz"))
+    assert len(blobs) == 2
+    assert sum(p.stat().st_size for p in blobs) <= 30
+
+    # Newer entries push out the least recently used ones.
+    second = cache.stage(dataset, "run2", "other-model", SETTINGS)
+    train(second)
+    cache.harvest(second)
+    assert cache.stage(dataset, "run3", "other-model", SETTINGS).hits == 2
+    assert cache.stage(dataset, "run4", "model", SETTINGS).hits == 0
+
+
+def test_latent_settings():
+    assert latent_settings(["train.py", "--color_aug"]) is None
+    assert latent_settings(["train.py", "--enable_bucket", "--resolution=512"]) == latent_settings(
+        ["train.py", "--resolution=512", "--learning_rate=1e-4", "--enable_bucket"]
+    )
+    assert latent_settings(["train.py", "--resolution=512"]) != latent_settings(["train.py", "--resolution=768"])
+
+
+def test_model_fingerprint_follows_the_file(tmp_path):
+    model = tmp_path / "model.safetensors"
+    model.write_bytes(b"weights")
+    before = model_fingerprint(str(model))
+    assert model_fingerprint(str(model)) == before
+    model.write_bytes(b"other weights")
+    assert model_fingerprint(str(model)) != before
+    assert model_fingerprint("stabilityai/sdxl") == model_fingerprint("stabilityai/sdxl")
@@ -0,0 +1,53 @@
+import struct
+import zlib
+
+import pytest
+
+from app.routes.generation import PREVIEW_SIZE, _preview_seed, _render_preview_png
+
+
+def reference_pixels(seed):
+    """The original per-pixel loop."""
+    width = height = PREVIEW_SIZE
+    base_r = 50 + (seed & 0x7F)
+    base_g = 80 + ((seed >> 7) & 0x7F)
+    base_b = 110 + ((seed >> 14) & 0x7F)
+    raw = bytearray()
+    for y in range(height):
+        raw.append(0)
+        for x in range(width):
+            raw.extend((
+                (base_r + (x * 5 // width)) % 256,
+                (base_g + (y * 5 // height)) % 256,
+                (base_b + ((x + y) * 3 // (width + height))) % 256,
+            ))
+    return bytes(raw)
+
+
+def decode(png):
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    offset = 8
+    chunks = {}
+    while offset < len(png):
+        (length,) = struct.unpack(">I", png[offset:offset + 4])
+        tag = png[offset + 4:offset + 8]
+        data = png[offset + 8:offset + 8 + length]
+        (crc,) = struct.unpack(">I", png[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(tag + data) & 0xFFFFFFFF
+        chunks[tag] = data
+        offset += 12 + length
+    return struct.unpack(">IIBBBBB", chunks[b"IHDR"]), zlib.decompress(chunks[b"IDAT"])
+
+
+@pytest.mark.parametrize("seed", [0, 0x7F, 0x123456, 0xFFFFFF])
+def test_preview_matches_the_per_pixel_rendering(seed):
+    header, pixels = decode(_render_preview_png(seed))
+    assert header == (PREVIEW_SIZE, PREVIEW_SIZE, 8, 2, 0, 0, 0)
+    assert pixels == reference_pixels(seed)
+
+
+def test_previews_are_stable_and_memoized():
+    seed = _preview_seed("a lighthouse at dusk")
+    assert seed == _preview_seed("a lighthouse at dusk")
+    assert 0 <= seed <= 0xFFFFFF
+    assert _render_preview_png(seed) is _render_preview_png(seed)
@@ -0,0 +1,86 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from app.utils import comfy
+from app.utils.result_cache import ResultCache, workflow_cache_key
+
+WORKFLOWS = Path(__file__).resolve().parent.parent / "workflows"
+
+
+def workflow(ckpt: str, lora: str = "", seed: int = 1):
+    return {
+        "0": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": ckpt}},
+        "1": {"class_type": "LoraLoader", "inputs": {"lora_name": lora, "model": ["0", 0]}},
+        "2": {"class_type": "KSampler", "inputs": {"seed": seed, "model": ["1", 0]}},
+    }
+
+
+def touch(path: Path, data: bytes) -> None:
+    stat = path.stat() if path.exists() else None
+    path.write_bytes(data)
+    if stat is not None:
+        # Keep the mtime moving even on filesystems with coarse timestamps.
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_key_follows_retrained_lora(tmp_path):
+    lora = tmp_path / "model.safetensors"
+    touch(lora, b"old weights")
+    before = workflow_cache_key(workflow("base.safetensors", str(lora)), model_dirs=[])
+    assert workflow_cache_key(workflow("base.safetensors", str(lora)), model_dirs=[]) == before
+
+    touch(lora, b"new weights")
+    assert workflow_cache_key(workflow("base.safetensors", str(lora)), model_dirs=[]) != before
+
+
+def test_key_resolves_names_inside_model_folders(tmp_path):
+    (tmp_path / "checkpoints").mkdir()
+    checkpoint = tmp_path / "checkpoints" / "base.safetensors"
+    touch(checkpoint, b"v1")
+    before = workflow_cache_key(workflow("base.safetensors"), model_dirs=[str(tmp_path)])
+
+    touch(checkpoint, b"v2")
+    assert workflow_cache_key(workflow("base.safetensors"), model_dirs=[str(tmp_path)]) != before
+    assert workflow_cache_key(workflow("base.safetensors", seed=2), model_dirs=[]) != workflow_cache_key(
+        workflow("base.safetensors"), model_dirs=[]
+    )
+
+
+def test_cache_round_trip_and_eviction(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=10, max_entries=10)
+    first = tmp_path / "first.png"
+    first.write_bytes(b"123456")
+    cache.put("a", [first])
+    first.unlink()
+
+    paths = cache.get("a")
+    assert [p.read_bytes() for p in paths] == [b"123456"]
+
+    second = tmp_path / "second.png"
+    second.write_bytes(b"abcdef")
+    cache.put("b", [second])
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.stats()["entries"] == 1
+
+
+@pytest.mark.parametrize("seed,cacheable", [(None, False), (0, False), (42, True)])
+def test_only_requested_seeds_are_cached(monkeypatch, tmp_path, seed, cacheable):
+    calls = []
+
+    async def fake_run_prompt(workflow, *, affinity=None, cacheable=False, lane=None):
+        seed_used = next(node["inputs"]["seed"] for node in workflow.values() if "seed" in node["inputs"])
+        calls.append((seed_used, cacheable))
+        return "prompt", {}, [tmp_path / "out.png"]
+
+    monkeypatch.setattr(comfy, "GENERATION_WORKFLOW_PATH", str(WORKFLOWS / "generation.json"))
+    monkeypatch.setattr(comfy, "_run_prompt", fake_run_prompt)
+    asyncio.run(comfy.generate_image_workflow("a cat", seed=seed))
+
+    (used_seed, was_cacheable), = calls
+    assert was_cacheable is cacheable
+    if cacheable:
+        assert used_seed == seed
@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.schemas import JobKind, JobStatus, TrainLoraSweepRequest
+from app.utils import sweeps
+from app.utils.jobs import create_job
+from app.utils.sweeps import SweepError, expand_sweep, launch_sweep, summarize_sweep
+
+
+def request(**kwargs):
+    return TrainLoraSweepRequest(model_id="m", dataset_path="/data", **kwargs)
+
+
+def test_grid_and_random_expansion(monkeypatch):
+    grid = expand_sweep(request(network_dim=[8, 16], learning_rate=[1e-4, 5e-4], max_train_steps=[100]))
+    assert len(grid) == 4
+    assert {(p["network_dim"], p["learning_rate"]) for p in grid} == {(8, 1e-4), (8, 5e-4), (16, 1e-4), (16, 5e-4)}
+
+    sample = request(network_dim=[4, 8, 16, 32], learning_rate=[1e-4, 5e-4], search="random", trials=3, seed=7)
+    assert expand_sweep(sample) == expand_sweep(sample)
+    assert len(expand_sweep(sample)) == 3
+
+    monkeypatch.setattr(sweeps, "SWEEP_MAX_RUNS", 3)
+    with pytest.raises(SweepError):
+        expand_sweep(request(network_dim=[8, 16], learning_rate=[1e-4, 5e-4]))
+
+
+def finish(store, job_id, status, loss=None, wall_time=10.0):
+    store.update(job_id, status=status, result={"final_loss": loss, "wall_time": wall_time, "output_weight": f"{job_id}.safetensors"})
+
+
+def test_sweep_summary_follows_its_runs(monkeypatch, job_store):
+    launched = []
+
+    def fake_launch(run_requests, *, sweep_id, on_finish):
+        jobs = []
+        for index, run in enumerate(run_requests):
+            payload = {**run.model_dump(), "sweep_id": sweep_id}
+            create_job(JobKind.TRAINING, job_id=f"run{index}", model_id=run.model_id, payload=payload)
+            jobs.append(SimpleNamespace(job_id=f"run{index}", sweep_id=sweep_id))
+        launched.extend(run_requests)
+        return jobs
+
+    monkeypatch.setattr(sweeps, "launch_kohya_sweep", fake_launch)
+    sweep = launch_sweep(request(network_dim=[8, 16, 32], output_name="hero"))
+
+    assert [run.output_name for run in launched] == ["hero_sweep00", "hero_sweep01", "hero_sweep02"]
+    assert sweep.kind == JobKind.SWEEP.value and sweep.status == JobStatus.RUNNING.value
+    assert sweep.result["total"] == 3 and sweep.result["finished"] == 0
+
+    finish(job_store, "run0", JobStatus.COMPLETED.value, loss=0.2)
+    finish(job_store, "run1", JobStatus.COMPLETED.value, loss=0.1)
+    assert summarize_sweep(sweep.id).status == JobStatus.RUNNING.value
+
+    finish(job_store, "run2", JobStatus.FAILED.value)
+    summary = summarize_sweep(sweep.id)
+    assert summary.status == JobStatus.COMPLETED.value
+    assert summary.result["completed"] == 2 and summary.result["finished"] == 3
+    assert summary.result["best"]["job_id"] == "run1"
+    assert summary.result["best"]["network_dim"] == 16
+    assert summary.result["total_wall_time"] == 30.0
+
+
+def test_failed_launches_fail_the_sweep(monkeypatch, job_store):
+    def broken_launch(run_requests, *, sweep_id, on_finish):
+        raise RuntimeError("no base model")
+
+    monkeypatch.setattr(sweeps, "launch_kohya_sweep", broken_launch)
+    with pytest.raises(RuntimeError):
+        launch_sweep(request())
+    (sweep,) = job_store.list(kind=JobKind.SWEEP.value)
+    assert (sweep.status, sweep.error) == (JobStatus.FAILED.value, "no base model")
@@ -0,0 +1,79 @@
+from app.utils.training_telemetry import LogTailer, TrainingTelemetry, batch_size_from_command
+
+
+def append(path, text):
+    with path.open("a", encoding="utf-8") as fp:
+        fp.write(text)
+
+
+def test_tailer_reads_only_new_complete_lines(tmp_path):
+    log = tmp_path / "train.log"
+    tailer = LogTailer(log)
+    assert tailer.read_lines() == []
+
+    append(log, "loading model\n 10%|#  | 1/10 [00:01<00:09")
+    assert tailer.read_lines() == ["loading model"]
+    append(log, ", 1.00it/s]\r 20%|## | 2/10 [00:02<00:08, 1.00it/s]\r")
+    assert tailer.read_lines() == [" 10%|#  | 1/10 [00:01<00:09, 1.00it/s]", " 20%|## | 2/10 [00:02<00:08, 1.00it/s]"]
+    append(log, "done")
+    assert tailer.read_lines() == []
+    assert tailer.flush() == ["done"]
+
+
+def test_tailer_keeps_multibyte_characters_split_across_reads(tmp_path):
+    log = tmp_path / "train.log"
+    tailer = LogTailer(log)
+    data = "step ✓ ok\n".encode("utf-8")
+    cut = data.index("✓".encode("utf-8")) + 1
+    with log.open("ab") as fp:
+        fp.write(data[:cut])
+    assert tailer.read_lines() == []
+    with log.open("ab") as fp:
+        fp.write(data[cut:])
+    assert tailer.read_lines() == ["step ✓ ok"]
+
+
+def test_tqdm_bars_become_progress_samples(tmp_path):
+    log = tmp_path / "train.log"
+    telemetry = TrainingTelemetry("job", log, batch_size=2)
+    append(
+        log,
+        "  batch size per device / バッチサイズ: 4\n"
+        "epoch 1/3\n"
+        "steps:  10%|#  | 10/100 [00:05<00:45, 2.00it/s]\r"
+        "steps:  10%|#  | 10/100 [00:05<00:45, 2.00it/s, avr_loss=0.125]\r"
+        "steps:  20%|## | 20/100 [00:20<01:20, 1.50s/it, avr_loss=0.1]\r",
+    )
+    # The redraw with a loss replaces the bare sample for the same step with a new one.
+    assert telemetry.poll() == 3
+
+    first, second = telemetry.since(0)
+    assert (first.step, first.total_steps, first.epoch, first.total_epochs) == (10, 100, 1, 3)
+    assert first.loss == 0.125
+    assert (first.it_per_sec, first.samples_per_sec) == (2.0, 8.0)
+    assert (first.elapsed_seconds, first.eta_seconds) == (5, 45)
+    assert abs(second.it_per_sec - 1 / 1.5) < 1e-9
+    assert second.eta_seconds == 80
+    assert telemetry.since(first.seq) == [second]
+    assert telemetry.last_loss() == 0.1
+
+
+def test_samples_are_bounded_and_finish_on_close(tmp_path):
+    log = tmp_path / "train.log"
+    telemetry = TrainingTelemetry("job", log, max_samples=3)
+    append(log, "".join(f"{step}/10 [00:0{step}<?, ?it/s]\r" for step in range(1, 7)))
+    telemetry.poll()
+    assert [sample.step for sample in telemetry.since(0)] == [4, 5, 6]
+    assert telemetry.since(0)[0].it_per_sec is None
+
+    append(log, "7/10 [00:07<00:03, 1.00it/s]")
+    telemetry.close()
+    snapshot = telemetry.snapshot()
+    assert snapshot["finished"] is True
+    assert snapshot["latest"]["step"] == 7
+
+
+def test_batch_size_from_command():
+    assert batch_size_from_command(["train.py", "--train_batch_size=6"]) == 6
+    assert batch_size_from_command(["train.py", "--train_batch_size=x"]) == 1
+    assert batch_size_from_command(["train.py"]) == 1
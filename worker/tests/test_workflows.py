@@ -0,0 +1,61 @@
+import json
+import os
+
+import pytest
+
+from app.utils.workflows import WorkflowTemplate, clear_template_cache, load_template
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_template_cache()
+    yield
+    clear_template_cache()
+
+
+def test_render_substitutes_placeholders():
+    template = WorkflowTemplate({
+        "3": {"inputs": {"seed": "{{seed}}", "text": "a {{subject}} at {{time}}", "model": ["4", 0]}},
+        "4": {"inputs": {"ckpt_name": "base.safetensors"}},
+    })
+    assert template.placeholders == {"seed", "subject", "time"}
+
+    workflow = template.render({"seed": 7, "subject": "cat", "time": None})
+    assert workflow["3"]["inputs"] == {"seed": 7, "text": "a cat at ", "model": ["4", 0]}
+    # Unknown placeholders are left in place.
+    assert template.render({})["3"]["inputs"]["seed"] == "{{seed}}"
+
+
+def test_render_leaves_the_template_untouched():
+    source = {"3": {"inputs": {"seed": "{{seed}}"}}, "4": {"inputs": {"ckpt_name": "base.safetensors"}}}
+    template = WorkflowTemplate(source)
+    first = template.render({"seed": 1})
+    second = template.render({"seed": 2})
+
+    assert source["3"]["inputs"]["seed"] == "{{seed}}"
+    assert (first["3"]["inputs"]["seed"], second["3"]["inputs"]["seed"]) == (1, 2)
+    # Subtrees without placeholders are shared rather than copied.
+    assert first["4"] is source["4"]
+
+
+def test_templates_are_reloaded_only_when_the_file_changes(tmp_path):
+    path = tmp_path / "workflow.json"
+    path.write_text(json.dumps({"1": {"inputs": {"text": "{{prompt}}"}}}))
+    template = load_template(path)
+    assert load_template(path) is template
+
+    path.write_text(json.dumps({"1": {"inputs": {"text": "{{prompt}}, {{style}}"}}}))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = load_template(path)
+    assert reloaded is not template
+    assert reloaded.placeholders == {"prompt", "style"}
+
+
+def test_invalid_templates_raise(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_template(tmp_path / "missing.json")
+    broken = tmp_path / "broken.json"
+    broken.write_text("{")
+    with pytest.raises(json.JSONDecodeError):
+        load_template(broken)